@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""Benchmark the build scripts on synthetic corpora.
+
+  scripts/bench.py [--sizes 100,1000,10000,50000] [--baseline FILE] [--threshold 0.25]
+
+For each size, a corpus of post/<slug>/index.html pages is generated under
+.cache/bench/corpus-<n>/ (reused while CORPUS_VERSION and the seed match).
+Distributions come from the real post/ pages:
+- zh/en mix from their <html lang>
+- tags per post and tag frequencies from their keywords, plus a Zipf long
+  tail of synthetic tags so the tag count grows with the corpus
+- body length and vocabulary from their .post-content text
+- half the posts carry keywords in JSON-LD, half in <meta name="keywords">
+- a few cross links per post to other posts and to the tag index of the
+  post's site language (tags.html#<anchor>, zh/tags.html#<anchor>)
+
+Every build stage then runs twice as its own script process, in build.py's
+order and with its arguments: cold (outputs and .cache removed, markup that
+stages wrote into posts stripped) and warm (straight after, nothing changed).
+build.py itself is timed the same way as the "build" entry, the end-to-end
+figure with its in-process stage graph. The pair is repeated --repeat times
+and each run records:
+- wall_s: best wall time including interpreter startup, as a standalone
+  script run pays it (build.py pays it once for all stages)
+- peak_rss_kb: max RSS of the stage and any worker processes
+- files_read / files_written: distinct corpus paths opened, via an audit hook
+  (main process only; the default --jobs 1 keeps extraction in-process,
+  but build.py runs stages in forked workers, whose files are not counted)
+
+The "encode_body" entry times generate_search_index.encode_body_index alone,
+in-process, on the first shard's worth of corpus bodies (best of --repeat),
+so a slower body encoder shows up apart from tokenization and I/O.
+
+Results are written to --out as JSON. With --baseline, each wall_s and
+peak_rss_kb is compared with the same entry in that file, and the run exits
+1 when one grew by more than --threshold (ignoring wall times under
+--min-seconds, which are mostly noise). --save-baseline writes the results
+there as well.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import generate_search_index
+import hreflang
+import related
+from fingerprint import is_hashed
+from postmeta import lang_prefix, load_alias_map, norm_tag, scan_posts, site_lang, tag_anchor
+
+SIZES = [100, 1_000, 10_000, 50_000]
+CORPUS_VERSION = 2
+WORK_DIR = Path(".cache") / "bench"
+BASE = "https://ai.liexpress.cc"
+
+# build.py's STAGES, in an order that respects their dependencies.
+STAGES = [
+    ("related", "related.py", ["--inject"]),
+    ("hreflang", "hreflang.py", ["--base", BASE]),
+    ("images", "images.py", []),
+    ("search", "generate_search_index.py", ["--base", BASE, "--body-index"]),
+    ("sitemap", "generate_sitemap.py", ["--base", BASE]),
+    ("fingerprint", "fingerprint.py", []),
+    ("index", "generate_index.py", ["--base", BASE, "--limit", "80"]),
+    ("pages", "generate_pages.py", ["--base", BASE]),
+    ("feeds", "feeds.py", ["--base", BASE]),
+    ("compress", "compress.py", []),
+    ("links", "check_internal_links.py", ["--base", BASE]),
+]
+# End to end; its --jobs is stage concurrency, left at build.py's default.
+BUILD = ("build", "build.py", [])
+NO_JOBS = {"fingerprint", "build"}
+
+# Corpus entries that are inputs; everything else is build output.
+SOURCES = {"post", "data", "styles", "assets", "search.html", ".bench.json"}
+SOURCE_DATA = {"data/tags-alias.json", "data/featured.json"}
+
+SCRIPTS = Path(__file__).resolve().parent
+
+
+def is_cjk(ch: str) -> bool:
+    return 0x3400 <= ord(ch) <= 0x4DBF or 0x4E00 <= ord(ch) <= 0x9FFF
+
+
+def build_model(repo: Path) -> dict:
+    """Distributions the synthetic posts are drawn from."""
+    posts = scan_posts(repo)
+    en_words = [w.lower() for p in posts if not p.lang.startswith("zh") for w in re.findall(r"[A-Za-z]{2,}", p.body)]
+    zh_chars = [ch for p in posts if p.lang.startswith("zh") for ch in p.body if is_cjk(ch)]
+    tags = Counter(t for p in posts for t in p.tags)
+    return {
+        "langs": Counter(p.lang for p in posts),
+        "tag_counts": [len(p.tags) for p in posts],
+        "tags": tags,
+        "body_lens": [len(p.body) for p in posts],
+        "en_words": en_words or ["city", "data", "policy"],
+        "zh_chars": zh_chars or ["城", "市", "数", "据"],
+    }
+
+
+def words(rng: random.Random, model: dict, zh: bool, n_chars: int) -> str:
+    if zh:
+        return "".join(rng.choices(model["zh_chars"], k=n_chars))
+    out: list[str] = []
+    size = 0
+    while size < n_chars:
+        w = rng.choice(model["en_words"])
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)
+
+
+def pick_tags(rng: random.Random, model: dict, zh: bool, tail: list[tuple[str, str]], tail_weights: list[float]) -> list[str]:
+    k = rng.choice(model["tag_counts"]) or rng.randint(3, 8)
+    real = list(model["tags"])
+    out: list[str] = []
+    while len(out) < k:
+        if real and rng.random() < 0.6:
+            t = rng.choices(real, weights=[model["tags"][x] for x in real])[0]
+        else:
+            en, zh_tag = rng.choices(tail, weights=tail_weights)[0]
+            t = zh_tag if zh else en
+        if t not in out:
+            out.append(t)
+    return out
+
+
+def render_post(slug: str, title: str, date: str, lang: str, desc: str, tags: list[str], jsonld_keywords: bool,
+                paragraphs: list[str], links: list[str]) -> str:
+    esc = lambda s: s.replace("&", "&amp;").replace("\"", "&quot;").replace("<", "&lt;")
+    ld = {
+        "@context": "https://schema.org",
+        "@type": "Article",
+        "headline": title,
+        "description": desc,
+        "datePublished": date,
+        "dateModified": date,
+        "author": {"@type": "Person", "name": "Mr. Qizhi"},
+        "inLanguage": lang,
+        "mainEntityOfPage": {"@type": "WebPage", "@id": f"{BASE}/post/{slug}/"},
+    }
+    if jsonld_keywords:
+        ld["keywords"] = ", ".join(tags)
+    head = [
+        "<!DOCTYPE html>",
+        f"<html lang=\"{lang}\">",
+        "<head>",
+        "  <meta charset=\"utf-8\" />",
+        "  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />",
+        f"  <title>{esc(title)} | Mr. Qizhi</title>",
+        f"  <meta name=\"description\" content=\"{esc(desc)}\" />",
+    ]
+    if not jsonld_keywords:
+        head.append(f"  <meta name=\"keywords\" content=\"{esc(', '.join(tags))}\" />")
+    head += [
+        f"  <link rel=\"canonical\" href=\"{BASE}/post/{slug}/\" />",
+        f"  <meta property=\"og:title\" content=\"{esc(title)} | Mr. Qizhi\" />",
+        f"  <meta property=\"og:url\" content=\"{BASE}/post/{slug}/\" />",
+        f"  <link rel=\"stylesheet\" href=\"{BASE}/styles/main.css\">",
+        "  <script>function gtag(){dataLayer.push(arguments);}</script>",
+        "  <script type=\"application/ld+json\">",
+        json.dumps(ld, ensure_ascii=False, indent=2),
+        "  </script>",
+        "</head>",
+        "<body>",
+        "  <div class=\"main\">",
+        f"    <div class=\"site-header\"><a href=\"{BASE}/\"><h1 class=\"site-title\">Mr. Qizhi</h1></a></div>",
+        "    <article class=\"main-content\">",
+        f"      <h1 class=\"post-title\">{esc(title)}</h1>",
+        f"      <div class=\"post-meta\"><span class=\"post-date\">{date}</span></div>",
+        "      <div class=\"post-content\">",
+    ]
+    body = []
+    for i, para in enumerate(paragraphs):
+        if i and i % 5 == 0:
+            body.append(f"        <h2>{esc(para[:40])}</h2>")
+        body.append(f"        <p>{esc(para)}</p>")
+    for href in links:
+        body.append(f"        <p><a href=\"{href}\">{href}</a></p>")
+    tail = [
+        "      </div>",
+        f"      <div class=\"post-navigation\"><a href=\"{BASE}/\">← Back to Home</a></div>",
+        "    </article>",
+        "    <footer class=\"site-footer\"><p>© 2026 Mr. Qizhi</p></footer>",
+        "  </div>",
+        "</body>",
+        "</html>",
+        "",
+    ]
+    return "\n".join(head + body + tail)
+
+
+def make_corpus(repo: Path, dest: Path, n: int, seed: int, model: dict) -> None:
+    """Write n synthetic posts plus the source files the generators read."""
+    rng = random.Random(seed)
+    if dest.exists():
+        shutil.rmtree(dest)
+    (dest / "data").mkdir(parents=True)
+    (dest / "styles").mkdir()
+    (dest / "assets").mkdir()
+    for rel in ["styles/main.css", "search.html", *sorted(SOURCE_DATA)]:
+        if (repo / rel).exists():
+            shutil.copyfile(repo / rel, dest / rel)
+    alias_map = load_alias_map(dest)
+
+    # Long tail grows with the corpus: ~n/20 extra tags, Zipf weighted.
+    n_tail = max(20, n // 20)
+    tail = [(f"{words(rng, model, False, 8).replace(' ', '-')}-{i}", f"{words(rng, model, True, 3)}{i}") for i in range(n_tail)]
+    tail_weights = [1 / (i + 1) for i in range(n_tail)]
+    langs, lang_weights = zip(*model["langs"].items())
+
+    made: list[tuple[str, list[str]]] = []
+    for i in range(n):
+        lang = rng.choices(langs, weights=lang_weights)[0]
+        zh = lang.startswith("zh")
+        date = f"{rng.randint(2012, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        slug = f"{date}-{'-'.join(words(rng, model, False, 16).split()[:3])}-{i}"
+        title = words(rng, model, zh, 16 if zh else 50).capitalize()
+        desc = words(rng, model, zh, 50 if zh else 140)
+        tags = pick_tags(rng, model, zh, tail, tail_weights)
+        target = rng.choice(model["body_lens"])
+        para_len = 120 if zh else 300
+        paragraphs = [words(rng, model, zh, para_len) for _ in range(max(1, target // para_len))]
+        links = []
+        for _ in range(rng.randint(0, 3)):
+            if made:
+                links.append(f"{BASE}/post/{rng.choice(made)[0]}/")
+        if tags and rng.random() < 0.3:
+            links.append(f"{BASE}/{lang_prefix(site_lang(lang))}tags.html#{tag_anchor(norm_tag(tags[0], alias_map))}")
+        page = render_post(slug, title, date, lang, desc, tags, i % 2 == 0, paragraphs, links)
+        path = dest / "post" / slug / "index.html"
+        path.parent.mkdir(parents=True)
+        path.write_text(page, encoding="utf-8")
+        made.append((slug, tags))
+    (dest / ".bench.json").write_text(json.dumps({"version": CORPUS_VERSION, "n": n, "seed": seed}) + "\n")
+
+
+def ensure_corpus(repo: Path, work: Path, n: int, seed: int, model: dict | None) -> tuple[Path, dict | None]:
+    dest = work / f"corpus-{n}"
+    try:
+        meta = json.loads((dest / ".bench.json").read_text())
+    except Exception:
+        meta = None
+    if meta != {"version": CORPUS_VERSION, "n": n, "seed": seed}:
+        model = model or build_model(repo)
+        t0 = time.perf_counter()
+        make_corpus(repo, dest, n, seed, model)
+        print(f"corpus-{n}: generated in {time.perf_counter() - t0:.1f}s")
+    return dest, model
+
+
+def reset(corpus: Path) -> None:
+    """Delete build outputs and caches, keeping the generated sources."""
+    for post in (corpus / "post").glob("*/index.html"):
+        # Blocks related --inject and hreflang wrote; there are no covers to rewrite.
+        text = post.read_text(encoding="utf-8")
+        clean = hreflang.inject(related.BLOCK_RE.sub("", text), "")
+        if clean != text:
+            post.write_text(clean, encoding="utf-8")
+        post.with_name("index.html.gz").unlink(missing_ok=True)
+    for entry in corpus.iterdir():
+        if entry.name not in SOURCES:
+            shutil.rmtree(entry) if entry.is_dir() else entry.unlink()
+    for f in (corpus / "data").iterdir():
+        if f"data/{f.name}" not in SOURCE_DATA:
+            f.unlink()
+    for sub in ["styles", "assets"]:
+        for f in (corpus / sub).rglob("*"):
+            # hashed copies and assets/manifest.json
+            if f.is_file() and (is_hashed(f.name) or f.suffix == ".json"):
+                f.unlink()
+
+
+def run_stage(report: str, script: str, argv: list[str]) -> int:
+    """Child side: run script as __main__ and count the corpus files it opens."""
+    root = os.path.abspath(argv[argv.index("--root") + 1]) + os.sep
+    reads: set[str] = set()
+    writes: set[str] = set()
+
+    def hook(event, args):
+        if event != "open" or not isinstance(args[0], (str, bytes, os.PathLike)):
+            return
+        path = os.path.abspath(os.fsdecode(args[0]))
+        if not path.startswith(root):
+            return
+        mode, flags = args[1], args[2]
+        write = any(c in mode for c in "wax+") if isinstance(mode, str) else bool(flags & (os.O_WRONLY | os.O_RDWR))
+        (writes if write else reads).add(path)
+
+    sys.addaudithook(hook)
+    sys.argv = [script, *argv]
+    sys.path.insert(0, os.path.dirname(script))
+    try:
+        runpy.run_path(script, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    with open(report, "w") as f:
+        json.dump({"code": code, "peak_rss_kb": rss, "files_read": len(reads), "files_written": len(writes)}, f)
+    return code
+
+
+def measure(corpus: Path, work: Path, name: str, script: str, args: list[str], jobs: int) -> dict:
+    argv = ["--root", str(corpus), *args]
+    if name not in NO_JOBS:
+        argv += ["--jobs", str(jobs)]
+    report = work / "stage.json"
+    cmd = [sys.executable, str(Path(__file__).resolve()), "_stage", str(report), str(SCRIPTS / script), *argv]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+    stats = json.loads(report.read_text()) if report.exists() else {"code": proc.returncode}
+    report.unlink(missing_ok=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+    return {"wall_s": round(wall, 4), **stats}
+
+
+def measure_encode(corpus: Path, repeat: int) -> dict:
+    bodies = [p.body for p in scan_posts(corpus)][: generate_search_index.SHARD_SIZE]
+    best = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        blob = generate_search_index.encode_body_index(bodies)
+        wall = time.perf_counter() - t0
+        best = wall if best is None else min(best, wall)
+    return {"wall_s": round(best, 4), "code": 0, "docs": len(bodies), "bytes": len(blob)}
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_seconds: float) -> list[str]:
+    """Describe every entry that regressed past threshold."""
+    out = []
+    for size, stages in results.items():
+        for stage, modes in stages.items():
+            for mode, now in modes.items():
+                was = baseline.get(size, {}).get(stage, {}).get(mode)
+                if not was:
+                    continue
+                if max(now["wall_s"], was["wall_s"]) >= min_seconds and now["wall_s"] > was["wall_s"] * (1 + threshold):
+                    out.append(f"{size} {stage} {mode}: wall {was['wall_s']:.3f}s -> {now['wall_s']:.3f}s")
+                if was.get("peak_rss_kb") and now.get("peak_rss_kb", 0) > was["peak_rss_kb"] * (1 + threshold):
+                    out.append(f"{size} {stage} {mode}: rss {was['peak_rss_kb']} KB -> {now['peak_rss_kb']} KB")
+    return out
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "_stage":
+        return run_stage(sys.argv[2], sys.argv[3], sys.argv[4:])
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".", help="repo whose post/ pages model the corpus")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated post counts")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--jobs", type=int, default=1, help="--jobs passed to each stage")
+    ap.add_argument("--out", default=None, help="results JSON (default: .cache/bench/results.json)")
+    ap.add_argument("--baseline", default=None, help="results JSON to compare against")
+    ap.add_argument("--save-baseline", default=None, help="also write results here")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed growth, as a fraction")
+    ap.add_argument("--min-seconds", type=float, default=0.25, help="ignore wall times below this")
+    ap.add_argument("--repeat", type=int, default=3, help="cold+warm passes per size; the fastest counts")
+    args = ap.parse_args()
+
+    repo = Path(args.root).resolve()
+    work = repo / WORK_DIR
+    work.mkdir(parents=True, exist_ok=True)
+    model = None
+    results: dict[str, dict] = {}
+    failed = False
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        corpus, model = ensure_corpus(repo, work, n, args.seed, model)
+        stages: dict[str, dict] = {}
+        for _ in range(max(1, args.repeat)):
+            for runs in [STAGES, [BUILD]]:
+                reset(corpus)
+                for mode in ["cold", "warm"]:
+                    for name, script, extra in runs:
+                        r = measure(corpus, work, name, script, extra, args.jobs)
+                        failed |= r.get("code") != 0
+                        best = stages.setdefault(name, {}).get(mode)
+                        if best is None or r["wall_s"] < best["wall_s"]:
+                            stages[name][mode] = r
+        stages["encode_body"] = {"cold": measure_encode(corpus, args.repeat)}
+        for mode in ["cold", "warm"]:
+            for name, _, _ in [*STAGES, BUILD]:
+                r = stages[name][mode]
+                print(
+                    f"{n:>6} {name:<11} {mode}  {r['wall_s']:8.3f}s  {r.get('peak_rss_kb', 0) / 1024:7.1f} MB"
+                    f"  read {r.get('files_read', '?'):>6}  wrote {r.get('files_written', '?'):>6}"
+                    + ("" if r.get("code") == 0 else f"  exit {r.get('code')}")
+                )
+        r = stages["encode_body"]["cold"]
+        print(f"{n:>6} {'encode_body':<11} cold  {r['wall_s']:8.3f}s  {r['docs']} docs -> {r['bytes']} bytes")
+        results[str(n)] = stages
+
+    payload = {"version": 1, "python": sys.version.split()[0], "jobs": args.jobs, "results": results}
+    blob = json.dumps(payload, indent=2, sort_keys=True) + "\n"
+    for dest in filter(None, [args.out or str(work / "results.json"), args.save_baseline]):
+        Path(dest).write_text(blob, encoding="utf-8")
+
+    if args.baseline:
+        base = json.loads(Path(args.baseline).read_text(encoding="utf-8")).get("results", {})
+        regressions = compare(results, base, args.threshold, args.min_seconds)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        failed |= bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
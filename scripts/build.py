@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Run the whole build in one interpreter, independent stages in parallel.
+
+build.sh used to start one Python process per script, one after another,
+each importing its modules and loading the post records again. This runs
+the same stages, each as the script's own main() with the arguments build.sh
+passed, so outputs, messages and exit codes stay the scripts'. What changes:
+
+- modules are imported once, and postmeta keeps the records of a scan in
+  memory, so posts are extracted once; later scans only stat the files and
+  re-parse posts a stage rewrote
+- stages run as soon as the stages they read from have succeeded; those
+  that only read posts run concurrently in forked worker processes, which
+  inherit the extracted records
+
+Stage graph (STAGES):
+
+  related -> hreflang -> images -> extract -+-> search -> fingerprint -+-> index
+                                            |                          +-> pages
+                                            +-> sitemap -> feeds
+  index, pages, feeds -> compress (with --compress), links
+
+related, hreflang and images rewrite posts, so they run first and in this
+process; extract then refreshes the records before workers are forked. Each
+skips posts whose file it last left as is (outputs.load_stamps), so a write
+by a later one makes it read that post again on the next build. They run
+from the most to the least frequent writer: related blocks change whenever
+neighbours do, cover markup only when the covers do.
+
+Each stage's output is printed in one piece when it finishes. A failing
+stage (non-zero exit or exception) skips the stages that depend on it, the
+others still run. The build exits with the code of the first failed stage
+in STAGES order, as build.sh under set -e did: 1 for broken links, 2 for a
+missing post directory or bad arguments.
+
+compress only runs with --compress: its .gz sidecars are for a deploy to a
+server that sends precompressed files (GitHub Pages does not). They are not
+committed (.gitignore), so a content change does not rewrite two files each.
+
+With --profile each script writes its usual section of
+.cache/build-report.json, and a "build" section records the wall time,
+start offset and process of every stage.
+
+Usage:
+  scripts/build.py [--profile] [--minify] [--compress] [--jobs N]
+"""
+
+import argparse
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+import outputs
+import profiling
+from outputs import atomic_write
+from postmeta import load_json, scan_posts
+
+BASE = "https://ai.liexpress.cc"
+INDEX_LIMIT = 80
+# Stages that write into post/ run in this process, before any worker is forked.
+INLINE = {"images", "related", "hreflang", "extract"}
+
+# (name, module, arguments, dependencies); module None is extract.
+# --minify adds --minify to MINIFY and --minify --critical-css to CRITICAL.
+STAGES = [
+    ("related", "related", ["--inject"], []),
+    ("hreflang", "hreflang", ["--base", BASE], ["related"]),
+    ("images", "images", [], ["hreflang"]),
+    ("extract", None, [], ["images"]),
+    ("search", "generate_search_index", ["--base", BASE, "--body-index"], ["extract"]),
+    ("sitemap", "generate_sitemap", ["--base", BASE], ["extract"]),
+    ("fingerprint", "fingerprint", [], ["search"]),
+    ("index", "generate_index", ["--base", BASE, "--limit", str(INDEX_LIMIT)], ["fingerprint"]),
+    ("pages", "generate_pages", ["--base", BASE], ["fingerprint"]),
+    ("feeds", "feeds", ["--base", BASE], ["sitemap"]),
+    ("compress", "compress", [], ["index", "pages", "feeds"]),
+    ("links", "check_internal_links", ["--base", BASE], ["index", "pages", "feeds"]),
+]
+# Sources each stage reads, as serve.py --watch classifies edits: "posts"
+# (post/), "alias" (data/tags-alias.json), "featured" (data/featured.json) and
+# "styles" (styles/). A watch rebuild runs the stages an edit reaches.
+READS = {
+    "related": {"posts", "alias"},
+    "hreflang": {"posts"},
+    "images": {"posts"},
+    "extract": {"posts"},
+    "search": {"posts", "alias"},
+    "sitemap": {"posts", "alias"},
+    "fingerprint": {"styles"},
+    "index": {"posts", "alias", "featured", "styles"},
+    "pages": {"posts", "alias", "styles"},
+    "feeds": {"posts", "alias"},
+    "compress": {"posts", "alias", "featured", "styles"},
+    "links": {"posts", "alias", "featured", "styles"},
+}
+# Stages that only run when asked for (--compress).
+OPT_IN = {"compress"}
+MINIFY = {"fingerprint"}
+CRITICAL = {"index", "pages"}
+
+
+def stage_args(name: str, args: list[str], root: Path, minify: bool, report: Path | None) -> list[str]:
+    argv = ["--root", str(root), *args]
+    if minify and name in MINIFY:
+        argv.append("--minify")
+    if minify and name in CRITICAL:
+        argv += ["--minify", "--critical-css"]
+    if report is not None:
+        argv += ["--profile", str(report)]
+    return argv
+
+
+def run_stage(name: str, module: str | None, argv: list[str], root: Path) -> tuple[int, str, str, float, float]:
+    """Run one stage here; (exit code, stdout, stderr, wall s, cpu s)."""
+    out, err = io.StringIO(), io.StringIO()
+    saved = sys.argv
+    w, c = time.perf_counter(), time.process_time()
+    with redirect_stdout(out), redirect_stderr(err):
+        # Counters of regexes instrumented by an earlier stage in this process.
+        profiling.regex_stats(reset=True)
+        try:
+            if module is None:
+                print(f"Post metadata: {len(scan_posts(root))} posts")
+                code = 0
+            else:
+                sys.argv = [f"{module}.py", *argv]
+                code = importlib.import_module(module).main()
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.argv = saved
+            # Worker processes exit without running atexit hooks.
+            outputs.flush()
+    return code or 0, out.getvalue(), err.getvalue(), time.perf_counter() - w, time.process_time() - c
+
+
+def build(
+    root: Path, minify: bool, jobs: int, report: Path | None, compress: bool = False, only: set[str] | None = None,
+) -> int:
+    """Run STAGES; returns the first failed stage's exit code, else 0.
+
+    only limits the run to those stages; a dependency left out counts as
+    met. With jobs 1 every stage runs in this process and nothing is forked.
+    """
+    stages = [s for s in STAGES if (s[0] not in OPT_IN or compress) and (only is None or s[0] in only)]
+    names = {name for name, *_ in stages}
+    # Import every stage module before forking, so workers start with them loaded.
+    for _, module, _, _ in stages:
+        if module:
+            importlib.import_module(module)
+    parts: dict[str, Path] = {}
+    codes: dict[str, int | None] = {}  # None: skipped
+    timings: list[dict] = []
+    running: dict[Future, tuple[str, float]] = {}
+    t0 = time.perf_counter()
+
+    def finish(name: str, started: float, result: tuple[int, str, str, float, float], where: str) -> None:
+        code, out, err, wall, cpu = result
+        if name in parts:
+            # The stage's report part is merged into the build report below.
+            err = err.replace(str(parts[name]), str(report))
+        sys.stdout.write(out)
+        sys.stdout.flush()
+        sys.stderr.write(err)
+        codes[name] = code
+        timings.append({"name": name, "start_s": round(started, 6), "wall_s": round(wall, 6), "cpu_s": round(cpu, 6), "in": where})
+
+    workers = max(1, jobs)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    with pool:
+        while len(codes) < len(stages):
+            active = {name for name, _ in running.values()}
+            for name, module, args, deps in stages:
+                if name in codes or name in active:
+                    continue
+                deps = [d for d in deps if d in names]
+                failed = [d for d in deps if d in codes and codes[d] != 0]
+                if failed:
+                    codes[name] = None
+                    print(f"Skipped {name}: {', '.join(failed)} failed", file=sys.stderr)
+                    continue
+                if not all(codes.get(d) == 0 for d in deps):
+                    continue
+                part = None
+                if report is not None:
+                    part = parts[name] = report.with_name(f"{report.stem}.{name}.json")
+                argv = stage_args(name, args, root, minify, part)
+                started = time.perf_counter() - t0
+                if name in INLINE or workers == 1:
+                    finish(name, started, run_stage(name, module, argv, root), "main")
+                    break  # re-check: its dependents may be ready now
+                running[pool.submit(run_stage, name, module, argv, root)] = (name, started)
+            else:
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name, started = running.pop(fut)
+                    finish(name, started, fut.result(), "worker")
+
+    if report is not None:
+        scripts: dict[str, dict] = {}
+        for part in parts.values():
+            data = load_json(part) if part.exists() else None
+            part.unlink(missing_ok=True)
+            if isinstance(data, dict):
+                scripts.update(data.get("scripts", {}))
+        scripts["build"] = {"wall_s": round(time.perf_counter() - t0, 6), "workers": workers, "stages": timings}
+        blob = json.dumps({"version": 1, "scripts": scripts}, ensure_ascii=False, indent=2) + "\n"
+        atomic_write(report, blob.encode("utf-8"))
+
+    for name, *_ in stages:
+        if codes.get(name):
+            return codes[name]
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=str(Path(__file__).resolve().parents[1]))
+    ap.add_argument("--profile", action="store_true", help=f"write per-stage timings to {profiling.REPORT_PATH}")
+    ap.add_argument("--minify", action="store_true", help="minified HTML/CSS, critical CSS inlined")
+    ap.add_argument("--compress", action="store_true", help="also write .gz sidecars (for a deploy that serves them)")
+    ap.add_argument("--jobs", type=int, default=None, help="stages run at once (default: CPU count, at most 4)")
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    report = None
+    if args.profile:
+        report = root / profiling.REPORT_PATH
+        report.unlink(missing_ok=True)
+    code = build(root, args.minify, args.jobs or min(os.cpu_count() or 1, 4), report, compress=args.compress)
+    if code:
+        return code
+    if report is not None:
+        print(f"Build report: {profiling.REPORT_PATH}")
+    print("Build OK")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,29 @@
 #!/usr/bin/env python3
-"""Check that internal post links point to existing post directories.
+"""Check that internal links in the site resolve.
 
-Scans post/**/index.html and validates links like:
-- https://ai.liexpress.cc/post/<slug>/
-- /post/<slug>/
-- post/<slug>/
+Scans every *.html file in the repo (posts and generated pages) and validates
+href/src values that point inside the site:
+- https://ai.liexpress.cc/post/<slug>/, /post/<slug>/, post/<slug>/, ../<slug>/
+- /assets/..., /styles/... and top-level pages (tags.html, search.html, ...)
+- fragment anchors, e.g. tags.html#<tag_anchor> or #section, against the
+  id="..." attributes of the target page
+
+Directory links resolve to <dir>/index.html. Query strings are ignored.
+External URLs, mailto:, tel:, javascript: and data: are skipped, as are links
+inside <script> and <style>.
+
+Each file's links and ids are cached in .cache/links.json, keyed by
+(size, mtime). A warm run only stats the tree and resolves links against an
+in-memory file set, which keeps it fast enough for a pre-commit hook:
+
+  ln -s ../../scripts/check_internal_links.py .git/hooks/pre-commit
+
+Changed files are scanned in a process pool when there are enough of them.
 
 Exit code:
   0 = OK
-  1 = Missing targets found
+  1 = Broken links found
+  2 = Root has no post/ directory
 
 Usage:
   scripts/check_internal_links.py [--base https://ai.liexpress.cc] [--root <repo_root>]
@@ -19,35 +34,180 @@ Notes:
 """
 
 import argparse
+import json
+import os
+import posixpath
 import re
 import sys
 from pathlib import Path
-
-HREF_RE = re.compile(r"href=\"([^\"]+)\"")
-
-
-def norm_target(url: str, base: str) -> str | None:
-    url = url.strip()
-    if not url or url.startswith("#"):
+from urllib.parse import unquote
+
+import profiling
+
+LINK_RE = re.compile(r"\s(?:href|src)=\"([^\"]*)\"", re.I)
+ID_RE = re.compile(r"\sid=\"([^\"]+)\"", re.I)
+SCRIPT_STYLE_RE = re.compile(r"<(script|style)\b[^>]*>.*?</\1>", re.I | re.S)
+SKIP_SCHEMES = ("mailto:", "tel:", "javascript:", "data:")
+
+CACHE_VERSION = 1
+CACHE_PATH = Path(".cache") / "links.json"
+PARALLEL_MIN_FILES = 64
+
+
+def walk(root: Path) -> tuple[dict[str, os.stat_result], set[str]]:
+    """(html rel path -> stat, every file rel path), skipping dot directories."""
+    pages: dict[str, os.stat_result] = {}
+    files: set[str] = set()
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(root / rel_dir if rel_dir else root) as it:
+            for e in it:
+                rel = f"{rel_dir}/{e.name}" if rel_dir else e.name
+                if e.is_dir(follow_symlinks=False):
+                    if not e.name.startswith("."):
+                        stack.append(rel)
+                    continue
+                files.add(rel)
+                if e.name.endswith(".html"):
+                    pages[rel] = e.stat()
+    return pages, files
+
+
+def scan_file(root: str, rel: str) -> dict:
+    text = Path(root, rel).read_bytes().decode("utf-8", errors="ignore")
+    ids = sorted(set(ID_RE.findall(text)))
+    links = LINK_RE.findall(SCRIPT_STYLE_RE.sub(" ", text))
+    return {"links": links, "ids": ids}
+
+
+def _scan_chunk(root: str, rels: list[str]) -> list[dict]:
+    return [scan_file(root, rel) for rel in rels]
+
+
+def scan_all(root: Path, rels: list[str], jobs: int) -> list[dict]:
+    """scan_file over rels, in input order; parallel only when it pays off."""
+    if jobs <= 1 or len(rels) < PARALLEL_MIN_FILES:
+        return _scan_chunk(str(root), rels)
+    # Imported here: pulling in multiprocessing costs more than a warm run.
+    from concurrent.futures import ProcessPoolExecutor
+
+    size = max(PARALLEL_MIN_FILES // 4, -(-len(rels) // (jobs * 4)))
+    chunks = [rels[i:i + size] for i in range(0, len(rels), size)]
+    out: list[dict] = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as ex:
+        for part in ex.map(_scan_chunk, [str(root)] * len(chunks), chunks):
+            out.extend(part)
+    return out
+
+
+def load_cache(root: Path) -> dict[str, dict]:
+    try:
+        raw = (root / CACHE_PATH).read_bytes()
+        profiling.add_bytes("read", len(raw))
+        data = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+
+def save_cache(root: Path, entries: dict[str, dict]) -> None:
+    path = root / CACHE_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    payload = {"version": CACHE_VERSION, "entries": entries}
+    blob = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+    profiling.add_bytes("written", len(blob))
+
+
+def load_pages(root: Path, pages: dict[str, os.stat_result], use_cache: bool, jobs: int) -> dict[str, dict]:
+    """rel -> {"links", "ids"} for every page, rescanning only changed files."""
+    cache = load_cache(root) if use_cache else {}
+    entries: dict[str, dict] = {}
+    pending: list[str] = []
+    for rel, st in pages.items():
+        hit = cache.get(rel)
+        if hit and hit.get("size") == st.st_size and hit.get("mtime_ns") == st.st_mtime_ns:
+            entries[rel] = hit
+            profiling.count("links", "stat_hit")
+        else:
+            pending.append(rel)
+    for rel, scanned in zip(pending, scan_all(root, pending, jobs)):
+        st = pages[rel]
+        profiling.count("links", "miss")
+        profiling.add_bytes("read", st.st_size)
+        entries[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, **scanned}
+    if use_cache and (pending or len(entries) != len(cache)):
+        save_cache(root, entries)
+    return entries
+
+
+def resolve(href: str, src: str, base: str) -> tuple[str, str] | None:
+    """(target rel path, fragment) for an internal link, None for external ones."""
+    url = href.strip()
+    if not url or url.startswith(SKIP_SCHEMES):
         return None
-    if url.startswith("mailto:") or url.startswith("javascript:"):
-        return None
-
-    # Strip base
     if url.startswith(base):
-        url = url[len(base):]
+        url = url[len(base):] or "/"
+    elif url.startswith("//") or re.match(r"^[a-z][a-z0-9+.-]*:", url, re.I):
+        return None
+    url, _, frag = url.partition("#")
+    url = url.partition("?")[0]
+    if not url:
+        return src, unquote(frag)
+    path = url if url.startswith("/") else posixpath.join(posixpath.dirname(src), url)
+    target = posixpath.normpath("/" + unquote(path)).lstrip("/")
+    if url.endswith("/"):
+        target = posixpath.join(target, "index.html")
+    return target, unquote(frag)
+
+
+def find_broken(pages: dict[str, dict], files: set[str], base: str) -> list[tuple[str, str, str]]:
+    """Return (source_file, href, reason) for every internal link that does not resolve."""
+    broken: list[tuple[str, str, str]] = []
+    for src in sorted(pages):
+        for href in pages[src]["links"]:
+            r = resolve(href, src, base)
+            if r is None:
+                continue
+            target, frag = r
+            if target not in files:
+                index = posixpath.join(target, "index.html")
+                if index not in files:
+                    want = index if target.startswith("post/") and not target.endswith(".html") else target
+                    broken.append((src, href, f"missing {want}"))
+                    continue
+                target = index
+            # "#top" scrolls to the top of any HTML document
+            if frag and frag != "top" and target in pages and frag not in pages[target]["ids"]:
+                broken.append((src, href, f"no #{frag} in {target}"))
+    return broken
+
+
+def report(broken: list[tuple[str, str, str]]) -> int:
+    if broken:
+        print("Broken internal links:")
+        for src, href, reason in broken:
+            print(f"- in {src}: {href}  ({reason})")
+        print(f"TOTAL broken: {len(broken)}")
+        return 1
 
-    # We only care about /post/<slug>/ links
-    m = re.match(r"^/?post/([^/]+)/?", url)
-    if m:
-        return m.group(1)
-    return None
+    print("OK: internal links resolved.")
+    return 0
 
 
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--base", default="https://ai.liexpress.cc")
     ap.add_argument("--root", default=str(Path(__file__).resolve().parents[1]))
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/links.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel scan processes (default: CPU count)")
+    profiling.add_arguments(ap)
     args = ap.parse_args()
 
     root = Path(args.root).resolve()
@@ -56,27 +216,14 @@ def main() -> int:
         print(f"ERROR: post dir not found: {post_dir}", file=sys.stderr)
         return 2
 
-    missing: list[tuple[str, str, str]] = []  # (source_file, href, slug)
-
-    for html in sorted(post_dir.glob("*/index.html")):
-        text = html.read_text(encoding="utf-8", errors="ignore")
-        for href in HREF_RE.findall(text):
-            slug = norm_target(href, args.base)
-            if not slug:
-                continue
-            target = post_dir / slug / "index.html"
-            if not target.exists():
-                missing.append((str(html.relative_to(root)), href, slug))
-
-    if missing:
-        print("Missing internal post targets:")
-        for src, href, slug in missing:
-            print(f"- in {src}: {href}  (missing post/{slug}/index.html)")
-        print(f"TOTAL missing: {len(missing)}")
-        return 1
-
-    print("OK: internal post links resolved.")
-    return 0
+    with profiling.session(args, "check_internal_links", root):
+        with profiling.stage("walk"):
+            pages, files = walk(root)
+        with profiling.stage("scan"):
+            scanned = load_pages(root, pages, not args.no_cache, args.jobs or os.cpu_count() or 1)
+        with profiling.stage("resolve"):
+            broken = find_broken(scanned, files, args.base.rstrip("/"))
+    return report(broken)
 
 
 if __name__ == "__main__":
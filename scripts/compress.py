@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Write precompressed .gz sidecars for the text outputs.
+
+For every *.html, *.css, *.js, *.json, *.xml, *.txt and *.svg in the tree
+(dot directories, data/ and scripts/ excluded) writes <file>.gz next to it at gzip
+level 9, with a zero mtime so the bytes are reproducible. A server or CDN can
+then send the sidecar with Content-Encoding: gzip instead of compressing per
+request (serve.py does). Files that do not get smaller (tiny ones) get no
+sidecar.
+
+build.py runs this stage only with --compress, for a deploy to such a server;
+GitHub Pages compresses on its own and ignores sidecars. The sidecars are not
+committed (.gitignore).
+
+.cache/compress.json records each source's (size, mtime, sha256). A file whose
+stat matches, or whose hash matches after a touch, is skipped when its
+sidecar exists. Files that do need compressing are spread over a process
+pool. Sidecars whose source is gone are deleted.
+
+Prints bytes and compression ratio per file type.
+
+Usage:
+  scripts/compress.py --root . [--jobs N]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import profiling
+from outputs import atomic_write
+
+TEXT_SUFFIXES = {".html", ".css", ".js", ".json", ".xml", ".txt", ".svg"}
+SKIP_DIRS = {"data", "scripts"}
+STATE_PATH = Path(".cache") / "compress.json"
+LEVEL = 9
+PARALLEL_MIN_FILES = 16
+
+
+def walk(root: Path) -> tuple[list[tuple[str, os.stat_result]], list[str]]:
+    """(text file rel, stat) and existing .gz sidecar rels, sorted."""
+    sources: list[tuple[str, os.stat_result]] = []
+    sidecars: list[str] = []
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(root / rel_dir if rel_dir else root) as it:
+            for e in it:
+                rel = f"{rel_dir}/{e.name}" if rel_dir else e.name
+                if e.is_dir(follow_symlinks=False):
+                    if not e.name.startswith(".") and rel not in SKIP_DIRS:
+                        stack.append(rel)
+                elif e.name.endswith(".gz"):
+                    sidecars.append(rel)
+                elif os.path.splitext(e.name)[1] in TEXT_SUFFIXES:
+                    sources.append((rel, e.stat()))
+    return sorted(sources), sorted(sidecars)
+
+
+def compress_file(root: str, rel: str, known_sha: str | None) -> tuple[str, int, int | None] | None:
+    """Write rel.gz unless rel hashes to known_sha.
+
+    Returns (sha256, raw bytes, gz bytes or None when not worth a sidecar),
+    or None if skipped.
+    """
+    data = Path(root, rel).read_bytes()
+    sha = hashlib.sha256(data).hexdigest()
+    if sha == known_sha:
+        return None
+    gz = gzip.compress(data, compresslevel=LEVEL, mtime=0)
+    sidecar = Path(root, rel + ".gz")
+    if len(gz) >= len(data):
+        sidecar.unlink(missing_ok=True)
+        return sha, len(data), None
+    atomic_write(sidecar, gz)
+    return sha, len(data), len(gz)
+
+
+def _compress_chunk(root: str, items: list[tuple[str, str | None]]) -> list[tuple[str, int, int | None] | None]:
+    return [compress_file(root, rel, sha) for rel, sha in items]
+
+
+def compress_all(root: Path, items: list[tuple[str, str | None]], jobs: int) -> list[tuple[str, int, int | None] | None]:
+    if jobs <= 1 or len(items) < 2 * PARALLEL_MIN_FILES:
+        return _compress_chunk(str(root), items)
+    size = max(PARALLEL_MIN_FILES, -(-len(items) // (jobs * 4)))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    out: list[tuple[str, int, int | None] | None] = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as ex:
+        for part in ex.map(_compress_chunk, [str(root)] * len(chunks), chunks):
+            out.extend(part)
+    return out
+
+
+def load_state(root: Path) -> dict[str, dict]:
+    try:
+        data = json.loads((root / STATE_PATH).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def compress(root: Path, jobs: int) -> tuple[dict[str, list[int]], int, int]:
+    """Refresh sidecars; return ({suffix: [files, raw, gz]}, written, removed)."""
+    state = load_state(root)
+    sources, sidecars = walk(root)
+    entries: dict[str, dict] = {}
+    pending: list[tuple[str, os.stat_result]] = []
+
+    def has_sidecar(rel: str) -> bool:
+        return state[rel].get("gz") is None or (root / f"{rel}.gz").exists()
+
+    for rel, st in sources:
+        hit = state.get(rel)
+        if hit and hit.get("size") == st.st_size and hit.get("mtime_ns") == st.st_mtime_ns and has_sidecar(rel):
+            entries[rel] = hit
+            profiling.count("compress", "stat_hit")
+        else:
+            pending.append((rel, st))
+
+    items = [(rel, state[rel].get("sha256") if rel in state and has_sidecar(rel) else None) for rel, _ in pending]
+    written = 0
+    for (rel, st), result in zip(pending, compress_all(root, items, jobs)):
+        if result is None:
+            entries[rel] = {**state[rel], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            profiling.count("compress", "hash_hit")
+            continue
+        sha, raw, gz = result
+        entries[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha, "gz": gz}
+        profiling.count("compress", "miss")
+        profiling.add_bytes("read", raw)
+        if gz is not None:
+            profiling.add_bytes("written", gz)
+            written += 1
+
+    removed = 0
+    for rel in sidecars:
+        if (entries.get(rel[:-3]) or {}).get("gz") is None:
+            try:
+                (root / rel).unlink()
+            except FileNotFoundError:  # already dropped by compress_file
+                continue
+            removed += 1
+
+    if entries != state:
+        atomic_write(root / STATE_PATH, json.dumps(entries, indent=0, sort_keys=True).encode("utf-8"))
+
+    by_type: dict[str, list[int]] = {}
+    for rel, e in entries.items():
+        t = by_type.setdefault(os.path.splitext(rel)[1], [0, 0, 0])
+        t[0] += 1
+        t[1] += e["size"]
+        t[2] += e["gz"] if e["gz"] is not None else e["size"]
+    return by_type, written, removed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel compression processes (default: CPU count)")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    with profiling.session(args, "compress", root), profiling.stage("compress"):
+        by_type, written, removed = compress(root, args.jobs or os.cpu_count() or 1)
+    total = [sum(t[i] for t in by_type.values()) for i in range(3)]
+    for suffix, (files, raw, gz) in sorted(by_type.items(), key=lambda kv: -kv[1][1]):
+        print(f"  {suffix:<6} {files:>5} files  {raw:>10} -> {gz:>9} bytes  ({gz / raw:.1%})" if raw else f"  {suffix} {files} files")
+    msg = f"Compressed sidecars: {total[0]} files, {total[1]} -> {total[2]} bytes"
+    msg += f" ({total[2] / total[1]:.1%})" if total[1] else ""
+    msg += f"; {written} written" + (f", {removed} stale removed" if removed else "")
+    print(msg)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
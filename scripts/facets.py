@@ -0,0 +1,76 @@
+"""Tag facet index: for each normalized tag, the sorted ids of its posts.
+
+Post ids are positions in the list the index was built from, so the same
+ids address the search docs of a manifest, or the posts a generator holds.
+Tags are normalized once with postmeta.norm_tags and keyed by tag_anchor(),
+the same key as the tag page URLs; the first spelling seen names the tag.
+
+The index also counts co-occurrence: how many posts carry both of two tags.
+Tag pages, the homepage topic hub and the search page all read their tag
+counts from here instead of re-grouping posts each.
+
+JSON form (search/facets-<lang>.<hash>.json, listed by the search manifest):
+
+  {"version": 1, "total": <posts>,
+   "tags": [{"tag": <anchor>, "name": <display>, "posts": [id, ...]}, ...],
+   "cooc": [[j, n, j, n, ...], ...]}
+
+tags is ordered by post count desc, then name. cooc[i] lists, for tags[i],
+every other tag j it shares n > 0 posts with, flat and by n desc then j.
+Filtering by several tags is then an intersection (AND) or union (OR) of
+sorted id arrays; the client never scans the posts themselves.
+"""
+
+from dataclasses import dataclass, field
+
+from postmeta import norm_tags, tag_anchor
+
+# Bump when the JSON form changes.
+FACETS_VERSION = 1
+
+
+@dataclass
+class Facets:
+    total: int
+    names: dict[str, str] = field(default_factory=dict)  # anchor -> display name
+    posts: dict[str, list[int]] = field(default_factory=dict)  # anchor -> ascending ids
+    cooc: dict[str, dict[str, int]] = field(default_factory=dict)  # anchor -> anchor -> shared posts
+
+    def ranked(self) -> list[str]:
+        """Anchors by post count desc, then display name."""
+        return sorted(self.posts, key=lambda a: (-len(self.posts[a]), self.names[a].lower()))
+
+    def count(self, anchor: str) -> int:
+        return len(self.posts.get(anchor, ()))
+
+    def to_json(self) -> dict:
+        order = self.ranked()
+        index = {a: i for i, a in enumerate(order)}
+        cooc = []
+        for a in order:
+            pairs = sorted(((index[b], n) for b, n in self.cooc.get(a, {}).items()), key=lambda x: (-x[1], x[0]))
+            cooc.append([x for pair in pairs for x in pair])
+        return {
+            "version": FACETS_VERSION,
+            "total": self.total,
+            "tags": [{"tag": a, "name": self.names[a], "posts": self.posts[a]} for a in order],
+            "cooc": cooc,
+        }
+
+
+def build_facets(tag_lists: list[list[str]], alias_map: dict[str, str] | None) -> Facets:
+    """Facets over posts given as their raw tag lists, in id order."""
+    f = Facets(total=len(tag_lists))
+    for i, tags in enumerate(tag_lists):
+        anchors = []
+        for t in norm_tags(tags, alias_map):
+            a = tag_anchor(t)
+            f.names.setdefault(a, t)
+            f.posts.setdefault(a, []).append(i)
+            anchors.append(a)
+        for a in anchors:
+            row = f.cooc.setdefault(a, {})
+            for b in anchors:
+                if b != a:
+                    row[b] = row.get(b, 0) + 1
+    return f
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Generate RSS 2.0, Atom and JSON Feed documents from the post records.
+
+Feeds (each as feed.xml, atom.xml and feed.json):
+- one per site language, next to its homepage: /feed.xml, /zh/feed.xml, ...
+- one per tag among a language's FEED_TAGS biggest, next to the tag page:
+  /tags/<anchor>/feed.xml, /zh/tags/<anchor>/feed.xml, ...
+
+Each holds the newest --limit posts (by publication date), so a poller
+downloads a few KB instead of the homepage.
+
+Entries:
+- id: tag:<host>,<date>:post/<slug>, which stays the same when the site
+  moves or the post is edited (RSS guid, Atom id, JSON Feed id)
+- updated: the post's lastmod as the sitemap stage records it in
+  data/lastmod.json (run generate_sitemap.py first), else its JSON-LD
+  dateModified or datePublished
+- summary: the excerpt, which JSON Feed items also carry as content_text
+  (the spec requires content_html or content_text); tags: alias-normalized
+
+A feed's own updated/lastBuildDate is its newest entry's, never the build
+time, so its bytes only change when its entry set does. Feeds whose inputs
+are unchanged are skipped (outputs.is_fresh) and a re-render with the same
+bytes is not written, which keeps mtimes and ETags stable and lets pollers
+get 304s. Feed files for tags that dropped out are deleted.
+
+Usage:
+  scripts/feeds.py --root . --base https://ai.liexpress.cc [--limit 20]
+"""
+
+import argparse
+import datetime as dt
+import email.utils
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+from xml.sax.saxutils import escape, quoteattr
+
+import profiling
+from generate_pages import FEED_FILES, FEED_TAGS, TAG_DIRS, feed_title, group_tags
+from generate_sitemap import LASTMOD_PATH
+from outputs import digest, is_fresh, write_output
+from postmeta import Post, lang_prefix, load_alias_map, load_json, norm_tags, scan_posts, split_by_lang
+
+# Bump when the markup of any feed format changes.
+FEED_VERSION = 2
+LIMIT = 20
+AUTHOR = "Mr. Qizhi"
+DESCRIPTION = "AI · Urban Planning · Gov-Tech · Digital Transformation · Digital Twin"
+
+
+def entry(p: Post, base: str, host: str, alias_map: dict[str, str] | None, lastmod: dict) -> dict:
+    tags = norm_tags(p.tags, alias_map)
+    recorded = lastmod.get(p.slug)
+    updated = max(recorded.get("lastmod", "") if isinstance(recorded, dict) else "", p.modified or p.date)
+    return {
+        "id": f"tag:{host},{p.date}:post/{p.slug}",
+        "url": f"{base}/post/{p.slug}/",
+        "title": p.title,
+        "summary": p.excerpt,
+        "published": p.date,
+        "updated": updated,
+        "tags": tags,
+    }
+
+
+def rfc3339(day: str) -> str:
+    return f"{day}T00:00:00Z"
+
+
+def rfc822(day: str) -> str:
+    return email.utils.format_datetime(dt.datetime.fromisoformat(day).replace(tzinfo=dt.timezone.utc))
+
+
+def render_rss(meta: dict, entries: list[dict]) -> str:
+    out = [
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>",
+        "<rss version=\"2.0\" xmlns:atom=\"http://www.w3.org/2005/Atom\">",
+        "<channel>",
+        f"  <title>{escape(meta['title'])}</title>",
+        f"  <link>{escape(meta['home'])}</link>",
+        f"  <description>{escape(DESCRIPTION)}</description>",
+        f"  <language>{meta['lang']}</language>",
+        f"  <lastBuildDate>{rfc822(meta['updated'])}</lastBuildDate>",
+        f"  <atom:link href={quoteattr(meta['dir'] + 'feed.xml')} rel=\"self\" type=\"application/rss+xml\"/>",
+    ]
+    for e in entries:
+        out += [
+            "  <item>",
+            f"    <title>{escape(e['title'])}</title>",
+            f"    <link>{escape(e['url'])}</link>",
+            f"    <guid isPermaLink=\"false\">{escape(e['id'])}</guid>",
+            f"    <pubDate>{rfc822(e['published'])}</pubDate>",
+            f"    <description>{escape(e['summary'])}</description>",
+            *(f"    <category>{escape(t)}</category>" for t in e["tags"]),
+            "  </item>",
+        ]
+    out += ["</channel>", "</rss>"]
+    return "\n".join(out) + "\n"
+
+
+def render_atom(meta: dict, entries: list[dict]) -> str:
+    out = [
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>",
+        f"<feed xmlns=\"http://www.w3.org/2005/Atom\" xml:lang=\"{meta['lang']}\">",
+        f"  <id>{escape(meta['dir'] + 'atom.xml')}</id>",
+        f"  <title>{escape(meta['title'])}</title>",
+        f"  <subtitle>{escape(DESCRIPTION)}</subtitle>",
+        f"  <link rel=\"self\" type=\"application/atom+xml\" href={quoteattr(meta['dir'] + 'atom.xml')}/>",
+        f"  <link rel=\"alternate\" type=\"text/html\" href={quoteattr(meta['home'])}/>",
+        f"  <updated>{rfc3339(meta['updated'])}</updated>",
+        f"  <author><name>{escape(AUTHOR)}</name></author>",
+    ]
+    for e in entries:
+        out += [
+            "  <entry>",
+            f"    <id>{escape(e['id'])}</id>",
+            f"    <title>{escape(e['title'])}</title>",
+            f"    <link rel=\"alternate\" type=\"text/html\" href={quoteattr(e['url'])}/>",
+            f"    <published>{rfc3339(e['published'])}</published>",
+            f"    <updated>{rfc3339(e['updated'])}</updated>",
+            f"    <summary>{escape(e['summary'])}</summary>",
+            *(f"    <category term={quoteattr(t)}/>" for t in e["tags"]),
+            "  </entry>",
+        ]
+    out.append("</feed>")
+    return "\n".join(out) + "\n"
+
+
+def render_json(meta: dict, entries: list[dict]) -> str:
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": meta["title"],
+        "home_page_url": meta["home"],
+        "feed_url": meta["dir"] + "feed.json",
+        "description": DESCRIPTION,
+        "language": meta["lang"],
+        "authors": [{"name": AUTHOR}],
+        "items": [
+            {
+                "id": e["id"],
+                "url": e["url"],
+                "title": e["title"],
+                "summary": e["summary"],
+                "content_text": e["summary"],
+                "date_published": rfc3339(e["published"]),
+                "date_modified": rfc3339(e["updated"]),
+                "tags": e["tags"],
+            }
+            for e in entries
+        ],
+    }
+    return json.dumps(feed, ensure_ascii=False, indent=2) + "\n"
+
+
+RENDERERS = {"feed.xml": render_rss, "atom.xml": render_atom, "feed.json": render_json}
+
+
+def write_feeds(root: Path, dir_rel: str, meta: dict, entries: list[dict], produced: set[str]) -> int:
+    """Write the three formats of one feed into dir_rel ("" or ".../"); returns files written."""
+    meta = {**meta, "updated": max((e["updated"] for e in entries), default="1970-01-01")}
+    key = digest("feed", FEED_VERSION, meta, entries)
+    written = 0
+    for name in FEED_FILES:
+        rel = dir_rel + name
+        produced.add(rel)
+        if is_fresh(root, rel, key):
+            continue
+        written += write_output(root, rel, RENDERERS[name](meta, entries), key)
+    return written
+
+
+def remove_stale(root: Path, produced: set[str]) -> int:
+    """Delete feed files (and .gz sidecars) under tag directories that were not produced."""
+    removed = 0
+    for d in TAG_DIRS:
+        for name in FEED_FILES:
+            for f in sorted((root / d).glob(f"*/{name}")):
+                if f.relative_to(root).as_posix() in produced:
+                    continue
+                f.unlink()
+                f.with_name(name + ".gz").unlink(missing_ok=True)
+                removed += 1
+                if not any(f.parent.iterdir()):
+                    f.parent.rmdir()
+    return removed
+
+
+def generate_feeds(root: Path, base: str, posts: list[Post], limit: int = LIMIT) -> tuple[int, int, int]:
+    """(feeds, files written, stale files removed) for posts sorted date desc."""
+    alias_map = load_alias_map(root)
+    lastmod = load_json(root / LASTMOD_PATH)
+    lastmod = lastmod if isinstance(lastmod, dict) else {}
+    host = urlparse(base).netloc or base
+    produced: set[str] = set()
+    feeds = written = 0
+    for lang, lang_posts in split_by_lang(posts).items():
+        prefix = lang_prefix(lang)
+        feeds += 1
+        entries = [entry(p, base, host, alias_map, lastmod) for p in lang_posts[:limit]]
+        meta = {"title": feed_title(lang), "lang": lang, "home": f"{base}/{prefix}", "dir": f"{base}/{prefix}"}
+        written += write_feeds(root, prefix, meta, entries, produced)
+        names, tags_sorted = group_tags(lang_posts, alias_map)
+        for a, ps in tags_sorted[:FEED_TAGS]:
+            dir_rel = f"{prefix}tags/{a}/"
+            feeds += 1
+            entries = [entry(p, base, host, alias_map, lastmod) for p in ps[:limit]]
+            meta = {"title": feed_title(lang, names[a]), "lang": lang, "home": f"{base}/{dir_rel}", "dir": f"{base}/{dir_rel}"}
+            written += write_feeds(root, dir_rel, meta, entries, produced)
+    return feeds, written, remove_stale(root, produced)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--base", default="https://ai.liexpress.cc")
+    ap.add_argument("--limit", type=int, default=LIMIT, help="entries per feed")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/postmeta.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel extraction processes (default: CPU count)")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    with profiling.session(args, "feeds", root):
+        with profiling.stage("scan"):
+            posts = scan_posts(root, use_cache=not args.no_cache, jobs=args.jobs)
+        with profiling.stage("feeds"):
+            feeds, written, removed = generate_feeds(root, args.base, posts, args.limit)
+    msg = f"Feeds: {feeds} feeds x {len(FEED_FILES)} formats, {written} files written"
+    if removed:
+        msg += f", {removed} stale removed"
+    print(msg)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
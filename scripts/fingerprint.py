@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Write content-hashed copies of static assets.
+
+For each logical asset in ASSETS writes <stem>.<hash>.<ext> next to the
+original and records the mapping in assets/manifest.json:
+
+  {"styles/main.css": "styles/main.1a2b3c4d5e.css"}
+
+Only assets that generated pages link through asset_url() are listed; a
+hashed copy nothing links would only add a duplicate file. The search index
+and cover variants carry content hashes of their own (generate_search_index,
+images), and search.html links /search/manifest.json.
+
+Hashed names never change content, so they can be served with a long max-age;
+only files whose bytes changed get a new name. Generators resolve URLs through
+asset_url(), which falls back to the logical name when an asset has not been
+fingerprinted (e.g. on a fresh checkout before this stage ran). Stale hashed
+copies of the same asset are deleted, as are those of assets no longer
+fingerprinted (source removed or dropped from ASSETS), with their compress.py
+.gz sidecars.
+
+Originals stay in place: hand-written posts link /styles/main.css directly.
+With --minify the hashed stylesheet holds minified CSS (scripts/minify.py),
+so only generated pages, which link the hashed name, get the smaller file.
+
+Usage:
+  scripts/fingerprint.py --root .
+"""
+
+import argparse
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import profiling
+from minify import minify_css
+from outputs import atomic_write
+
+MANIFEST_PATH = Path("assets") / "manifest.json"
+ASSETS = ["styles/main.css"]
+HASH_LEN = 10
+
+
+def hashed_name(rel: str, data: bytes) -> str:
+    p = Path(rel)
+    h = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+    return str(p.with_name(f"{p.stem}.{h}{p.suffix}"))
+
+
+def is_hashed(name: str) -> bool:
+    return re.search(rf"\.[0-9a-f]{{{HASH_LEN}}}\.[^.]+$", name) is not None
+
+
+def load_manifest(root: Path) -> dict[str, str]:
+    try:
+        raw = (root / MANIFEST_PATH).read_bytes()
+        profiling.add_bytes("read", len(raw))
+        data = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def asset_url(root: Path, base: str, name: str) -> str:
+    """Public URL of a logical asset, hashed when a fingerprint exists."""
+    return f"{base}/{load_manifest(root).get(name, name)}"
+
+
+def remove_copy(path: Path) -> int:
+    """Delete a hashed copy and its .gz sidecar; returns files removed."""
+    removed = 0
+    for f in (path, path.with_name(path.name + ".gz")):
+        if f.exists():
+            f.unlink()
+            removed += 1
+    return removed
+
+
+def fingerprint(root: Path, minify: bool = False) -> tuple[dict[str, str], int]:
+    """Write hashed copies; return (manifest, number of files written or removed)."""
+    previous = load_manifest(root)
+    manifest: dict[str, str] = {}
+    changed = 0
+    for pattern in ASSETS:
+        for src in sorted(root.glob(pattern)):
+            if is_hashed(src.name):
+                continue
+            rel = src.relative_to(root).as_posix()
+            data = src.read_bytes()
+            profiling.add_bytes("read", len(data))
+            if minify and src.suffix == ".css":
+                data = minify_css(data.decode("utf-8")).encode("utf-8")
+            target = hashed_name(rel, data)
+            manifest[rel] = target
+            changed += atomic_write(root / target, data)
+            # Drop older fingerprints of this asset.
+            for old in src.parent.glob(f"{src.stem}.*{src.suffix}"):
+                if is_hashed(old.name) and old.name != Path(target).name:
+                    changed += remove_copy(old)
+    for rel, target in previous.items():
+        if rel not in manifest and isinstance(target, str) and is_hashed(Path(target).name):
+            changed += remove_copy(root / target)
+    blob = json.dumps(manifest, indent=2, sort_keys=True) + "\n"
+    changed += atomic_write(root / MANIFEST_PATH, blob.encode("utf-8"))
+    return manifest, changed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--minify", action="store_true", help="write the hashed stylesheet minified")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    with profiling.session(args, "fingerprint", root), profiling.stage("fingerprint"):
+        manifest, changed = fingerprint(root, minify=args.minify)
+    print(f"Fingerprinted {len(manifest)} assets ({changed} files updated)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
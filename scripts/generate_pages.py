@@ -2,12 +2,34 @@
 """Generate lightweight helper pages for the static blog.
 
 Generates:
-- tags.html: tag index + per-tag listing
-- archive.html: archive by year/month
+- tags.html: tag index linking to per-tag pages; tags only other languages
+  use are listed after its own, so tags.html#<anchor> links from before the
+  per-language split still land on a chip
+- tags/<anchor>/index.html (+ page/<n>/index.html): posts for one tag
+- zh/tags.html, zh/tags/<anchor>/...: the same for posts in another site
+  language (postmeta.SITE_LANGS), so a listing never mixes languages
+- archive.html: years and months with counts
+- archive/<year>/index.html (+ page/<n>/index.html): posts by month
 - about.html: short profile + what to expect
 
-All pages are generated from existing `post/*/index.html` (best-effort extraction)
-so we avoid introducing a framework.
+Listing pages hold at most --page-size posts, so what a reader downloads stays
+bounded however large the corpus grows. Pages under tags/ and archive/ that
+are no longer produced are deleted.
+
+Every page links the other site languages from its nav. A tag used in more
+than one language cross-links its pages with <link rel="alternate" hreflang>,
+as do the tag indexes (alternate_links). The archive is one chronology of the
+whole site.
+
+The first page of each of a language's FEED_TAGS biggest tags advertises the
+tag's feeds (written by feeds.py) with <link rel="alternate" type=...>.
+
+--minify squeezes whitespace out of the generated HTML and --critical-css
+inlines the above-the-fold rules of styles/main.css while the full sheet loads
+without blocking (see scripts/minify.py).
+
+All pages are generated from existing `post/*/index.html` (best-effort extraction
+via scripts/postmeta.py) so we avoid introducing a framework.
 
 Usage:
   scripts/generate_pages.py --root . --base https://ai.liexpress.cc
@@ -15,126 +37,112 @@ Usage:
 
 import argparse
 import html
-import json
-import re
-from dataclasses import dataclass
+from itertools import chain, islice
 from pathlib import Path
-from typing import Optional
-
-TITLE_RE = re.compile(r"<title>(.*?)</title>", re.I | re.S)
-META_DESC_RE = re.compile(r"<meta\s+name=\"description\"\s+content=\"(.*?)\"\s*/?>", re.I | re.S)
-JSONLD_RE = re.compile(r"<script\s+type=\"application/ld\+json\"[^>]*>(.*?)</script>", re.I | re.S)
-DATE_RE = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
-
-
-def strip_tags(s: str) -> str:
-    s = re.sub(r"<[^>]+>", "", s)
-    s = html.unescape(s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-def parse_jsonld(text: str) -> list[dict]:
-    out = []
-    for block in JSONLD_RE.findall(text):
-        block = block.strip()
-        if not block:
-            continue
-        try:
-            data = json.loads(block)
-            if isinstance(data, dict):
-                out.append(data)
-            elif isinstance(data, list):
-                out.extend([x for x in data if isinstance(x, dict)])
-        except Exception:
-            continue
-    return out
-
-
-def pick_title(text: str) -> str:
-    m = TITLE_RE.search(text)
-    if not m:
-        return "(untitled)"
-    t = strip_tags(m.group(1))
-    t = re.sub(r"\s*\|\s*Mr\.\s*Qizhi\s*$", "", t)
-    return t.strip() or "(untitled)"
-
-
-def pick_excerpt(text: str) -> str:
-    m = META_DESC_RE.search(text)
-    if m:
-        return strip_tags(m.group(1))
-    return ""
-
-
-def pick_date(text: str, jsonlds: list[dict]) -> Optional[str]:
-    for d in jsonlds:
-        if d.get("@type") in ("Article", "BlogPosting"):
-            v = d.get("datePublished") or d.get("dateCreated")
-            if isinstance(v, str) and DATE_RE.search(v):
-                return DATE_RE.search(v).group(1)
-    m = DATE_RE.search(text)
-    return m.group(1) if m else None
-
-
-def pick_tags(jsonlds: list[dict]) -> list[str]:
-    for d in jsonlds:
-        if d.get("@type") in ("Article", "BlogPosting"):
-            kw = d.get("keywords")
-            if isinstance(kw, str) and kw.strip():
-                return [p.strip() for p in kw.split(",") if p.strip()]
-            if isinstance(kw, list):
-                return [str(x).strip() for x in kw if str(x).strip()]
-    return []
-
-
-@dataclass
-class Post:
-    slug: str
-    title: str
-    date: str
-    excerpt: str
-    tags: list[str]
-
-
-def read_posts(root: Path) -> list[Post]:
-    post_root = root / "post"
-    posts: list[Post] = []
-    for d in sorted([x for x in post_root.iterdir() if x.is_dir()]):
-        hp = d / "index.html"
-        if not hp.exists():
-            continue
-        text = hp.read_text(encoding="utf-8", errors="ignore")
-        jsonlds = parse_jsonld(text)
-        title = pick_title(text)
-        excerpt = pick_excerpt(text)
-        date = pick_date(text, jsonlds) or "1970-01-01"
-        tags = pick_tags(jsonlds)
-        posts.append(Post(slug=d.name, title=title, date=date, excerpt=excerpt, tags=tags))
-    posts.sort(key=lambda p: (p.date, p.slug), reverse=True)
-    return posts
-
-
-def page_head(base: str, title: str, desc: str) -> str:
+from typing import Iterable, Iterator
+
+import profiling
+from fingerprint import asset_url
+from facets import build_facets
+from minify import HtmlSqueezer, critical_for, stylesheet
+from outputs import PageWriter, digest, is_fresh
+from postmeta import DEFAULT_LANG, SITE_LANGS, Post, lang_prefix, load_alias_map, scan_posts, split_by_lang
+
+# Bump when page_head/page_tail or any page body markup changes.
+TEMPLATE_VERSION = 7
+PAGE_SIZE = 50
+# Body fragments/rows counted as above the fold for --critical-css.
+FOLD_ROWS = 10
+# Per-tag page trees, one per site language.
+TAG_DIRS = [f"{lang_prefix(lang)}tags" for lang in SITE_LANGS]
+# Feed file -> MIME type; feeds.py writes all three next to each homepage and feed tag page.
+FEED_FILES = {"feed.xml": "application/rss+xml", "atom.xml": "application/atom+xml", "feed.json": "application/feed+json"}
+# Tags per language (most posts first) that get their own feeds.
+FEED_TAGS = 10
+# Native name of each site language, for the language switch.
+LANG_NAMES = {"en": "English", "zh": "中文"}
+# UI strings by language; text missing here stays English.
+UI = {
+    "zh": {
+        "About": "关于",
+        "Tags": "标签",
+        "Archive": "归档",
+        "All tags": "全部标签",
+        "Combine with other tags": "与其他标签组合",
+        "Filter by several tags": "按多个标签筛选",
+        "Browse by tags": "按标签浏览",
+        "In other languages": "其他语言",
+        "Posts tagged {}": "标签为 {} 的文章",
+        "{} (page {})": "{}（第 {} 页）",
+        "← Newer": "← 较新",
+        "Older →": "较早 →",
+        "Page {} of {}": "第 {} / {} 页",
+        "Start here": "从这里开始",
+        "Browse tags": "按标签浏览",
+        "Topics": "主题",
+        "Latest": "最新文章",
+    },
+}
+
+
+def ui(lang: str, text: str) -> str:
+    return UI.get(lang, {}).get(text, text)
+
+
+def alternate_links(urls: dict[str, str] | None, indent: str = "  ") -> str:
+    """<link rel="alternate" hreflang> lines for {lang: url}, plus x-default; "" for fewer than two."""
+    if not urls or len(urls) < 2:
+        return ""
+    urls = {**urls, "x-default": urls.get(DEFAULT_LANG, next(iter(urls.values())))}
+    return "".join(
+        f"{indent}<link rel=\"alternate\" hreflang=\"{lang}\" href=\"{html.escape(url)}\">\n" for lang, url in urls.items()
+    )
+
+
+def feed_title(lang: str, tag: str | None = None) -> str:
+    title = "Mr. Qizhi" if lang == DEFAULT_LANG else f"Mr. Qizhi · {LANG_NAMES[lang]}"
+    return f"{title} · #{tag}" if tag else title
+
+
+def feed_links(url: str, title: str, indent: str = "  ") -> str:
+    """Feed discovery <link>s (page_head's feeds) for the feeds in directory URL url."""
+    return "".join(
+        f"{indent}<link rel=\"alternate\" type=\"{mime}\" title=\"{html.escape(title)}\" href=\"{url}{name}\">\n"
+        for name, mime in FEED_FILES.items()
+    )
+
+
+def lang_switch(base: str, lang: str, alternates: dict[str, str] | None = None) -> str:
+    """Nav links to the other site languages: this page's translation, else their homepage."""
+    return "".join(
+        f"\n        <a href=\"{(alternates or {}).get(other) or f'{base}/{lang_prefix(other)}'}\" hreflang=\"{other}\" lang=\"{other}\">{LANG_NAMES[other]}</a>"
+        for other in SITE_LANGS if other != lang
+    )
+
+
+def page_head(
+    base: str, title: str, desc: str, css: str, canonical: str, critical: str | None = None,
+    lang: str = DEFAULT_LANG, alternates: dict[str, str] | None = None, feeds: str = "",
+) -> str:
     return f"""<!DOCTYPE html>
-<html lang=\"en\">
+<html lang=\"{lang}\">
 <head>
   <meta charset=\"utf-8\" />
   <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
   <title>{html.escape(title)} | Mr. Qizhi</title>
   <meta name=\"description\" content=\"{html.escape(desc)}\" />
-  <link rel=\"stylesheet\" href=\"{base}/styles/main.css\">
-  <link rel=\"canonical\" href=\"{base}/\"> 
-</head>
+  {stylesheet(css, critical)}
+  <link rel=\"canonical\" href=\"{canonical}\"> 
+{alternate_links(alternates)}{feeds}</head>
 <body>
   <div class=\"main\">
     <div class=\"site-header\">
-      <a href=\"{base}/\"><h1 class=\"site-title\">Mr. Qizhi</h1></a>
+      <a href=\"{base}/{lang_prefix(lang)}\"><h1 class=\"site-title\">Mr. Qizhi</h1></a>
       <p class=\"site-description\">AI · Urban Planning · Gov-Tech · Digital Transformation · Digital Twin</p>
       <div class=\"top-nav\">
-        <a href=\"{base}/about.html\">About</a>
-        <a href=\"{base}/tags.html\">Tags</a>
-        <a href=\"{base}/archive.html\">Archive</a>
+        <a href=\"{base}/about.html\">{ui(lang, 'About')}</a>
+        <a href=\"{base}/{lang_prefix(lang)}tags.html\">{ui(lang, 'Tags')}</a>
+        <a href=\"{base}/archive.html\">{ui(lang, 'Archive')}</a>{lang_switch(base, lang, alternates)}
       </div>
     </div>
 
@@ -155,10 +163,21 @@ def page_tail() -> str:
 """
 
 
-def render_simple_list(posts: list[Post], base: str) -> str:
-    out = "<div class=\"page\">\n"
+def fold_css(root: Path, enabled: bool, head: str, *body: Iterable[str]) -> str | None:
+    """Critical CSS for a page whose fold is head plus the first FOLD_ROWS body fragments."""
+    if not enabled:
+        return None
+    return critical_for(root, head + "".join(islice(chain(*body), FOLD_ROWS)))
+
+
+def page_writer(root: Path, rel: str, key: str, minify: bool) -> PageWriter:
+    return PageWriter(root, rel, key, transform=HtmlSqueezer() if minify else None)
+
+
+def render_simple_list(posts: list[Post], base: str) -> Iterator[str]:
+    yield "<div class=\"page\">\n"
     for p in posts:
-        out += (
+        yield (
             "  <article class=\"post-item\">\n"
             f"    <h2 class=\"post-title\"><a href=\"{base}/post/{p.slug}/\">{html.escape(p.title)}</a></h2>\n"
             "    <div class=\"post-meta\">\n"
@@ -167,11 +186,11 @@ def render_simple_list(posts: list[Post], base: str) -> str:
             f"    <p class=\"post-excerpt\">{html.escape(p.excerpt)}</p>\n"
             "  </article>\n"
         )
-    out += "</div>\n"
-    return out
+    yield "</div>\n"
 
 
-def gen_about(root: Path, base: str):
+def gen_about(root: Path, base: str, force: bool = False, minify: bool = False, critical_css: bool = False) -> bool:
+    css = asset_url(root, base, "styles/main.css")
     title = "About"
     desc = "About Mr. Qizhi"
     body = """
@@ -183,117 +202,321 @@ def gen_about(root: Path, base: str):
   </div>
 </div>
 """
-    (root / "about.html").write_text(page_head(base, title, desc) + body + page_tail(), encoding="utf-8")
+    head = (base, title, desc, css, f"{base}/about.html")
+    crit = fold_css(root, critical_css, page_head(*head), [body])
+    key = digest("about", TEMPLATE_VERSION, base, css, minify, crit)
+    if not force and is_fresh(root, "about.html", key):
+        return False
+    with page_writer(root, "about.html", key, minify) as w:
+        w.write(page_head(*head, critical=crit))
+        w.write(body)
+        w.write(page_tail())
+    return w.written
 
 
-def gen_archive(root: Path, base: str, posts: list[Post]):
-    title = "Archive"
-    desc = "Archive by time"
-    # group by YYYY-MM
-    groups: dict[str, list[Post]] = {}
-    for p in posts:
-        ym = p.date[:7]
-        groups.setdefault(ym, []).append(p)
+def paginate(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)] or [[]]
 
-    body = ["<div class=\"page\">", "  <div class=\"page-card\">", "    <h2>Archive</h2>"]
-    for ym in sorted(groups.keys(), reverse=True):
-        body.append(f"    <h3 class=\"archive-month\">{html.escape(ym)}</h3>")
-        body.append("    <ul class=\"archive-list\">")
-        for p in groups[ym]:
-            body.append(
-                f"      <li><a href=\"{base}/post/{p.slug}/\">{html.escape(p.title)}</a> <span class=\"archive-date\">{html.escape(p.date)}</span></li>"
-            )
-        body.append("    </ul>")
-    body += ["  </div>", "</div>"]
 
-    (root / "archive.html").write_text(page_head(base, title, desc) + "\n".join(body) + page_tail(), encoding="utf-8")
+def page_rel(dir_rel: str, n: int) -> str:
+    """Output path of page n (1-based) of a paginated listing under dir_rel."""
+    return f"{dir_rel}/index.html" if n == 1 else f"{dir_rel}/page/{n}/index.html"
 
 
-def load_json(path: Path):
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return None
-
-
-def norm_tag(t: str, alias_map: dict[str, str] | None) -> str:
-    t = t.strip()
-    t = re.sub(r"\s+", " ", t)
-    if alias_map and t in alias_map:
-        t = alias_map[t]
-    return t
+def page_url(base: str, dir_rel: str, n: int) -> str:
+    return f"{base}/{dir_rel}/" if n == 1 else f"{base}/{dir_rel}/page/{n}/"
 
 
-def tag_anchor(t: str) -> str:
-    # stable and url-safe anchor
-    a = t.lower()
-    a = re.sub(r"[^a-z0-9\u4e00-\u9fff]+", "-", a)
-    a = a.strip("-")
-    return a or "tag"
+def render_pager(base: str, dir_rel: str, n: int, total: int, lang: str = DEFAULT_LANG) -> str:
+    if total <= 1:
+        return ""
+    parts = ["<nav class=\"pager\">"]
+    if n > 1:
+        parts.append(f"  <a class=\"pager-prev\" href=\"{page_url(base, dir_rel, n - 1)}\">{ui(lang, '← Newer')}</a>")
+    parts.append(f"  <span class=\"pager-status\">{ui(lang, 'Page {} of {}').format(n, total)}</span>")
+    if n < total:
+        parts.append(f"  <a class=\"pager-next\" href=\"{page_url(base, dir_rel, n + 1)}\">{ui(lang, 'Older →')}</a>")
+    parts.append("</nav>")
+    return "\n".join(parts) + "\n"
 
 
-def gen_tags(root: Path, base: str, posts: list[Post]):
-    title = "Tags"
-    desc = "Browse by tags"
+def render_month_list(base: str, posts: list[Post]) -> Iterator[str]:
+    # group by YYYY-MM, newest first
+    groups: dict[str, list[Post]] = {}
+    for p in posts:
+        groups.setdefault(p.date[:7], []).append(p)
+    for ym in sorted(groups.keys(), reverse=True):
+        yield f"    <h3 id=\"{html.escape(ym)}\" class=\"archive-month\">{html.escape(ym)}</h3>"
+        yield "    <ul class=\"archive-list\">"
+        for p in groups[ym]:
+            yield f"      <li><a href=\"{base}/post/{p.slug}/\">{html.escape(p.title)}</a> <span class=\"archive-date\">{html.escape(p.date)}</span></li>"
+        yield "    </ul>"
 
-    # Optional tag alias map
-    alias_map = None
-    alias_path = root / "data" / "tags-alias.json"
-    if alias_path.exists():
-        x = load_json(alias_path)
-        if isinstance(x, dict):
-            alias_map = x
 
-    tagmap: dict[str, list[Post]] = {}
+def gen_archive(
+    root: Path, base: str, posts: list[Post], page_size: int, produced: set[str],
+    force: bool = False, minify: bool = False, critical_css: bool = False,
+) -> bool:
+    css = asset_url(root, base, "styles/main.css")
+    years: dict[str, list[Post]] = {}
     for p in posts:
-        for t in p.tags:
-            t = norm_tag(t, alias_map)
-            if not t:
+        years.setdefault(p.date[:4], []).append(p)
+
+    written = False
+    # month -> (year, page number it starts on)
+    month_page: dict[str, tuple[str, int]] = {}
+    for year, ps in years.items():
+        dir_rel = f"archive/{year}"
+        pages = paginate(ps, page_size)
+        for n, chunk in enumerate(pages, 1):
+            for p in chunk:
+                month_page.setdefault(p.date[:7], (year, n))
+            rel = page_rel(dir_rel, n)
+            produced.add(rel)
+            title = f"Archive {year}" if n == 1 else f"Archive {year} (page {n})"
+            head = (base, title, f"Posts from {year}", css, page_url(base, dir_rel, n))
+            top = ["<div class=\"page\">", "  <div class=\"page-card\">", f"    <h2>{html.escape(title)}</h2>"]
+            crit = fold_css(root, critical_css, page_head(*head), top, render_month_list(base, chunk))
+            key = digest(
+                "archive-year", TEMPLATE_VERSION, base, css, year, n, len(pages),
+                [(p.slug, p.title, p.date) for p in chunk], minify, crit,
+            )
+            if not force and is_fresh(root, rel, key):
                 continue
-            tagmap.setdefault(t, []).append(p)
-
-    # Sort tags by post count desc then name
-    tags_sorted = sorted(tagmap.items(), key=lambda kv: (-len(kv[1]), kv[0].lower()))
-
-    body = ["<div class=\"page\">", "  <div class=\"page-card\">", "    <h2>Tags</h2>"]
-
-    # tag index
-    body.append("    <div class=\"tag-index\">")
-    for t, ps in tags_sorted:
-        body.append(
-            f"      <a class=\"tag-chip\" href=\"#{html.escape(tag_anchor(t))}\">{html.escape(t)} <span class=\"tag-count\">{len(ps)}</span></a>"
+            with page_writer(root, rel, key, minify) as w:
+                w.write(page_head(*head, critical=crit))
+                w.lines(chain(
+                    top,
+                    render_month_list(base, chunk),
+                    ["  </div>", render_pager(base, dir_rel, n, len(pages)), "</div>"],
+                ))
+                w.write(page_tail())
+            written |= w.written
+
+    counts: dict[str, int] = {}
+    for p in posts:
+        counts[p.date[:7]] = counts.get(p.date[:7], 0) + 1
+
+    def rows() -> Iterator[str]:
+        yield from ["<div class=\"page\">", "  <div class=\"page-card\">", "    <h2>Archive</h2>"]
+        for year in sorted(years.keys(), reverse=True):
+            yield f"    <h3 class=\"archive-month\"><a href=\"{base}/archive/{year}/\">{html.escape(year)}</a> <span class=\"tag-count\">{len(years[year])}</span></h3>"
+            yield "    <ul class=\"archive-list\">"
+            for ym in sorted((m for m in counts if m[:4] == year), reverse=True):
+                _, n = month_page[ym]
+                yield f"      <li><a href=\"{page_url(base, f'archive/{year}', n)}#{html.escape(ym)}\">{html.escape(ym)}</a> <span class=\"archive-date\">{counts[ym]}</span></li>"
+            yield "    </ul>"
+        yield from ["  </div>", "</div>"]
+
+    head = (base, "Archive", "Archive by time", css, f"{base}/archive.html")
+    crit = fold_css(root, critical_css, page_head(*head), rows())
+    key = digest(
+        "archive", TEMPLATE_VERSION, base, css, sorted(month_page.items()),
+        {y: len(ps) for y, ps in years.items()}, minify, crit,
+    )
+    if force or not is_fresh(root, "archive.html", key):
+        with page_writer(root, "archive.html", key, minify) as w:
+            w.write(page_head(*head, critical=crit))
+            w.lines(rows())
+            w.write(page_tail())
+        written |= w.written
+    return written
+
+
+def group_tags(posts: list[Post], alias_map: dict[str, str] | None) -> tuple[dict[str, str], list[tuple[str, list[Post]]]]:
+    """({anchor: display name}, [(anchor, posts)] by post count desc then name).
+
+    Keyed by anchor so every tag page has exactly one URL; the first spelling
+    seen names the page.
+    """
+    f = build_facets([p.tags for p in posts], alias_map)
+    return f.names, [(a, [posts[i] for i in f.posts[a]]) for a in f.ranked()]
+
+
+def gen_tags(
+    root: Path, base: str, by_lang: dict[str, list[Post]], page_size: int, produced: set[str],
+    force: bool = False, minify: bool = False, critical_css: bool = False,
+) -> bool:
+    """Tag pages and tag index of every site language (by_lang from split_by_lang)."""
+    alias_map = load_alias_map(root)
+    grouped = {lang: group_tags(ps, alias_map) for lang, ps in by_lang.items()}
+    # anchor -> {lang: first page URL}: one tag across languages is one set of alternates
+    tag_urls: dict[str, dict[str, str]] = {}
+    for lang, (_, tags_sorted) in grouped.items():
+        for a, _ in tags_sorted:
+            tag_urls.setdefault(a, {})[lang] = f"{base}/{lang_prefix(lang)}tags/{a}/"
+    index_urls = {lang: f"{base}/{lang_prefix(lang)}tags.html" for lang in grouped}
+    # Tags the default language lacks, for its index: (anchor, name, lang, posts),
+    # each under the first other language that has it.
+    elsewhere: dict[str, tuple[str, str, str, int]] = {}
+    for lang, (names, tags_sorted) in grouped.items():
+        for a, ps in tags_sorted:
+            if DEFAULT_LANG not in tag_urls[a]:
+                elsewhere.setdefault(a, (a, names[a], lang, len(ps)))
+
+    written = False
+    for lang, (names, tags_sorted) in grouped.items():
+        written |= gen_lang_tags(
+            root, base, lang, names, tags_sorted, tag_urls, index_urls, page_size, produced,
+            list(elsewhere.values()) if lang == DEFAULT_LANG else [], force=force, minify=minify, critical_css=critical_css,
         )
-    body.append("    </div>")
-
-    # per tag
-    for t, ps in tags_sorted:
-        body.append(f"    <h3 id=\"{html.escape(tag_anchor(t))}\" class=\"tag-title\">{html.escape(t)} <span class=\"tag-count\">{len(ps)}</span></h3>")
-        body.append("    <ul class=\"tag-list\">")
-        for p in ps:
-            body.append(
-                f"      <li><a href=\"{base}/post/{p.slug}/\">{html.escape(p.title)}</a> <span class=\"archive-date\">{html.escape(p.date)}</span></li>"
+    return written
+
+
+def gen_lang_tags(
+    root: Path, base: str, lang: str, names: dict[str, str], tags_sorted: list[tuple[str, list[Post]]],
+    tag_urls: dict[str, dict[str, str]], index_urls: dict[str, str], page_size: int, produced: set[str],
+    elsewhere: list[tuple[str, str, str, int]], force: bool = False, minify: bool = False, critical_css: bool = False,
+) -> bool:
+    css = asset_url(root, base, "styles/main.css")
+    prefix = lang_prefix(lang)
+    feed_tags = {a for a, _ in tags_sorted[:FEED_TAGS]}
+
+    written = False
+    for a, ps in tags_sorted:
+        dir_rel = f"{prefix}tags/{a}"
+        pages = paginate(ps, page_size)
+        for n, chunk in enumerate(pages, 1):
+            rel = page_rel(dir_rel, n)
+            produced.add(rel)
+            title = f"#{names[a]}" if n == 1 else ui(lang, "{} (page {})").format(f"#{names[a]}", n)
+            alternates = tag_urls[a] if n == 1 else None
+            feeds = feed_links(page_url(base, dir_rel, 1), feed_title(lang, names[a])) if n == 1 and a in feed_tags else ""
+            head = (base, title, ui(lang, "Posts tagged {}").format(names[a]), css, page_url(base, dir_rel, n))
+            top = (
+                "<div class=\"page\">\n"
+                "  <div class=\"page-card\">\n"
+                f"    <h2>{html.escape(names[a])} <span class=\"tag-count\">{len(ps)}</span></h2>\n"
+                f"    <p class=\"muted\"><a href=\"{base}/{prefix}tags.html\">{ui(lang, 'All tags')}</a> · "
+                f"<a href=\"{base}/search.html?lang={lang}&amp;tags={html.escape(a)}\">{ui(lang, 'Combine with other tags')}</a></p>\n"
+                "  </div>\n"
+                "</div>\n"
             )
-        body.append("    </ul>")
-
-    body += ["  </div>", "</div>"]
-
-    (root / "tags.html").write_text(page_head(base, title, desc) + "\n".join(body) + page_tail(), encoding="utf-8")
+            crit = fold_css(
+                root, critical_css, page_head(*head, lang=lang, alternates=alternates, feeds=feeds), [top], render_simple_list(chunk, base)
+            )
+            key = digest(
+                "tag", TEMPLATE_VERSION, base, css, lang, alternates, feeds, names[a], len(ps), n, len(pages),
+                [(p.slug, p.title, p.date, p.excerpt) for p in chunk], minify, crit,
+            )
+            if not force and is_fresh(root, rel, key):
+                continue
+            with page_writer(root, rel, key, minify) as w:
+                w.write(page_head(*head, critical=crit, lang=lang, alternates=alternates, feeds=feeds))
+                w.write(top)
+                w.writeall(render_simple_list(chunk, base))
+                w.write(render_pager(base, dir_rel, n, len(pages), lang))
+                w.write(page_tail())
+            written |= w.written
+
+    def rows() -> Iterator[str]:
+        yield from ["<div class=\"page\">", "  <div class=\"page-card\">", f"    <h2>{ui(lang, 'Tags')}</h2>"]
+        yield f"    <p class=\"muted\"><a href=\"{base}/search.html?lang={lang}\">{ui(lang, 'Filter by several tags')}</a></p>"
+        # id keeps old tags.html#<anchor> links landing on the right chip
+        yield "    <div class=\"tag-index\">"
+        for a, ps in tags_sorted:
+            yield f"      <a id=\"{html.escape(a)}\" class=\"tag-chip\" href=\"{base}/{prefix}tags/{html.escape(a)}/\">{html.escape(names[a])} <span class=\"tag-count\">{len(ps)}</span></a>"
+        yield "    </div>"
+        if elsewhere:
+            yield f"    <h3>{ui(lang, 'In other languages')}</h3>"
+            yield "    <div class=\"tag-index\">"
+            for a, name, other, n in elsewhere:
+                yield (
+                    f"      <a id=\"{html.escape(a)}\" class=\"tag-chip\" href=\"{base}/{lang_prefix(other)}tags/{html.escape(a)}/\""
+                    f" hreflang=\"{other}\" lang=\"{other}\">{html.escape(name)} <span class=\"tag-count\">{n}</span></a>"
+                )
+            yield "    </div>"
+        yield from ["  </div>", "</div>"]
+
+    rel = f"{prefix}tags.html"
+    head = (base, ui(lang, "Tags"), ui(lang, "Browse by tags"), css, index_urls[lang])
+    crit = fold_css(root, critical_css, page_head(*head, lang=lang, alternates=index_urls), rows())
+    key = digest(
+        "tags", TEMPLATE_VERSION, base, css, lang, index_urls,
+        [(a, names[a], len(ps)) for a, ps in tags_sorted], elsewhere, minify, crit,
+    )
+    if force or not is_fresh(root, rel, key):
+        with page_writer(root, rel, key, minify) as w:
+            w.write(page_head(*head, critical=crit, lang=lang, alternates=index_urls))
+            w.lines(rows())
+            w.write(page_tail())
+        written |= w.written
+    return written
+
+
+def remove_stale(root: Path, dirs: list[str], produced: set[str]) -> int:
+    """Delete generated index.html files under dirs that this run did not produce."""
+    removed = 0
+    for d in dirs:
+        top = root / d
+        if not top.exists():
+            continue
+        for f in sorted(top.rglob("index.html")):
+            if f.relative_to(root).as_posix() not in produced:
+                f.unlink()
+                f.with_name("index.html.gz").unlink(missing_ok=True)  # compress.py sidecar
+                removed += 1
+        for sub in sorted((x for x in top.rglob("*") if x.is_dir()), reverse=True):
+            if not any(sub.iterdir()):
+                sub.rmdir()
+    return removed
+
+
+def generate_pages(
+    root: Path, base: str, posts: list[Post], force: bool = False, page_size: int = PAGE_SIZE,
+    minify: bool = False, critical_css: bool = False,
+) -> None:
+    produced: set[str] = set()
+    results = {}
+    opts = {"force": force, "minify": minify, "critical_css": critical_css}
+    with profiling.stage("about"):
+        results["about.html"] = gen_about(root, base, **opts)
+    with profiling.stage("archive"):
+        results["archive"] = gen_archive(root, base, posts, page_size, produced, **opts)
+    with profiling.stage("tags"):
+        results["tags"] = gen_tags(root, base, split_by_lang(posts), page_size, produced, **opts)
+    with profiling.stage("remove_stale"):
+        removed = remove_stale(root, [*TAG_DIRS, "archive"], produced)
+    written = [name for name, w in results.items() if w]
+    unchanged = [name for name, w in results.items() if not w]
+    msg = f"Generated {', '.join(written)}" if written else "Helper pages up to date"
+    if written and unchanged:
+        msg += f" ({', '.join(unchanged)} unchanged)"
+    msg += f"; {len(produced)} listing pages"
+    if removed:
+        msg += f", {removed} stale removed"
+    print(msg)
+
+
+def positive_int(text: str) -> int:
+    """argparse type for sizes and counts: an int >= 1."""
+    n = int(text)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
 
 
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--root", default=".")
     ap.add_argument("--base", default="https://ai.liexpress.cc")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/postmeta.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel extraction processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="re-render even if inputs are unchanged")
+    ap.add_argument("--page-size", type=positive_int, default=PAGE_SIZE, help="posts per tag/archive listing page")
+    ap.add_argument("--minify", action="store_true", help="collapse whitespace and drop comments in the generated HTML")
+    ap.add_argument("--critical-css", action="store_true", help="inline above-the-fold CSS, load the full stylesheet async")
+    profiling.add_arguments(ap)
     args = ap.parse_args()
 
     root = Path(args.root).resolve()
-    posts = read_posts(root)
-
-    gen_about(root, args.base)
-    gen_archive(root, args.base, posts)
-    gen_tags(root, args.base, posts)
-
-    print("Generated about.html, archive.html, tags.html")
+    with profiling.session(args, "generate_pages", root):
+        with profiling.stage("scan"):
+            posts = scan_posts(root, use_cache=not args.no_cache, jobs=args.jobs)
+        generate_pages(
+            root, args.base, posts, force=args.force, page_size=args.page_size,
+            minify=args.minify, critical_css=args.critical_css,
+        )
     return 0
 
 
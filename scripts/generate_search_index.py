@@ -1,146 +1,346 @@
 #!/usr/bin/env python3
-"""Generate search.json for client-side search.
+"""Generate the client-side search index.
 
-Output: search.json (array)
-Fields: title, url, date, excerpt, tags
+Outputs:
+- search/manifest.json: shard list, newest first
+- search/manifest-<lang>.json: the same for one language's shards, so a
+  reader only downloads posts in their language
+- search/<lang>-<year>-<n>.<hash>.json: compact shards of at most SHARD_SIZE posts
+- search/<lang>-<year>-<n>.body.<hash>.bin: gzipped full-text index over the
+  bodies of one shard's posts (only with --body-index)
+- search/facets[-<lang>].<hash>.json: tag facet index over a manifest's docs
+  (see facets.py), for filtering by several tags
+- search.json: full array (kept for existing consumers)
+- search-worker.js: the search.html worker, from scripts/search_worker.js
+
+The worker owns the index: it loads the manifest and shards, ranks queries
+and keeps an LRU of recent results, narrowing from a cached query when the
+new one extends it. search.html only debounces input, posts the query and
+swaps in the rendered results.
+
+Fields: title, url, date, excerpt, tags, lang (tags normalized with
+postmeta.norm_tags, like every other stage)
+
+Each shard is {"docs": [...], "terms": [...], "postings": [...]}: an inverted
+index over its own docs. terms is sorted (the client binary-searches it for
+prefix matches) and postings[i] is a flat [doc, weight, doc, weight, ...] list
+for terms[i], doc ascending. weight sums FIELD_WEIGHTS over the fields the
+term occurs in.
+
+Tokenization (mirrored in the worker, which gets TOKEN_PATTERN from here):
+- lowercase; runs of [a-z0-9] are words
+- runs of CJK ideographs become character bigrams, plus the run's last
+  character as a unigram so every character starts some term
+
+Shard and body file names carry a content hash, so they are immutable and
+cacheable for as long as a CDN likes; only manifest.json is revalidated.
+The worker fetches the manifest, then the newest shard, and only pulls older
+shards when a query has not yet filled the result list. Time-to-first-result
+stays flat as the corpus grows.
+
+A body index belongs to its shard (the manifest entry's "body") and
+addresses that shard's docs by position, so the worker fetches it along with
+the shard when a query runs, and an edit re-encodes only its own shard's.
+Encoded indexes are remembered in .cache/search-body.json by a digest of the
+bodies. The facet index addresses docs by global id: shard docs concatenated
+in the order of the manifest that lists them.
+
+Body index layout, gzipped as a whole:
+- magic b"QZB1", then little-endian u32 term count, doc count, dict bytes
+- dictionary, one entry per sorted term, front-coded against the previous
+  term: varint shared-prefix bytes, varint suffix bytes, UTF-8 suffix,
+  varint posting bytes
+- postings, in term order: ascending doc ids as LEB128 varint deltas
 
 Usage:
   scripts/generate_search_index.py --root . --base https://ai.liexpress.cc
 """
 
 import argparse
-import html
+import gc
+import gzip
 import json
 import re
+import struct
 from pathlib import Path
-from typing import Optional
 
-TITLE_RE = re.compile(r"<title>(.*?)</title>", re.I | re.S)
-META_DESC_RE = re.compile(r"<meta\s+name=\"description\"\s+content=\"(.*?)\"\s*/?>", re.I | re.S)
-JSONLD_RE = re.compile(r"<script\s+type=\"application/ld\+json\"[^>]*>(.*?)</script>", re.I | re.S)
-DATE_RE = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
+import profiling
+from facets import build_facets
+from fingerprint import hashed_name
+from outputs import atomic_write, digest, is_fresh, write_output
+from postmeta import Post, lang_key, load_alias_map, load_json, norm_tags, scan_posts
 
+# Bump when the item, shard or manifest shape changes.
+FORMAT_VERSION = 8
+SHARD_DIR = "search"
+SHARD_SIZE = 500
+WORKER = "search-worker.js"
+WORKER_TEMPLATE = Path(__file__).with_name("search_worker.js")
+FIELD_WEIGHTS = {"title": 3, "tags": 2, "excerpt": 1}
+BODY_CACHE_PATH = Path(".cache") / "search-body.json"
 
-def strip_tags(s: str) -> str:
-    s = re.sub(r"<[^>]+>", "", s)
-    s = html.unescape(s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+# Also written into the worker; kept as a string since --profile wraps *_RE.
+TOKEN_PATTERN = r"[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+"
+TOKEN_RE = re.compile(TOKEN_PATTERN)
 
 
-def parse_jsonld(text: str) -> list[dict]:
+def tokenize(text: str) -> list[str]:
     out = []
-    for block in JSONLD_RE.findall(text):
-        block = block.strip()
-        if not block:
-            continue
-        try:
-            data = json.loads(block)
-            if isinstance(data, dict):
-                out.append(data)
-            elif isinstance(data, list):
-                out.extend([x for x in data if isinstance(x, dict)])
-        except Exception:
+    for m in TOKEN_RE.finditer(text.lower()):
+        w = m.group(0)
+        if w[0].isascii():
+            out.append(w)
             continue
+        out.extend(w[i:i + 2] for i in range(len(w) - 1))
+        out.append(w[-1])
     return out
 
 
-def pick_title(text: str) -> str:
-    m = TITLE_RE.search(text)
-    if not m:
-        return "(untitled)"
-    t = strip_tags(m.group(1))
-    t = re.sub(r"\s*\|\s*Mr\.\s*Qizhi\s*$", "", t)
-    return t.strip() or "(untitled)"
+def build_postings(docs: list[dict]) -> tuple[list[str], list[list[int]]]:
+    """Inverted index over docs: sorted terms and flat (doc, weight) postings."""
+    index: dict[str, dict[int, int]] = {}
+    for i, d in enumerate(docs):
+        fields = {"title": d["title"], "tags": " ".join(d["tags"]), "excerpt": d["excerpt"]}
+        for name, text in fields.items():
+            for t in set(tokenize(text)):
+                posting = index.setdefault(t, {})
+                posting[i] = posting.get(i, 0) + FIELD_WEIGHTS[name]
+    terms = sorted(index)
+    postings = [[x for doc, w in sorted(index[t].items()) for x in (doc, w)] for t in terms]
+    return terms, postings
+
+
+def search_items(base: str, posts: list[Post], alias_map: dict[str, str] | None) -> list[dict]:
+    items = []
+    for p in posts:
+        items.append(
+            {
+                "title": p.title,
+                "url": f"{base}/post/{p.slug}/",
+                "date": p.date,
+                "excerpt": p.excerpt,
+                "tags": norm_tags(p.tags, alias_map),
+                "lang": lang_key(p.lang),
+            }
+        )
+
+    items.sort(key=lambda x: (x.get("date", ""), x.get("url", "")), reverse=True)
+    return items
+
+
+def varint(n: int, out: bytearray) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
 
 
-def pick_excerpt(text: str) -> str:
-    m = META_DESC_RE.search(text)
-    return strip_tags(m.group(1)) if m else ""
+def _varint_bytes(n: int) -> bytes:
+    out = bytearray()
+    varint(n, out)
+    return bytes(out)
 
 
-def pick_date(text: str, jsonlds: list[dict]) -> Optional[str]:
-    for d in jsonlds:
-        if d.get("@type") in ("Article", "BlogPosting"):
-            v = d.get("datePublished") or d.get("dateCreated")
-            if isinstance(v, str) and DATE_RE.search(v):
-                return DATE_RE.search(v).group(1)
-    m = DATE_RE.search(text)
-    return m.group(1) if m else None
+# Encoded varints of every value that fits in two bytes: doc ids and deltas
+# within a shard, prefix and suffix lengths, and nearly all posting lengths.
+# Encoding one term is then a few list lookups and a join, not a Python loop
+# per byte.
+VARINTS = [_varint_bytes(n) for n in range(1 << 14)]
 
 
-def pick_tags(jsonlds: list[dict]) -> list[str]:
-    for d in jsonlds:
-        if d.get("@type") in ("Article", "BlogPosting"):
-            kw = d.get("keywords")
-            if isinstance(kw, str) and kw.strip():
-                return [p.strip() for p in kw.split(",") if p.strip()]
-            if isinstance(kw, list):
-                return [str(x).strip() for x in kw if str(x).strip()]
-    return []
+def _vb(n: int) -> bytes:
+    return VARINTS[n] if n < 0x4000 else _varint_bytes(n)
 
 
-def load_json(path: Path):
+def encode_body_index(bodies: list[str]) -> bytes:
+    """Front-coded term dictionary + delta-varint postings (see module docstring)."""
+    index: dict[str, list[int]] = {}
+    # Hundreds of thousands of small lists survive this loop; the cyclic
+    # collector would rescan them all repeatedly without finding garbage.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return None
+        for doc, text in enumerate(bodies):
+            for t in set(tokenize(text)):
+                index.setdefault(t, []).append(doc)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    codes = VARINTS if len(bodies) <= 0x4000 else [_vb(n) for n in range(len(bodies))]
+    dict_parts: list[bytes] = []
+    post_parts: list[bytes] = []
+    prev = b""
+    for t in sorted(index):
+        raw = t.encode("utf-8")
+        limit = min(len(raw), len(prev))
+        shared = 0
+        while shared < limit and raw[shared] == prev[shared]:
+            shared += 1
+        docs = index[t]
+        if len(docs) == 1:
+            posting = codes[docs[0]]
+        else:
+            posting = b"".join([codes[docs[0]], *map(codes.__getitem__, map(int.__sub__, docs[1:], docs))])
+        dict_parts += (VARINTS[shared], _vb(len(raw) - shared), raw[shared:], _vb(len(posting)))
+        post_parts.append(posting)
+        prev = raw
+
+    dict_blob = b"".join(dict_parts)
+    head = b"QZB1" + struct.pack("<III", len(index), len(bodies), len(dict_blob))
+    return b"".join([head, dict_blob, *post_parts])
+
+
+def write_body_index(root: Path, name: str, bodies: list[str], cache: dict[str, dict]) -> tuple[dict, int]:
+    """Write the gzipped body index of shard `name`; (manifest entry, files written).
+
+    cache maps shard name -> {"key", "rel", "bytes"}; an entry whose key
+    matches and whose file exists is reused without encoding.
+    """
+    key = digest("body", FORMAT_VERSION, bodies)
+    hit = cache.get(name)
+    if hit and hit.get("key") == key and (root / hit["rel"]).exists():
+        return hit, 0
+    with profiling.stage("body"):
+        blob = gzip.compress(encode_body_index(bodies), compresslevel=9, mtime=0)
+    rel = hashed_name(f"{SHARD_DIR}/{name}.body.bin", blob)
+    cache[name] = {"key": key, "rel": rel, "bytes": len(blob)}
+    return cache[name], write_output(root, rel, blob)
+
+
+def shard_items(items: list[dict], size: int = SHARD_SIZE) -> list[tuple[str, list[dict]]]:
+    """Split date-desc items by (lang, year), then into chunks of `size`.
+
+    Returned newest shard first; ties broken by lang for determinism.
+    """
+    groups: dict[tuple[str, str], list[dict]] = {}
+    for it in items:
+        groups.setdefault((it["lang"], it["date"][:4]), []).append(it)
+    shards = []
+    for (lang, year), group in groups.items():
+        for n, i in enumerate(range(0, len(group), size)):
+            shards.append((f"{lang}-{year}-{n}", group[i:i + size]))
+    shards.sort(key=lambda s: (s[1][0]["date"], s[0]), reverse=True)
+    return shards
+
+
+def compact(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_worker(root: Path) -> int:
+    """Write search-worker.js from its template; returns files written."""
+    template = WORKER_TEMPLATE.read_text(encoding="utf-8")
+    key = digest("search-worker", template, TOKEN_PATTERN)
+    if is_fresh(root, WORKER, key):
+        return 0
+    return write_output(root, WORKER, template.replace("__TOKEN_RE__", json.dumps(TOKEN_PATTERN)), key)
+
+
+def generate_search_index(
+    root: Path, base: str, posts: list[Post], force: bool = False, body_index: bool = False
+) -> None:
+    alias_map = load_alias_map(root)
+    key = digest(
+        "search", FORMAT_VERSION, SHARD_SIZE, base, alias_map, body_index,
+        [(p.slug, p.title, p.date, p.excerpt, p.tags, p.lang, p.body if body_index else "") for p in posts],
+    )
+    manifest_name = f"{SHARD_DIR}/manifest.json"
+    with profiling.stage("worker"):
+        write_worker(root)
+    if not force and is_fresh(root, "search.json", key) and is_fresh(root, manifest_name, key):
+        print(f"search.json up to date ({len(posts)} posts)")
+        return
+
+    items = search_items(base, posts, alias_map)
+    shards = shard_items(items)
+    body_by_url = {f"{base}/post/{p.slug}/": p.body for p in posts} if body_index else {}
+    cached = load_json(root / BODY_CACHE_PATH) if body_index else None
+    body_cache = dict(cached) if isinstance(cached, dict) else {}
+    body_seen: dict[str, dict] = {}
+
+    written = 0
+    keep = set()
+    listed: list[tuple[dict, list[dict]]] = []
+    with profiling.stage("shards"):
+        for name, chunk in shards:
+            terms, postings = build_postings(chunk)
+            data = compact({"docs": chunk, "terms": terms, "postings": postings}).encode("utf-8")
+            rel = hashed_name(f"{SHARD_DIR}/{name}.json", data)
+            keep.add(Path(rel).name)
+            written += write_output(root, rel, data)
+            entry = {
+                "url": f"{base}/{rel}",
+                "lang": chunk[0]["lang"],
+                "from": chunk[-1]["date"],
+                "to": chunk[0]["date"],
+                "count": len(chunk),
+            }
+            if body_index:
+                body, n = write_body_index(root, name, [body_by_url[it["url"]] for it in chunk], body_cache)
+                body_seen[name] = body
+                keep.add(Path(body["rel"]).name)
+                written += n
+                entry["body"] = {"url": f"{base}/{body['rel']}", "bytes": body["bytes"]}
+            listed.append((entry, chunk))
+    if body_index and body_seen != cached:
+        atomic_write(root / BODY_CACHE_PATH, json.dumps(body_seen, indent=0, sort_keys=True).encode("utf-8"))
+
+    # manifest.json lists every shard; manifest-<lang>.json only that language's.
+    manifests = {manifest_name: listed}
+    for lang in sorted({entry["lang"] for entry, _ in listed}):
+        manifests[f"{SHARD_DIR}/manifest-{lang}.json"] = [(e, c) for e, c in listed if e["lang"] == lang]
+    keep.update(Path(name).name for name in manifests)
+
+    out: dict[str, dict] = {}
+    with profiling.stage("manifests"):
+        for name, parts in manifests.items():
+            docs = [it for _, chunk in parts for it in chunk]
+            manifest = {
+                "version": FORMAT_VERSION,
+                "total": len(docs),
+                "shards": [entry for entry, _ in parts],
+            }
+            facets = build_facets([it["tags"] for it in docs], None)
+            blob = compact(facets.to_json()).encode("utf-8")
+            rel = hashed_name(name.replace("manifest", "facets"), blob)
+            keep.add(Path(rel).name)
+            written += write_output(root, rel, blob)
+            manifest["facets"] = {"url": f"{base}/{rel}", "tags": len(facets.posts)}
+            out[name] = manifest
+
+    # Drop shards, body and facet indexes and manifests that are no longer produced
+    # (and their compress.py sidecars).
+    for old in (root / SHARD_DIR).iterdir():
+        if old.name not in keep and old.name.removesuffix(".gz") not in keep:
+            old.unlink()
+            written += 1
+    for name, manifest in out.items():
+        written += write_output(root, name, compact(manifest), key)
+    written += write_output(root, "search.json", json.dumps(items, ensure_ascii=False, indent=2), key)
+
+    if not written:
+        print(f"search.json unchanged ({len(items)} posts, {len(shards)} shards)")
+        return
+    print(f"Generated search.json with {len(items)} posts ({len(shards)} shards, {len(out) - 1} language manifests)")
 
 
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--root", default=".")
     ap.add_argument("--base", default="https://ai.liexpress.cc")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/postmeta.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel extraction processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="re-render even if inputs are unchanged")
+    ap.add_argument("--body-index", action="store_true", help="also write per-shard body indexes for full-text search")
+    profiling.add_arguments(ap)
     args = ap.parse_args()
 
     root = Path(args.root).resolve()
-    post_root = root / "post"
-
-    alias_map = None
-    alias_path = root / "data" / "tags-alias.json"
-    if alias_path.exists():
-        x = load_json(alias_path)
-        if isinstance(x, dict):
-            alias_map = x
-
-    items = []
-    for d in sorted([x for x in post_root.iterdir() if x.is_dir()]):
-        hp = d / "index.html"
-        if not hp.exists():
-            continue
-        text = hp.read_text(encoding="utf-8", errors="ignore")
-        jsonlds = parse_jsonld(text)
-
-        title = pick_title(text)
-        excerpt = pick_excerpt(text)
-        date = pick_date(text, jsonlds) or "1970-01-01"
-        tags = pick_tags(jsonlds)
-        if alias_map:
-            tags = [alias_map.get(t, t) for t in tags]
-        # de-dup
-        seen = set()
-        tags2 = []
-        for t in tags:
-            k = t.strip().lower()
-            if not k or k in seen:
-                continue
-            seen.add(k)
-            tags2.append(t.strip())
-
-        slug = d.name
-        items.append(
-            {
-                "title": title,
-                "url": f"{args.base}/post/{slug}/",
-                "date": date,
-                "excerpt": excerpt,
-                "tags": tags2,
-            }
-        )
-
-    items.sort(key=lambda x: (x.get("date", ""), x.get("url", "")), reverse=True)
-    (root / "search.json").write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"Generated search.json with {len(items)} posts")
+    with profiling.session(args, "generate_search_index", root):
+        with profiling.stage("scan"):
+            posts = scan_posts(root, use_cache=not args.no_cache, jobs=args.jobs)
+        generate_search_index(root, args.base, posts, force=args.force, body_index=args.body_index)
     return 0
 
 
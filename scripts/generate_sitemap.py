@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Generate sitemap.xml from the post records.
+
+URLs: homepage, helper pages, every post, every tag page and every archive
+year (first page of each listing), plus the homepage, tag index and tag
+pages of each further site language (zh/...).
+
+lastmod for a post is the newest of:
+- JSON-LD dateModified (or datePublished when there is none)
+- the date its content last changed, tracked in data/lastmod.json
+
+Content is what extraction reads: title, description, tags, language, dates
+and body text (content_key). The build itself writes markup into posts (the
+related-posts nav, hreflang alternates, cover <picture> elements), none of
+which changes those fields, so a build never counts as an edit; hashing the
+file would stamp every post on the first build after such a stage.
+
+data/lastmod.json is committed so fresh clones agree on dates. A post seen for
+the first time is recorded with its JSON-LD date, not the build date; only a
+later edit stamps today. Entries from before content_key (they hold the file
+"sha256") are recorded afresh the same way. Listing pages take the newest
+lastmod of the posts they list.
+
+The XML is streamed to temp files. Past MAX_URLS entries or MAX_BYTES per file
+it rolls over to sitemap-<n>.xml and sitemap.xml becomes a sitemap index.
+Files whose bytes did not change are left untouched so crawlers can skip them.
+
+Usage:
+  scripts/generate_sitemap.py --root . --base https://ai.liexpress.cc
+"""
+
+import argparse
+import datetime as dt
+import filecmp
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+from generate_pages import group_tags
+import profiling
+from outputs import digest, write_output
+from postmeta import DEFAULT_LANG, Post, lang_prefix, load_alias_map, load_json, scan_posts, split_by_lang
+
+LASTMOD_PATH = Path("data") / "lastmod.json"
+MAX_URLS = 50_000
+MAX_BYTES = 50 * 1024 * 1024
+
+URLSET_OPEN = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = "</urlset>\n"
+TOP_PAGES = ["", "about.html", "tags.html", "archive.html", "search.html"]
+# Top pages every other site language has under its prefix.
+LANG_PAGES = ["", "tags.html"]
+
+
+def content_key(p: Post) -> str:
+    """Digest of the fields an author edits; markup the build injects leaves it alone."""
+    return digest(p.title, p.excerpt, p.tags, p.lang, p.date, p.modified, p.body)
+
+
+def update_lastmod(root: Path, posts: list[Post], today: str) -> dict[str, str]:
+    """slug -> lastmod, advancing entries in data/lastmod.json whose content changed."""
+    state = load_json(root / LASTMOD_PATH)
+    state = state if isinstance(state, dict) else {}
+    out: dict[str, dict] = {}
+    for p in posts:
+        declared = p.modified or p.date
+        key = content_key(p)
+        prev = state.get(p.slug)
+        if not isinstance(prev, dict) or "content" not in prev:
+            out[p.slug] = {"content": key, "lastmod": declared}
+        elif prev["content"] != key:
+            out[p.slug] = {"content": key, "lastmod": max(today, declared)}
+        else:
+            out[p.slug] = prev
+    write_output(root, LASTMOD_PATH.as_posix(), json.dumps(out, indent=2, sort_keys=True) + "\n")
+    return {p.slug: max(out[p.slug]["lastmod"], p.modified or p.date) for p in posts}
+
+
+def iter_urls(root: Path, base: str, posts: list[Post], lastmod: dict[str, str]) -> Iterator[tuple[str, str]]:
+    newest = max(lastmod.values(), default="")
+    for page in TOP_PAGES:
+        yield f"{base}/{page}", newest
+    by_lang = split_by_lang(posts)
+    for lang, ps in by_lang.items():
+        if lang != DEFAULT_LANG:
+            for page in LANG_PAGES:
+                yield f"{base}/{lang_prefix(lang)}{page}", max((lastmod[p.slug] for p in ps), default=newest)
+    for p in posts:
+        yield f"{base}/post/{p.slug}/", lastmod[p.slug]
+    alias_map = load_alias_map(root)
+    for lang, lang_posts in by_lang.items():
+        _, tags_sorted = group_tags(lang_posts, alias_map)
+        for a, ps in tags_sorted:
+            yield f"{base}/{lang_prefix(lang)}tags/{a}/", max(lastmod[p.slug] for p in ps)
+    years: dict[str, str] = {}
+    for p in posts:
+        y = p.date[:4]
+        years[y] = max(years.get(y, ""), lastmod[p.slug])
+    for y in sorted(years, reverse=True):
+        yield f"{base}/archive/{y}/", years[y]
+
+
+def url_entry(loc: str, lastmod: str) -> str:
+    tail = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+    return f"  <url><loc>{escape(loc)}</loc>{tail}</url>\n"
+
+
+def replace_if_changed(tmp: Path, dest: Path) -> bool:
+    if dest.exists() and filecmp.cmp(tmp, dest, shallow=False):
+        tmp.unlink()
+        profiling.count("writes", "unchanged")
+        return False
+    size = tmp.stat().st_size
+    os.replace(tmp, dest)
+    profiling.count("writes", "miss")
+    profiling.add_bytes("written", size)
+    return True
+
+
+def write_sitemaps(root: Path, base: str, urls: Iterator[tuple[str, str]]) -> tuple[int, int, int]:
+    """Stream urls into one or more urlset files. Returns (urls, files, files changed)."""
+    parts: list[tuple[Path, str]] = []  # (tmp path, newest lastmod)
+    fh = None
+    count = size = total = 0
+    newest = ""
+    try:
+        for loc, lastmod in urls:
+            entry = url_entry(loc, lastmod).encode("utf-8")
+            if fh is None or count >= MAX_URLS or size + len(entry) + len(URLSET_CLOSE) > MAX_BYTES:
+                if fh is not None:
+                    fh.write(URLSET_CLOSE.encode("utf-8"))
+                    fh.close()
+                    parts[-1] = (parts[-1][0], newest)
+                tmp = root / f".sitemap-{len(parts) + 1}.xml.tmp"
+                fh = open(tmp, "wb")
+                fh.write(URLSET_OPEN.encode("utf-8"))
+                parts.append((tmp, ""))
+                count, size, newest = 0, len(URLSET_OPEN), ""
+            fh.write(entry)
+            count += 1
+            total += 1
+            size += len(entry)
+            newest = max(newest, lastmod)
+        if fh is None:
+            tmp = root / ".sitemap-1.xml.tmp"
+            fh = open(tmp, "wb")
+            fh.write(URLSET_OPEN.encode("utf-8"))
+            parts.append((tmp, ""))
+        fh.write(URLSET_CLOSE.encode("utf-8"))
+        parts[-1] = (parts[-1][0], newest)
+    finally:
+        if fh is not None:
+            fh.close()
+
+    changed = 0
+    keep = {"sitemap.xml"}
+    if len(parts) == 1:
+        changed += replace_if_changed(parts[0][0], root / "sitemap.xml")
+    else:
+        index = ['<?xml version="1.0" encoding="UTF-8"?>', '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for n, (tmp, newest) in enumerate(parts, 1):
+            name = f"sitemap-{n}.xml"
+            keep.add(name)
+            changed += replace_if_changed(tmp, root / name)
+            tail = f"<lastmod>{newest}</lastmod>" if newest else ""
+            index.append(f"  <sitemap><loc>{escape(f'{base}/{name}')}</loc>{tail}</sitemap>")
+        index.append("</sitemapindex>")
+        changed += write_output(root, "sitemap.xml", "\n".join(index) + "\n")
+    for old in root.glob("sitemap-*.xml"):
+        if old.name not in keep:
+            old.unlink()
+            changed += 1
+    return total, len(parts), changed
+
+
+def generate_sitemap(root: Path, base: str, posts: list[Post], today: str | None = None) -> None:
+    with profiling.stage("lastmod"):
+        lastmod = update_lastmod(root, posts, today or dt.date.today().isoformat())
+    with profiling.stage("sitemap"):
+        total, files, changed = write_sitemaps(root, base, iter_urls(root, base, posts, lastmod))
+    where = "sitemap.xml" if files == 1 else f"sitemap.xml + {files} child sitemaps"
+    state = "updated" if changed else "unchanged"
+    print(f"Generated {where} with {total} URLs ({state})")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--base", default="https://ai.liexpress.cc")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/postmeta.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel extraction processes (default: CPU count)")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    with profiling.session(args, "generate_sitemap", root):
+        with profiling.stage("scan"):
+            posts = scan_posts(root, use_cache=not args.no_cache, jobs=args.jobs)
+        generate_sitemap(root, args.base, posts)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
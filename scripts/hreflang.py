@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Link translated posts to each other with hreflang alternates.
+
+postmeta.pair_translations() pairs a post with its translations by slug
+(openclaw-not-a-monster / openclaw-not-a-monster-en) and detected language.
+For every paired post this stage writes, right before </head>:
+
+  <link rel="alternate" hreflang="en" href="https://.../post/x-en/">
+  <link rel="alternate" hreflang="zh" href="https://.../post/x/">
+  <link rel="alternate" hreflang="x-default" href="https://.../post/x-en/">
+
+so search engines serve each reader the version in their language. Lines in
+exactly this form are replaced on later runs and removed from posts that lost
+their translation; posts whose alternates are already right are not written,
+and those whose file and alternates are as this stage last left them are not
+read either (outputs.load_stamps).
+
+The homepages and tag pages get the same links from their generators
+(generate_pages.alternate_links).
+
+Usage:
+  scripts/hreflang.py --root . --base https://ai.liexpress.cc
+"""
+
+import argparse
+import hashlib
+import re
+from pathlib import Path
+
+import profiling
+from generate_pages import alternate_links
+from outputs import digest, load_stamps, save_stamps, write_output
+from postmeta import Post, pair_translations, scan_posts
+
+ALTERNATE_RE = re.compile(r"[ \t]*<link rel=\"alternate\" hreflang=\"[^\"]*\" href=\"[^\"]*\">\n")
+HEAD_END_RE = re.compile(r"^([ \t]*)</head>", re.M | re.I)
+
+
+def inject(text: str, links: str) -> str:
+    """Replace the alternates in a post's <head> with links ("" removes them)."""
+    head_end = HEAD_END_RE.search(text)
+    if not head_end:
+        return text
+    head = ALTERNATE_RE.sub("", text[: head_end.start()])
+    return head + links + text[head_end.start():]
+
+
+def link_translations(root: Path, base: str, posts: list[Post]) -> tuple[int, int]:
+    """Write the alternates into every post; (posts paired, posts changed)."""
+    pairs = pair_translations(posts)
+    stamps = load_stamps(root, "hreflang")
+    done: dict[str, str] = {}
+    changed = 0
+    for p in posts:
+        urls = {lang: f"{base}/post/{slug}/" for lang, slug in pairs.get(p.slug, {}).items()}
+        if stamps.get(p.slug) == digest(p.sha256, urls):
+            done[p.slug] = stamps[p.slug]
+            profiling.count("inject", "skip")
+            continue
+        text = (root / p.path).read_text(encoding="utf-8")
+        indent = m.group(1) + "  " if (m := HEAD_END_RE.search(text)) else "  "
+        new = inject(text, alternate_links(urls, indent))
+        if new != text:
+            changed += write_output(root, p.path, new)
+        done[p.slug] = digest(hashlib.sha256(new.encode("utf-8")).hexdigest(), urls)
+    save_stamps(root, "hreflang", done)
+    return len(pairs), changed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--base", default="https://ai.liexpress.cc")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/postmeta.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel extraction processes (default: CPU count)")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    with profiling.session(args, "hreflang", root):
+        with profiling.stage("scan"):
+            posts = scan_posts(root, use_cache=not args.no_cache, jobs=args.jobs)
+        with profiling.stage("inject"):
+            paired, changed = link_translations(root, args.base, posts)
+    print(f"Translations: {paired} posts paired; {changed} posts updated")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Responsive variants of the cover images.
+
+For every assets/covers/<name>.jpg, writes downscaled copies at WIDTHS (never
+upscaled; widths past the original collapse into one original-width copy) to
+assets/covers/w/<name>-<width>.<hash>.<ext>, in AVIF and WebP when the local
+Pillow build can encode them, and always in JPEG. The hash covers the source
+bytes and the encoder settings, so an existing file is a cache hit and an
+unchanged cover is never re-encoded. Missing variants are encoded in a
+process pool.
+
+assets/covers/variants.json maps each cover to its intrinsic size and
+variants; picture_html() turns an entry into <picture> markup with
+srcset/sizes. Posts reference covers by hand:
+
+  <img src="/assets/covers/x.jpg" alt="..." loading="lazy" />
+
+This stage rewrites such tags in post/*/index.html to the <picture> form, and
+re-renders an existing <picture data-cover="..."> when variants change, so
+phones fetch a 480px AVIF instead of the full JPEG. Other <img> attributes
+are kept. Posts whose file and the variants are as this stage last left them
+are not read (outputs.load_stamps).
+
+Pillow is optional. Without it the stage reports that and changes nothing.
+
+Usage:
+  scripts/images.py --root . [--jobs N]
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import profiling
+from fingerprint import is_hashed
+from outputs import digest, load_stamps, save_stamps, write_output
+from postmeta import Post, scan_posts
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional
+    Image = None
+
+COVERS = "assets/covers"
+VARIANT_DIR = f"{COVERS}/w"
+MANIFEST_PATH = f"{COVERS}/variants.json"
+WIDTHS = (480, 768, 1080, 1440)
+# (format, MIME type, extension, Pillow save options), preferred first
+FORMATS = [
+    ("AVIF", "image/avif", "avif", {"quality": 55}),
+    ("WEBP", "image/webp", "webp", {"quality": 78, "method": 6}),
+    ("JPEG", "image/jpeg", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+]
+# main.post is 760px wide with 16px padding on each side
+SIZES = "(max-width: 760px) calc(100vw - 32px), 728px"
+IMAGES_VERSION = 1
+HASH_LEN = 10
+
+PICTURE_RE = re.compile(
+    r"<picture\s[^>]*data-cover=\"[^\"]+\"[^>]*>.*?</picture>"
+    r"|<img\s[^>]*src=\"(?:https?://[^/\"]+)?/assets/covers/[^\"/]+\.jpg\"[^>]*>",
+    re.I | re.S,
+)
+IMG_TAG_RE = re.compile(r"<img\s[^>]*>", re.I)
+ATTR_RE = re.compile(r"([a-zA-Z-]+)=\"([^\"]*)\"")
+COVER_ATTR_RE = re.compile(r"data-cover=\"([^\"]+)\"")
+SET_ATTRS = ("src", "srcset", "sizes", "width", "height")
+
+
+def formats() -> list[tuple[str, str, str, dict]]:
+    """FORMATS this Pillow build can write."""
+    if Image is None:
+        return []
+    return [f for f in FORMATS if f[0] == "JPEG" or features.check(f[0].lower())]
+
+
+def plan(src: Path, rel: str, fmts: list) -> dict:
+    """Manifest entry for one cover: size plus variant paths (not yet encoded)."""
+    data = src.read_bytes()
+    profiling.add_bytes("read", len(data))
+    with Image.open(src) as im:
+        width, height = im.size
+    widths = sorted({min(w, width) for w in WIDTHS})
+    stem = Path(rel).stem
+    sources = {}
+    for name, mime, ext, opts in fmts:
+        h = digest(IMAGES_VERSION, hashlib.sha256(data).hexdigest(), name, opts)[:HASH_LEN]
+        sources[mime] = [[w, f"{VARIANT_DIR}/{stem}-{w}.{h}.{ext}"] for w in widths]
+    return {"width": width, "height": height, "sources": sources}
+
+
+def encode(root: str, src_rel: str, out_rel: str, width: int, fmt: str, opts: dict) -> int:
+    """Write one variant; returns its size in bytes."""
+    with Image.open(Path(root, src_rel)) as im:
+        im = im.convert("RGB")
+        if width < im.width:
+            im = im.resize((width, round(im.height * width / im.width)), Image.LANCZOS)
+        out = Path(root, out_rel)
+        tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+        im.save(tmp, fmt, **opts)
+        os.replace(tmp, out)
+    return out.stat().st_size
+
+
+def _encode_task(args: tuple) -> int:
+    return encode(*args)
+
+
+def build_variants(root: Path, jobs: int) -> tuple[dict, int]:
+    """Encode missing variants; return (manifest, number encoded)."""
+    fmts = formats()
+    opts = {mime: (name, o) for name, mime, _, o in fmts}
+    manifest: dict[str, dict] = {}
+    tasks = []
+    for src in sorted((root / COVERS).glob("*.jpg")):
+        rel = src.relative_to(root).as_posix()
+        if is_hashed(src.name):
+            continue
+        entry = plan(src, rel, fmts)
+        manifest[rel] = entry
+        for mime, variants in entry["sources"].items():
+            for w, out_rel in variants:
+                if (root / out_rel).exists():
+                    profiling.count("images", "hit")
+                else:
+                    profiling.count("images", "miss")
+                    tasks.append((str(root), rel, out_rel, w, *opts[mime]))
+
+    (root / VARIANT_DIR).mkdir(parents=True, exist_ok=True)
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as ex:
+            sizes = list(ex.map(_encode_task, tasks))
+    else:
+        sizes = [_encode_task(t) for t in tasks]
+    profiling.add_bytes("written", sum(sizes))
+
+    keep = {out_rel for e in manifest.values() for vs in e["sources"].values() for _, out_rel in vs}
+    for old in (root / VARIANT_DIR).iterdir():
+        if old.is_file() and f"{VARIANT_DIR}/{old.name}" not in keep:
+            old.unlink()
+    return manifest, len(tasks)
+
+
+def srcset(variants: list, prefix: str) -> str:
+    return ", ".join(f"{prefix}/{rel} {w}w" for w, rel in variants)
+
+
+def picture_html(entry: dict, cover: str, attrs: dict[str, str], prefix: str = "", sizes: str = SIZES) -> str:
+    """<picture> for a variants.json entry; attrs are extra <img> attributes (alt, loading, ...)."""
+    sources = entry["sources"]
+    jpeg = sources["image/jpeg"]
+    out = [f"<picture data-cover=\"{html.escape(cover)}\">"]
+    for _, mime, _, _ in FORMATS:
+        if mime != "image/jpeg" and mime in sources:
+            out.append(f"<source type=\"{mime}\" srcset=\"{srcset(sources[mime], prefix)}\" sizes=\"{sizes}\" />")
+    img = {
+        "src": f"{prefix}/{jpeg[-1][1]}",
+        "srcset": srcset(jpeg, prefix),
+        "sizes": sizes,
+        "width": str(entry["width"]),
+        "height": str(entry["height"]),
+        **{k: v for k, v in attrs.items() if k not in SET_ATTRS},
+    }
+    out.append("<img " + " ".join(f"{k}=\"{v}\"" for k, v in img.items()) + " />")
+    out.append("</picture>")
+    return "".join(out)
+
+
+def rewrite_post(text: str, manifest: dict) -> str:
+    def repl(m: re.Match) -> str:
+        block = m.group(0)
+        img = IMG_TAG_RE.search(block)
+        if not img:
+            return block
+        attrs = dict(ATTR_RE.findall(img.group(0)))
+        c = COVER_ATTR_RE.search(block)
+        cover = html.unescape(c.group(1)) if c else re.sub(r"^(?:https?://[^/]+)?/", "", attrs.get("src", ""))
+        entry = manifest.get(cover)
+        if not entry or not entry["sources"]:
+            return block
+        return picture_html(entry, cover, attrs)
+
+    return PICTURE_RE.sub(repl, text)
+
+
+def update_variants(root: Path, jobs: int) -> tuple[dict, int]:
+    """Encode missing variants and write MANIFEST_PATH; (manifest, encoded)."""
+    manifest, encoded = build_variants(root, jobs)
+    write_output(root, MANIFEST_PATH, json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    return manifest, encoded
+
+
+def rewrite_posts(root: Path, manifest: dict, posts: list[Post]) -> int:
+    """Point cover <img> tags in posts at the variants; returns posts changed."""
+    variants = digest(IMAGES_VERSION, manifest)
+    stamps = load_stamps(root, "images")
+    done: dict[str, str] = {}
+    changed = 0
+    for p in posts:
+        if stamps.get(p.slug) == digest(p.sha256, variants):
+            done[p.slug] = stamps[p.slug]
+            profiling.count("inject", "skip")
+            continue
+        text = (root / p.path).read_text(encoding="utf-8")
+        new = rewrite_post(text, manifest) if "/assets/covers/" in text else text
+        if new != text:
+            changed += write_output(root, p.path, new)
+        done[p.slug] = digest(hashlib.sha256(new.encode("utf-8")).hexdigest(), variants)
+    save_stamps(root, "images", done)
+    return changed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel encoder processes (default: CPU count)")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    if Image is None:
+        print("Pillow not installed; cover images left as-is (pip install pillow)")
+        return 0
+    with profiling.session(args, "images", root):
+        with profiling.stage("variants"):
+            manifest, encoded = update_variants(root, args.jobs or os.cpu_count() or 1)
+        with profiling.stage("rewrite"):
+            changed = rewrite_posts(root, manifest, scan_posts(root))
+    mimes = sorted({m.split("/")[1] for e in manifest.values() for m in e["sources"]})
+    print(f"Cover variants: {len(manifest)} images, {encoded} encoded ({'/'.join(mimes) or 'none'}); {changed} posts updated")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
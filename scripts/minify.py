@@ -0,0 +1,247 @@
+"""Optional HTML/CSS minification and critical-CSS inlining (--minify, --critical-css).
+
+Generated pages link styles/main.css with a render-blocking <link>, so on a
+slow connection nothing paints until that round trip finishes. With
+--critical-css, the generators inline only the rules that the page's
+above-the-fold markup can match and load the full sheet without blocking:
+
+  <style>...critical rules...</style>
+  <link rel="preload" href="main.<hash>.css" as="style" onload="...">
+  <noscript><link rel="stylesheet" href="main.<hash>.css"></noscript>
+
+A rule is critical when one of its selectors only names tags, classes and ids
+that occur in the fold sample; pseudo-classes and attribute selectors are
+ignored for matching, and @media blocks are filtered rule by rule. Source
+order is kept, so the cascade is unchanged.
+
+HtmlSqueezer collapses every whitespace run that contains a newline into a
+single newline and drops comments. It works fragment by fragment, so it plugs
+into PageWriter without buffering the page, and since one whitespace
+character always survives, inline layout does not change. Fragments holding
+<pre> or <textarea> pass through untouched.
+
+minify_css() is used by fingerprint.py for the hashed stylesheet; the hand
+written styles/main.css that posts link stays as it is.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import profiling
+
+COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+BREAK_RE = re.compile(r"[ \t\r]*\n\s*")
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+CSS_WS_RE = re.compile(r"\s+")
+COMBINATOR_RE = re.compile(r"\s*([,>+~])\s*")
+AT_PRELUDE_RE = re.compile(r"\s*([,:])\s*")
+PSEUDO_RE = re.compile(r"::?[\w-]+(?:\([^)]*\))?")
+ATTR_SEL_RE = re.compile(r"\[[^\]]*\]")
+SIMPLE_SEL_RE = re.compile(r"[.#]?-?[A-Za-z_][\w-]*")
+HTML_TAG_RE = re.compile(r"<([a-zA-Z][\w-]*)")
+CLASS_ATTR_RE = re.compile(r"\bclass=\"([^\"]*)\"")
+ID_ATTR_RE = re.compile(r"\bid=\"([^\"]*)\"")
+
+# At-rules whose block holds rules rather than declarations.
+NESTED_AT = {"@media", "@supports", "@layer", "@container", "@document"}
+STYLESHEET = "styles/main.css"
+
+
+class HtmlSqueezer:
+    """Stateful whitespace squeezer for streamed HTML fragments (PageWriter transform)."""
+
+    def __init__(self):
+        self._ws = True  # drop whitespace at the very start of the document
+
+    def __call__(self, fragment: str) -> str:
+        if "<pre" in fragment or "<textarea" in fragment:
+            self._ws = False
+            return fragment
+        out = BREAK_RE.sub("\n", COMMENT_RE.sub("", fragment))
+        if self._ws:
+            out = out.lstrip(" \t\r\n")
+        if out:
+            self._ws = out[-1] in " \t\r\n"
+        return out
+
+
+def minify_html(text: str) -> str:
+    return HtmlSqueezer()(text)
+
+
+def _split(text: str, sep: str) -> list[str]:
+    """Split on sep outside quotes and parentheses."""
+    parts, depth, quote, start = [], 0, "", 0
+    for i, c in enumerate(text):
+        if quote:
+            if c == quote and text[i - 1] != "\\":
+                quote = ""
+        elif c in "\"'":
+            quote = c
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _close(text: str, i: int) -> int:
+    """Index of the "}" closing a declaration block that starts at i."""
+    quote = ""
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == quote and text[i - 1] != "\\":
+                quote = ""
+        elif c in "\"'":
+            quote = c
+        elif c == "}":
+            return i
+        i += 1
+    return i
+
+
+def _parse(text: str, i: int = 0) -> tuple[list[tuple], int]:
+    nodes: list[tuple] = []
+    start = i
+    while i < len(text):
+        c = text[i]
+        if c == "{":
+            prelude = text[start:i].strip()
+            if prelude.split(None, 1)[0].lower() in NESTED_AT:
+                children, i = _parse(text, i + 1)
+                nodes.append((prelude, children))
+            else:
+                end = _close(text, i + 1)
+                nodes.append((prelude, text[i + 1:end]))
+                i = end + 1
+            start = i
+            continue
+        if c == "}":
+            return nodes, i + 1
+        if c == ";" and text[start:i].lstrip().startswith("@"):
+            nodes.append((text[start:i].strip(), None))  # @import, @charset
+            start = i + 1
+        i += 1
+    return nodes, i
+
+
+@lru_cache(maxsize=8)
+def parse_css(text: str) -> tuple[tuple, ...]:
+    """(prelude, body) nodes: body is a declaration string, a tuple of child
+    nodes (@media and friends) or None (statement at-rules)."""
+
+    def freeze(nodes: list[tuple]) -> tuple:
+        return tuple((p, freeze(b) if isinstance(b, list) else b) for p, b in nodes)
+
+    return freeze(_parse(CSS_COMMENT_RE.sub("", text))[0])
+
+
+def _min_prelude(prelude: str) -> str:
+    prelude = CSS_WS_RE.sub(" ", prelude).strip()
+    if prelude.startswith("@"):
+        return AT_PRELUDE_RE.sub(r"\1", prelude)
+    return COMBINATOR_RE.sub(r"\1", prelude)
+
+
+def _min_decls(body: str) -> str:
+    out = []
+    for decl in _split(CSS_WS_RE.sub(" ", body), ";"):
+        name, _, value = decl.partition(":")
+        if name.strip() and value.strip():
+            value = value.strip()
+            if "\"" not in value and "'" not in value:
+                value = re.sub(r"\s*,\s*", ",", value)
+            out.append(f"{name.strip()}:{value}")
+    return ";".join(out)
+
+
+def serialize(nodes: tuple) -> str:
+    out = []
+    for prelude, body in nodes:
+        if body is None:
+            out.append(_min_prelude(prelude) + ";")
+        elif isinstance(body, tuple):
+            inner = serialize(body)
+            if inner:
+                out.append(f"{_min_prelude(prelude)}{{{inner}}}")
+        else:
+            decls = _min_decls(body)
+            if decls:
+                out.append(f"{_min_prelude(prelude)}{{{decls}}}")
+    return "".join(out)
+
+
+def minify_css(text: str) -> str:
+    return serialize(parse_css(text)) + "\n"
+
+
+def used_tokens(html_text: str) -> frozenset[str]:
+    """Tag names, .classes and #ids that occur in html_text."""
+    tokens = {"html", "body"}
+    tokens.update(t.lower() for t in HTML_TAG_RE.findall(html_text))
+    for classes in CLASS_ATTR_RE.findall(html_text):
+        tokens.update("." + c for c in classes.split())
+    tokens.update("#" + i for i in ID_ATTR_RE.findall(html_text))
+    return frozenset(tokens)
+
+
+def _matches(selectors: str, present: frozenset[str]) -> bool:
+    for sel in _split(selectors, ","):
+        simple = SIMPLE_SEL_RE.findall(PSEUDO_RE.sub("", ATTR_SEL_RE.sub("", sel)))
+        if all((t if t[0] in ".#" else t.lower()) in present for t in simple):
+            return True
+    return False
+
+
+def _filter(nodes: tuple, present: frozenset[str]) -> tuple:
+    out = []
+    for prelude, body in nodes:
+        if isinstance(body, tuple):
+            kept = _filter(body, present)
+            if kept:
+                out.append((prelude, kept))
+        elif prelude.startswith("@") or _matches(prelude, present):
+            out.append((prelude, body))  # @font-face, @keyframes, @import: keep
+    return tuple(out)
+
+
+@lru_cache(maxsize=64)
+def _critical(css_text: str, present: frozenset[str]) -> str:
+    return serialize(_filter(parse_css(css_text), present))
+
+
+def critical_css(css_text: str, fold_html: str) -> str:
+    """Minified rules of css_text that the markup in fold_html can match."""
+    return _critical(css_text, used_tokens(fold_html))
+
+
+@lru_cache(maxsize=4)
+def _read_css(path: Path, mtime_ns: int, size: int) -> str:
+    data = path.read_bytes()
+    profiling.add_bytes("read", len(data))
+    return data.decode("utf-8")
+
+
+def critical_for(root: Path, fold_html: str) -> str:
+    """critical_css() of the site stylesheet for one page's fold sample."""
+    path = root / STYLESHEET
+    st = path.stat()
+    return critical_css(_read_css(path, st.st_mtime_ns, st.st_size), fold_html)
+
+
+def stylesheet(href: str, critical: str | None = None) -> str:
+    """<head> markup for the site stylesheet: a plain <link>, or the critical
+    rules inline plus a non-blocking load of the full sheet."""
+    if critical is None:
+        return f"<link rel=\"stylesheet\" href=\"{href}\">"
+    return (
+        f"<style>{critical}</style>\n"
+        f"  <link rel=\"preload\" href=\"{href}\" as=\"style\" onload=\"this.onload=null;this.rel='stylesheet'\">\n"
+        f"  <noscript><link rel=\"stylesheet\" href=\"{href}\"></noscript>"
+    )
@@ -0,0 +1,219 @@
+"""Write-avoidance for generated outputs.
+
+Generators used to rewrite index.html, tags.html, archive.html, about.html and
+search.json on every build, which touched mtimes, produced git churn and
+invalidated CDN caches even when nothing changed.
+
+Each output now records a digest of the inputs it was rendered from (the post
+fields it lists, data/*.json it read, its TEMPLATE_VERSION) in
+.cache/outputs.json:
+
+- is_fresh(): the output exists and its recorded input digest matches, so the
+  generator can skip rendering entirely.
+- write_output(): writes through a temp file + os.replace, and only when the
+  new bytes differ from what is on disk.
+- PageWriter: the streaming form of write_output() for rendered pages.
+  Fragments go straight into a buffered temp file, so memory stays bounded by
+  one fragment instead of the whole page.
+- load_stamps()/save_stamps(): for stages that rewrite inputs in place (posts),
+  the key each input had when the stage last left it correct, so unchanged
+  ones are not even read.
+
+The state is read once per process and recorded keys are kept in memory;
+flush() merges them into the file at exit (build.py calls it after each
+stage, serve.py after each rebuild) and forgets the loaded state. Stages
+running in other processes flush the same file, so the merge re-reads it
+under an flock and only overwrites the names this process recorded. Keys of
+outputs that no longer exist are dropped then.
+"""
+
+import atexit
+import fcntl
+import filecmp
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+
+import profiling
+
+STATE_PATH = Path(".cache") / "outputs.json"
+LOCK_PATH = Path(".cache") / "outputs.lock"
+STAMPS_PATH = ".cache/stamps-{}.json"
+
+_lock = threading.Lock()
+# root -> recorded keys as this process sees them, and the names it recorded.
+_states: dict[Path, dict[str, str]] = {}
+_dirty: dict[Path, set[str]] = {}
+
+
+def digest(*parts) -> str:
+    """Stable hash of JSON-serializable inputs (tuples hash like lists)."""
+    blob = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _load_state(root: Path) -> dict[str, str]:
+    try:
+        raw = (root / STATE_PATH).read_bytes()
+        profiling.add_bytes("read", len(raw))
+        data = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _state(root: Path) -> dict[str, str]:
+    state = _states.get(root)
+    if state is None:
+        state = _states[root] = _load_state(root)
+    return state
+
+
+def is_fresh(root: Path, name: str, key: str) -> bool:
+    with _lock:
+        fresh = (root / name).exists() and _state(root).get(name) == key
+    profiling.count("outputs", "fresh" if fresh else "miss")
+    return fresh
+
+
+def atomic_write(path: Path, data: bytes) -> bool:
+    """Write data to path via temp file + rename; skip if bytes are identical."""
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            profiling.count("writes", "unchanged")
+            return False
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    profiling.count("writes", "miss")
+    profiling.add_bytes("written", len(data))
+    return True
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def record_key(root: Path, name: str, key: str) -> None:
+    with _lock:
+        state = _state(root)
+        if state.get(name) != key:
+            state[name] = key
+            _dirty.setdefault(root, set()).add(name)
+
+
+@atexit.register
+def flush(root: Path | None = None) -> None:
+    """Merge the keys recorded since the last flush into STATE_PATH (all roots if None).
+
+    The in-memory state is dropped too, so the next check re-reads what
+    other processes flushed meanwhile.
+    """
+    with _lock:
+        for r in [root] if root is not None else list(_states):
+            mine = _states.pop(r, {})
+            names = _dirty.pop(r, None)
+            if not names:
+                continue
+            (r / LOCK_PATH).parent.mkdir(parents=True, exist_ok=True)
+            with open(r / LOCK_PATH, "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                state = _load_state(r)
+                state.update((n, mine[n]) for n in names)
+                state = {n: k for n, k in state.items() if (r / n).exists()}
+                atomic_write(r / STATE_PATH, json.dumps(state, indent=0, sort_keys=True).encode("utf-8"))
+
+
+def load_stamps(root: Path, stage: str) -> dict[str, str]:
+    """name -> key as save_stamps() left it for stage."""
+    try:
+        raw = (root / STAMPS_PATH.format(stage)).read_bytes()
+        profiling.add_bytes("read", len(raw))
+        data = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_stamps(root: Path, stage: str, stamps: dict[str, str]) -> None:
+    atomic_write(root / STAMPS_PATH.format(stage), json.dumps(stamps, indent=0, sort_keys=True).encode("utf-8"))
+
+
+def write_output(root: Path, name: str, data: str | bytes, key: str | None = None) -> bool:
+    """Write root/name if its bytes changed and record key. Returns True if written."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    written = atomic_write(root / name, data)
+    if key is not None:
+        record_key(root, name, key)
+    return written
+
+
+class PageWriter:
+    """Stream a page into root/name.
+
+    with PageWriter(root, "index.html", key) as w:
+        w.write(head)
+        w.lines(rows)  # "\n".join(rows), without building the joined string
+
+    On a clean exit the temp file replaces root/name only if the bytes
+    differ (w.written tells which), and key is recorded. On an exception the
+    temp file is discarded and the old output stays. transform, if given, is
+    applied to every fragment on its way out (e.g. minify.HtmlSqueezer()).
+    """
+
+    def __init__(self, root: Path, name: str, key: str | None = None, transform: Callable[[str], str] | None = None):
+        self.root = root
+        self.name = name
+        self.key = key
+        self.path = root / name
+        self.written = False
+        self._out = (lambda s: self._fh.write(transform(s))) if transform else (lambda s: self._fh.write(s))
+
+    def __enter__(self) -> "PageWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = _tmp_path(self.path)
+        self._fh = open(self._tmp, "w", encoding="utf-8", newline="")
+        return self
+
+    def write(self, fragment: str) -> None:
+        self._out(fragment)
+
+    def writeall(self, fragments: Iterable[str]) -> None:
+        for f in fragments:
+            self._out(f)
+
+    def lines(self, rows: Iterable[str]) -> None:
+        first = True
+        for row in rows:
+            if not first:
+                self._out("\n")
+            self._out(row)
+            first = False
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._fh.close()
+        if exc_type is not None:
+            self._tmp.unlink()
+            return
+        if self.path.exists() and filecmp.cmp(self._tmp, self.path, shallow=False):
+            self._tmp.unlink()
+            profiling.count("writes", "unchanged")
+        else:
+            size = self._tmp.stat().st_size
+            os.replace(self._tmp, self.path)
+            self.written = True
+            profiling.count("writes", "miss")
+            profiling.add_bytes("written", size)
+        if self.key is not None:
+            record_key(self.root, self.name, self.key)
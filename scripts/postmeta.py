@@ -0,0 +1,534 @@
+"""Shared post metadata extraction for the build scripts.
+
+Every generator used to walk post/*/index.html on its own and re-run the same
+regexes. This module does the walk once and returns a list of typed records
+that the index, helper pages, search index and link checker all consume.
+
+Heuristics (unchanged from generate_index.py):
+- title: <title>...</title> (strip suffix "| Mr. Qizhi")
+- excerpt: <meta name="description" content="..."> (fallback: first <p> in .post-content)
+- date: JSON-LD Article.datePublished (fallback: the first YYYY-MM-DD in <head>
+  and the post header before the first body paragraph; dates in the text
+  never count)
+- modified: JSON-LD Article.dateModified (empty when absent)
+- tags: JSON-LD keywords (comma-separated) or meta keywords
+- lang: <html lang="..."> (fallback: JSON-LD inLanguage, then the slug suffix,
+  then the share of CJK characters in title and body; see detect_lang)
+- links: every href="..." in the page (for the link checker)
+- body: plain text of .post-content (fallback: <article>)
+
+Translations are paired by slug: a post and the same slug with a language
+suffix (-en, -cn, -zh) in another language are one article
+(pair_translations). English is the default language and owns the site root;
+every other language gets its listing pages under /<lang>/ (lang_prefix).
+
+The <nav class="related-posts"> block that related.py writes into posts is
+removed before extraction, so it feeds neither body nor links.
+
+Title, meta tags, lang and JSON-LD come from HeadParser, an html.parser pass
+that stops at </head> once a description was seen, or else at the end of the
+first paragraph of .post-content. Its cost follows the size of <head>, not of
+the post. JSON-LD placed in <body> after that point is not read.
+
+Extracted records are cached in .cache/postmeta.json, keyed by path and
+(size, mtime, sha256) fingerprint. A rebuild only re-parses posts whose bytes
+changed. Bump EXTRACTOR_VERSION whenever extraction output changes; that
+discards the whole cache. Within one process (build.py, serve.py) the records
+of the last scan stay in memory, so a later scan_posts() only stats the posts
+and re-parses those written since, without reloading the cache file.
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional
+
+import profiling
+
+DATE_RE = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
+HREF_RE = re.compile(r"href=\"([^\"]+)\"")
+BODY_START_RE = re.compile(r"<(?:div|section)\s+class=\"post-content\"[^>]*>", re.I)
+ARTICLE_START_RE = re.compile(r"<article[^>]*>", re.I)
+BODY_END_RE = re.compile(r"</article>|</main>|</body>", re.I)
+# Start of the post text: .post-content, else the first paragraph without a class
+# (header paragraphs such as <p class="meta"> carry one).
+HEADER_END_RE = re.compile(r"<(?:div|section)\s+class=\"post-content\"|<p(?:>|\s(?![^>]*\bclass=))", re.I)
+# Written into posts by related.py; not part of what the author wrote.
+RELATED_RE = re.compile(r"<nav class=\"related-posts\"[^>]*>.*?</nav>", re.S)
+SCRIPT_STYLE_RE = re.compile(r"<(script|style)\b[^>]*>.*?</\1>", re.I | re.S)
+TAG_RE = re.compile(r"<[^>]+>")
+WS_RE = re.compile(r"\s+")
+SLUG_LANG_RE = re.compile(r"^(.+)-(en|cn|zh)$")
+CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+# Slug suffix -> language
+SLUG_LANGS = {"en": "en", "cn": "zh", "zh": "zh"}
+# Languages with their own listing pages, default (site root) first.
+SITE_LANGS = ("en", "zh")
+DEFAULT_LANG = SITE_LANGS[0]
+# Text that is at least this share CJK (of all letters) is Chinese.
+CJK_SHARE = 0.2
+
+EXTRACTOR_VERSION = 6
+CACHE_PATH = Path(".cache") / "postmeta.json"
+
+# root -> cache entries of the last scan in this process
+_scanned: dict[Path, dict[str, dict]] = {}
+PARALLEL_MIN_CHUNK = 16
+
+
+def load_json(path: Path):
+    try:
+        raw = path.read_bytes()
+        profiling.add_bytes("read", len(raw))
+        return json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+
+
+def load_alias_map(root: Path) -> dict[str, str] | None:
+    """Optional tag alias map from data/tags-alias.json."""
+    alias_path = root / "data" / "tags-alias.json"
+    if alias_path.exists():
+        x = load_json(alias_path)
+        if isinstance(x, dict):
+            return x
+    return None
+
+
+def strip_tags(s: str) -> str:
+    s = TAG_RE.sub("", s)
+    s = html.unescape(s)
+    s = WS_RE.sub(" ", s).strip()
+    return s
+
+
+def _squash(s: str) -> str:
+    """strip_tags() for text nodes: html.parser already dropped tags and unescaped."""
+    return WS_RE.sub(" ", s).strip()
+
+
+def _clean(s: str) -> str:
+    """strip_tags() for attribute values, which html.parser already unescaped."""
+    return _squash(TAG_RE.sub("", s))
+
+
+def tag_anchor(t: str) -> str:
+    # stable and url-safe anchor
+    a = t.lower()
+    a = re.sub(r"[^a-z0-9\u4e00-\u9fff]+", "-", a)
+    a = a.strip("-")
+    return a or "tag"
+
+
+def norm_tag(t: str, alias_map: dict[str, str] | None) -> str:
+    """Canonical spelling of a tag: whitespace squashed, then aliased.
+
+    Alias keys are looked up after squashing, so "AI  governance" and
+    "AI governance" map alike in every stage.
+    """
+    t = _squash(t)
+    if alias_map and t in alias_map:
+        t = _squash(alias_map[t])
+    return t
+
+
+def norm_tags(tags: list[str], alias_map: dict[str, str] | None) -> list[str]:
+    """norm_tag() over a post's tags, without empties or repeats of an anchor."""
+    out: list[str] = []
+    seen: set[str] = set()
+    for t in tags:
+        t = norm_tag(t, alias_map)
+        a = tag_anchor(t)
+        if t and a not in seen:
+            seen.add(a)
+            out.append(t)
+    return out
+
+
+class _Done(Exception):
+    pass
+
+
+class HeadParser(HTMLParser):
+    """Collect head metadata and the first .post-content paragraph.
+
+    feed() raises _Done as soon as nothing else is needed; use parse_head().
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lang = ""
+        self.title: str | None = None
+        self.description: str | None = None
+        self.keywords: str | None = None
+        self.jsonld: list[str] = []
+        self.first_p: str | None = None
+        self._buf: list[str] | None = None  # text of the element being captured
+        self._in = ""  # "title", "jsonld" or "p"
+        self._in_content = False
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "html":
+            self.lang = self.lang or (a.get("lang") or "").strip()
+        elif tag == "title" and self.title is None:
+            self._in, self._buf = "title", []
+        elif tag == "meta":
+            name = (a.get("name") or "").lower()
+            if name == "description" and self.description is None:
+                self.description = a.get("content") or ""
+            elif name == "keywords" and self.keywords is None:
+                self.keywords = a.get("content") or ""
+        elif tag == "script" and (a.get("type") or "").lower() == "application/ld+json":
+            self._in, self._buf = "jsonld", []
+        elif tag in ("div", "section") and "post-content" in (a.get("class") or "").split():
+            self._in_content = True
+        elif tag == "p" and self._in_content and self.first_p is None:
+            self._in, self._buf = "p", []
+
+    def handle_data(self, data):
+        if self._buf is not None:
+            self._buf.append(data)
+
+    def handle_endtag(self, tag):
+        if self._buf is not None and tag == {"title": "title", "jsonld": "script", "p": "p"}[self._in]:
+            text = "".join(self._buf)
+            if self._in == "title":
+                self.title = text
+            elif self._in == "jsonld":
+                self.jsonld.append(text)
+            else:
+                self.first_p = text
+                raise _Done
+            self._in, self._buf = "", None
+        elif tag == "head" and self.description is not None:
+            raise _Done
+
+
+def parse_head(text: str) -> HeadParser:
+    p = HeadParser()
+    try:
+        p.feed(text)
+        p.close()
+    except _Done:
+        pass
+    return p
+
+
+def head_region(text: str) -> str:
+    """<head> and the post header (title, byline): text before the first body paragraph."""
+    m = HEADER_END_RE.search(text)
+    return text[:m.start()] if m else text
+
+
+def parse_jsonld(blocks: list[str]) -> list[dict]:
+    out = []
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        try:
+            data = json.loads(block)
+            if isinstance(data, dict):
+                out.append(data)
+            elif isinstance(data, list):
+                out.extend([x for x in data if isinstance(x, dict)])
+        except Exception:
+            continue
+    return out
+
+
+def _articles(jsonlds: list[dict]) -> list[dict]:
+    return [d for d in jsonlds if d.get("@type") in ("Article", "BlogPosting")]
+
+
+def pick_title(head: HeadParser) -> str:
+    if head.title is None:
+        return "(untitled)"
+    t = _squash(head.title)
+    # common suffix
+    t = re.sub(r"\s*\|\s*Mr\.\s*Qizhi\s*$", "", t)
+    return t.strip() or "(untitled)"
+
+
+def pick_excerpt(head: HeadParser) -> str:
+    if head.description is not None:
+        return _clean(head.description)
+    if head.first_p is not None:
+        return _squash(head.first_p)
+    return ""
+
+
+def pick_date(head_text: str, jsonlds: list[dict]) -> Optional[str]:
+    # Prefer Article.datePublished
+    for d in _articles(jsonlds):
+        v = d.get("datePublished") or d.get("dateCreated")
+        if isinstance(v, str) and DATE_RE.search(v):
+            return DATE_RE.search(v).group(1)
+    # Fallback: any date-like token in the head/header region
+    m = DATE_RE.search(head_text)
+    return m.group(1) if m else None
+
+
+def pick_modified(jsonlds: list[dict]) -> str:
+    for d in _articles(jsonlds):
+        v = d.get("dateModified")
+        if isinstance(v, str) and DATE_RE.search(v):
+            return DATE_RE.search(v).group(1)
+    return ""
+
+
+def pick_tags(head: HeadParser, jsonlds: list[dict]) -> list[str]:
+    # Prefer JSON-LD keywords
+    for d in _articles(jsonlds):
+        kw = d.get("keywords")
+        if isinstance(kw, str) and kw.strip():
+            return [p.strip() for p in kw.split(",") if p.strip()]
+        if isinstance(kw, list):
+            return [str(x).strip() for x in kw if str(x).strip()]
+    # Fallback: meta keywords
+    if head.keywords is not None:
+        return [p.strip() for p in _clean(head.keywords).split(",") if p.strip()]
+    return []
+
+
+def pick_lang(head: HeadParser, jsonlds: list[dict]) -> str:
+    if head.lang:
+        return head.lang
+    for d in _articles(jsonlds):
+        v = d.get("inLanguage")
+        if isinstance(v, str) and v.strip():
+            return v.strip()
+    return ""
+
+
+def detect_lang(slug: str, declared: str, sample: str) -> str:
+    """declared if set, else the slug suffix, else "zh" or "en" by script ("" for no letters)."""
+    if declared:
+        return declared
+    m = SLUG_LANG_RE.match(slug)
+    if m:
+        return SLUG_LANGS[m.group(2)]
+    letters = sum(c.isalpha() for c in sample)
+    if not letters:
+        return ""
+    return "zh" if len(CJK_RE.findall(sample)) >= CJK_SHARE * letters else "en"
+
+
+def pick_body(text: str) -> str:
+    m = BODY_START_RE.search(text) or ARTICLE_START_RE.search(text)
+    if not m:
+        return ""
+    end = BODY_END_RE.search(text, m.end())
+    chunk = text[m.end(): end.start() if end else len(text)]
+    return strip_tags(SCRIPT_STYLE_RE.sub(" ", chunk))
+
+
+def lang_key(lang: str) -> str:
+    """Primary language subtag ("zh-CN" -> "zh"), "und" when unknown."""
+    return lang.split("-")[0].strip().lower() or "und"
+
+
+def site_lang(lang: str) -> str:
+    """The SITE_LANGS entry whose listings show a post in lang (DEFAULT_LANG for others)."""
+    key = lang_key(lang)
+    return key if key in SITE_LANGS else DEFAULT_LANG
+
+
+def lang_prefix(lang: str) -> str:
+    """Path prefix of a site language's listing pages: "" or e.g. "zh/"."""
+    return "" if lang == DEFAULT_LANG else f"{lang}/"
+
+
+@dataclass
+class Post:
+    slug: str
+    title: str
+    date: str  # YYYY-MM-DD
+    excerpt: str
+    tags: list[str]  # raw keywords, not alias-normalized
+    lang: str = ""
+    links: list[str] = field(default_factory=list)
+    body: str = ""
+    modified: str = ""  # YYYY-MM-DD or ""
+    sha256: str = ""  # of the source HTML
+
+    @property
+    def path(self) -> str:
+        return f"post/{self.slug}/index.html"
+
+
+def extract_post(slug: str, text: str) -> Post:
+    text = RELATED_RE.sub("", text)
+    head = parse_head(text)
+    jsonlds = parse_jsonld(head.jsonld)
+    title = pick_title(head)
+    body = pick_body(text)
+    return Post(
+        slug=slug,
+        title=title,
+        date=pick_date(head_region(text), jsonlds) or "1970-01-01",
+        excerpt=pick_excerpt(head),
+        tags=pick_tags(head, jsonlds),
+        lang=detect_lang(slug, pick_lang(head, jsonlds), title + " " + body[:2000]),
+        links=HREF_RE.findall(text),
+        body=body,
+        modified=pick_modified(jsonlds),
+    )
+
+
+def split_by_lang(posts: list[Post]) -> dict[str, list[Post]]:
+    """{site language: its posts in input order}; always has DEFAULT_LANG, others only when non-empty."""
+    out: dict[str, list[Post]] = {DEFAULT_LANG: []}
+    for p in posts:
+        out.setdefault(site_lang(p.lang), []).append(p)
+    return {lang: out[lang] for lang in SITE_LANGS if lang in out}
+
+
+def pair_translations(posts: list[Post]) -> dict[str, dict[str, str]]:
+    """{slug: {lang: slug}} for every post that has a translation, itself included.
+
+    Posts pair when their slugs are equal once a language suffix is dropped
+    and their languages differ. Should two share a language, the shorter
+    slug (the unsuffixed one) wins and the other stays unpaired.
+    """
+    groups: dict[str, dict[str, str]] = {}
+    for p in sorted(posts, key=lambda p: (len(p.slug), p.slug)):
+        if not p.lang:
+            continue
+        m = SLUG_LANG_RE.match(p.slug)
+        groups.setdefault(m.group(1) if m else p.slug, {}).setdefault(lang_key(p.lang), p.slug)
+    return {slug: dict(sorted(g.items())) for g in groups.values() if len(g) > 1 for slug in g.values()}
+
+
+def load_cache(root: Path) -> dict[str, dict]:
+    data = load_json(root / CACHE_PATH)
+    if not isinstance(data, dict) or data.get("version") != EXTRACTOR_VERSION:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+
+def save_cache(root: Path, entries: dict[str, dict]) -> None:
+    path = root / CACHE_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    payload = {"version": EXTRACTOR_VERSION, "entries": entries}
+    blob = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+    profiling.add_bytes("written", len(blob))
+
+
+def list_post_files(root: Path) -> list[tuple[str, os.stat_result]]:
+    """(slug, stat) for every post/<slug>/index.html, sorted by slug."""
+    out = []
+    with os.scandir(root / "post") as it:
+        for e in it:
+            if not e.is_dir():
+                continue
+            try:
+                st = os.stat(os.path.join(e.path, "index.html"))
+            except FileNotFoundError:
+                continue
+            out.append((e.name, st))
+    out.sort()
+    return out
+
+
+def _extract_file(root: str, slug: str, known_sha: str | None) -> tuple[str, dict | None]:
+    """Hash one post and extract it unless the hash matches known_sha."""
+    raw = Path(root, "post", slug, "index.html").read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    if digest == known_sha:
+        return digest, None
+    post = extract_post(slug, raw.decode("utf-8", errors="ignore"))
+    post.sha256 = digest
+    return digest, asdict(post)
+
+
+def _extract_chunk(
+    root: str, items: list[tuple[str, str | None]], profile: bool = False
+) -> tuple[list[tuple[str, dict | None, float]], dict | None]:
+    """(digest, post, seconds) per item, plus regex stats when profiling in a worker."""
+    if profile:
+        profiling.enable()
+        profiling.instrument()
+        profiling.regex_stats(reset=True)  # drop counts a forked worker inherited
+    out = []
+    for slug, known_sha in items:
+        t0 = time.perf_counter()
+        digest, post = _extract_file(root, slug, known_sha)
+        out.append((digest, post, time.perf_counter() - t0))
+    return out, (profiling.regex_stats() if profile else None)
+
+
+def _extract_all(root: Path, items: list[tuple[str, str | None]], jobs: int) -> list[tuple[str, dict | None, float]]:
+    """Run _extract_file over items, in a process pool when it pays off.
+
+    Results come back in input order regardless of jobs.
+    """
+    if jobs <= 1 or len(items) < 2 * PARALLEL_MIN_CHUNK:
+        return _extract_chunk(str(root), items)[0]
+    size = max(PARALLEL_MIN_CHUNK, -(-len(items) // (jobs * 4)))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    out: list[tuple[str, dict | None, float]] = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as ex:
+        n = len(chunks)
+        for part, regex in ex.map(_extract_chunk, [str(root)] * n, chunks, [profiling.enabled()] * n):
+            out.extend(part)
+            if regex:
+                profiling.merge_regex(regex)
+    return out
+
+
+def scan_posts(root: Path, use_cache: bool = True, jobs: int | None = None) -> list[Post]:
+    """Read every post/<slug>/index.html once.
+
+    With use_cache, unchanged posts (same size and mtime, or same content
+    hash) are served from .cache/postmeta.json without re-parsing.
+    Posts that do need parsing are spread over `jobs` processes
+    (default: CPU count).
+
+    Sorted by (date, slug) desc for determinism.
+    """
+    cache = (_scanned.get(root) or load_cache(root)) if use_cache else {}
+    entries: dict[str, dict] = {}
+    pending: list[tuple[str, os.stat_result]] = []
+    for slug, st in list_post_files(root):
+        rel = f"post/{slug}/index.html"
+        hit = cache.get(rel)
+        if hit and hit.get("size") == st.st_size and hit.get("mtime_ns") == st.st_mtime_ns:
+            entries[rel] = hit
+            profiling.count("postmeta", "stat_hit")
+        else:
+            pending.append((slug, st))
+
+    items = [(slug, (cache.get(f"post/{slug}/index.html") or {}).get("sha256")) for slug, _ in pending]
+    results = _extract_all(root, items, jobs or os.cpu_count() or 1)
+    for (slug, st), (digest, post, seconds) in zip(pending, results):
+        rel = f"post/{slug}/index.html"
+        profiling.add_bytes("read", st.st_size)
+        if post is None:
+            post = cache[rel]["post"]
+            profiling.count("postmeta", "hash_hit")
+        else:
+            profiling.count("postmeta", "miss")
+            profiling.file_time(rel, seconds, st.st_size)
+        entries[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest, "post": post}
+
+    if use_cache and (pending or len(entries) != len(cache)):
+        save_cache(root, entries)
+    if use_cache:
+        _scanned[root] = entries
+    posts = [Post(**e["post"]) for e in entries.values()]
+    posts.sort(key=lambda p: (p.date, p.slug), reverse=True)
+    return posts
@@ -0,0 +1,243 @@
+"""Opt-in build instrumentation (--profile) shared by the build scripts.
+
+Disabled by default; every hook below is a no-op until session() enables it.
+A profiled run records:
+
+- stages: wall and CPU time per named stage (stage() blocks)
+- files: parse time per post, with the slowest N listed
+- bytes: bytes read from sources/caches and bytes written to outputs
+- caches: hit/miss counts and hit rate per cache (postmeta records, output
+  digests, unchanged writes, link checker records)
+- regex: calls and time per compiled *_RE pattern of the script modules,
+  which are wrapped in TimedPattern for the run
+
+Each script adds its section to one JSON build report (default
+.cache/build-report.json), so a profiled build yields a single file.
+--cprofile FILE additionally dumps cProfile stats for pstats/snakeviz.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+REPORT_PATH = Path(".cache") / "build-report.json"
+SLOWEST = 10
+
+_state: dict | None = None
+
+
+def enabled() -> bool:
+    return _state is not None
+
+
+def enable(slowest: int = SLOWEST) -> None:
+    global _state
+    _state = {"slowest": slowest, "stages": [], "files": [], "bytes": {"read": 0, "written": 0}, "caches": {}}
+
+
+@contextmanager
+def stage(name: str):
+    if _state is None:
+        yield
+        return
+    w, c = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        _state["stages"].append(
+            {"name": name, "wall_s": round(time.perf_counter() - w, 6), "cpu_s": round(time.process_time() - c, 6)}
+        )
+
+
+def count(cache: str, event: str, n: int = 1) -> None:
+    """Count a cache event; "miss" is the event that lowers the hit rate."""
+    if _state is not None:
+        events = _state["caches"].setdefault(cache, {})
+        events[event] = events.get(event, 0) + n
+
+
+def add_bytes(kind: str, n: int) -> None:
+    if _state is not None:
+        _state["bytes"][kind] += n
+
+
+def file_time(path: str, seconds: float, size: int) -> None:
+    if _state is not None:
+        _state["files"].append((seconds, path, size))
+
+
+class TimedPattern:
+    """re.Pattern stand-in that accumulates call count and time."""
+
+    def __init__(self, pattern: re.Pattern, name: str):
+        self.pattern = pattern
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+
+    def _timed(self, method: str, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return getattr(self.pattern, method)(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - t0
+            self.calls += 1
+
+    def search(self, *a, **k):
+        return self._timed("search", *a, **k)
+
+    def match(self, *a, **k):
+        return self._timed("match", *a, **k)
+
+    def fullmatch(self, *a, **k):
+        return self._timed("fullmatch", *a, **k)
+
+    def findall(self, *a, **k):
+        return self._timed("findall", *a, **k)
+
+    def finditer(self, *a, **k):
+        # Materialized so the matching is timed, not just creating the iterator.
+        t0 = time.perf_counter()
+        try:
+            return list(self.pattern.finditer(*a, **k))
+        finally:
+            self.seconds += time.perf_counter() - t0
+            self.calls += 1
+
+    def sub(self, *a, **k):
+        return self._timed("sub", *a, **k)
+
+    def split(self, *a, **k):
+        return self._timed("split", *a, **k)
+
+    def __getattr__(self, attr):
+        return getattr(self.pattern, attr)
+
+
+def _patterns() -> list[TimedPattern]:
+    return [v for m in _script_modules() for v in vars(m).values() if isinstance(v, TimedPattern)]
+
+
+def _script_modules() -> list:
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = []
+    for m in list(sys.modules.values()):
+        f = getattr(m, "__file__", None)
+        if f and os.path.dirname(os.path.abspath(f)) == here:
+            out.append(m)
+    return out
+
+
+def instrument() -> None:
+    """Wrap every module-level *_RE pattern of the loaded script modules."""
+    for m in _script_modules():
+        mod = os.path.splitext(os.path.basename(m.__file__))[0]  # not "__main__"
+        for attr, v in list(vars(m).items()):
+            if attr.endswith("_RE") and isinstance(v, re.Pattern):
+                setattr(m, attr, TimedPattern(v, f"{mod}.{attr}"))
+
+
+def regex_stats(reset: bool = False) -> dict[str, list]:
+    """name -> [calls, seconds], e.g. to ship a worker's counts to the parent."""
+    out: dict[str, list] = {}
+    for p in _patterns():
+        calls, secs = out.get(p.name, [0, 0.0])
+        out[p.name] = [calls + p.calls, secs + p.seconds]
+        if reset:
+            p.calls, p.seconds = 0, 0.0
+    return out
+
+
+def merge_regex(stats: dict[str, list]) -> None:
+    """Fold a worker's regex_stats() into this process's report."""
+    if _state is not None:
+        merged = _state.setdefault("worker_regex", {})
+        for name, (calls, secs) in stats.items():
+            c, s = merged.get(name, [0, 0.0])
+            merged[name] = [c + calls, s + secs]
+
+
+def report(wall: float, cpu: float) -> dict:
+    assert _state is not None
+    regex = regex_stats()
+    for name, (calls, secs) in _state.get("worker_regex", {}).items():
+        c, s = regex.get(name, [0, 0.0])
+        regex[name] = [c + calls, s + secs]
+    files = sorted(_state["files"], reverse=True)
+    caches = {}
+    for name, events in sorted(_state["caches"].items()):
+        total = sum(events.values())
+        caches[name] = {**events, "hit_rate": round(1 - events.get("miss", 0) / total, 4) if total else None}
+    return {
+        "wall_s": round(wall, 6),
+        "cpu_s": round(cpu, 6),
+        "stages": _state["stages"],
+        "files": {
+            "parsed": len(files),
+            "parse_s": round(sum(f[0] for f in files), 6),
+            "slowest": [{"path": p, "seconds": round(s, 6), "bytes": n} for s, p, n in files[: _state["slowest"]]],
+        },
+        "bytes": _state["bytes"],
+        "caches": caches,
+        "regex": {
+            name: {"calls": c, "seconds": round(s, 6)}
+            for name, (c, s) in sorted(regex.items(), key=lambda kv: -kv[1][1])
+            if c
+        },
+    }
+
+
+def add_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument(
+        "--profile", nargs="?", const=str(REPORT_PATH), default=None, metavar="REPORT",
+        help=f"record timings, bytes, cache and regex stats into a JSON build report (default: {REPORT_PATH})",
+    )
+    ap.add_argument("--profile-slowest", type=int, default=SLOWEST, help="posts listed by parse time in the report")
+    ap.add_argument("--cprofile", metavar="FILE", default=None, help="also dump cProfile stats to FILE")
+
+
+@contextmanager
+def session(args: argparse.Namespace, script: str, root: Path):
+    """Profile the enclosed run when --profile/--cprofile was given."""
+    if not (args.profile or args.cprofile):
+        yield
+        return
+    enable(args.profile_slowest)
+    instrument()
+    prof = None
+    if args.cprofile:
+        import cProfile
+
+        prof = cProfile.Profile()
+        prof.enable()
+    w, c = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - w, time.process_time() - c
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(args.cprofile)
+        if args.profile:
+            write_report(root / args.profile, script, report(wall, cpu))
+
+
+def write_report(path: Path, script: str, section: dict) -> None:
+    """Merge section into the build report at path under scripts[script]."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        data = {}
+    if not isinstance(data, dict) or data.get("version") != 1:
+        data = {"version": 1, "scripts": {}}
+    data["scripts"][script] = section
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    print(f"Profile: {script} -> {path}", file=sys.stderr)
@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+"""Precompute the top-k related posts of every post.
+
+Scoring:
+- text: cosine of TF-IDF vectors over title (x3), excerpt (x2) and body,
+  tokenized like the search index (generate_search_index.tokenize), with
+  log-scaled term frequencies; a vector drops terms no other post has and
+  keeps its VECTOR_TERMS heaviest (a long post has thousands of terms)
+- tags: cosine of IDF-weighted tag sets (alias-normalized, compared by anchor)
+- score = (1 - TAG_WEIGHT) * text + TAG_WEIGHT * tags
+
+Only posts in the same language are related (a translation is not a "next
+read"), and scores under MIN_SCORE are dropped.
+
+There is no all-pairs loop. Every term and tag has a posting list, read as
+its POSTING_CAP heaviest posts. A post queries the postings of its QUERY_TERMS
+heaviest shared terms, accumulating partial dot products term at a time; the
+CANDIDATES best of those plus the CANDIDATES best tag matches are then scored
+in full, from the whole posting lists of the post's terms while they are short
+and from the candidates' vectors otherwise. The work per post is bounded by
+these constants however large the corpus grows.
+
+.cache/related.json keeps each post's tags and top-k, keyed by a digest of the
+fields they come from. A run with nothing new, edited or removed stops there.
+Otherwise the index in .cache/related-index/ is updated in place (see Index
+for its files): removed and edited posts leave the document frequencies and
+the posting lists of their terms, new and edited ones are tokenized, weighed
+and join them again, and only the shards and deltas holding those entries are
+read and written. Then only these are rescored:
+- new or edited posts
+- posts whose previous top-k listed an edited or removed post
+- posts an edited one now reaches through the postings, and would outrank
+  their current k-th neighbour
+Everything else keeps its vector and cached neighbours; --force rebuilds the
+index and rescores all (IDF drift from unrelated edits is otherwise ignored).
+
+Outputs:
+- related.json: {"version": 1, "k": K, "posts": {slug: [[slug, score], ...]}}
+- with --inject, a <nav class="related-posts"> block before </article> in
+  post/<slug>/index.html, replaced in place on later runs. postmeta strips
+  the block again, so it never feeds back into body text or the search index.
+  A post whose file and neighbours are as this stage last left them is not
+  read again (outputs.load_stamps).
+
+Usage:
+  scripts/related.py --root . [--inject] [--k 5]
+"""
+
+import argparse
+import hashlib
+import heapq
+import html
+import json
+import math
+import re
+import zlib
+from array import array
+from pathlib import Path
+
+import profiling
+from generate_search_index import tokenize
+from outputs import atomic_write, digest, load_stamps, save_stamps, write_output
+from postmeta import Post, lang_key, load_alias_map, load_json, norm_tags, scan_posts, tag_anchor
+
+FORMAT_VERSION = 1
+K = 5
+TAG_WEIGHT = 0.4
+MIN_SCORE = 0.05
+FIELD_WEIGHTS = {"title": 3, "excerpt": 2, "body": 1}
+VECTOR_TERMS = 200
+QUERY_TERMS = 64
+POSTING_CAP = 256
+CANDIDATES = 100
+CACHE_PATH = Path(".cache") / "related.json"
+SHARDS = 64
+DELTA_LIMIT = 50_000
+INDEX_DIR = Path(".cache") / "related-index"
+INDEX_META = "index.json"
+LEGACY_INDEX_PATH = Path(".cache") / "related-index.json"
+OUTPUT = "related.json"
+LABELS = {"zh": "相关文章"}
+DEFAULT_LABEL = "Related posts"
+
+BLOCK_RE = re.compile(r"[ \t]*<nav class=\"related-posts\"[^>]*>.*?</nav>\n?", re.S)
+ARTICLE_END_RE = re.compile(r"^([ \t]*)</article>", re.M)
+# Post <title>s end in the site name in either language; a list of posts does not need it.
+SITE_SUFFIX_RE = re.compile(r"\s*\|\s*(?:Mr\.\s*Qizhi|弃知先生)\s*$")
+SHARD_NAME_RE = re.compile(r"[a-z]+-(?:\d+|delta)\.(\d+)\.json")
+
+
+def term_counts(p: Post) -> dict[str, int]:
+    tf: dict[str, int] = {}
+    for name, w in FIELD_WEIGHTS.items():
+        for t in tokenize(getattr(p, name)):
+            tf[t] = tf.get(t, 0) + w
+    return tf
+
+
+def post_tags(p: Post, alias_map: dict[str, str] | None) -> list[str]:
+    return sorted({tag_anchor(t) for t in norm_tags(p.tags, alias_map)})
+
+
+def normalize(weights: dict[str, float], limit: int | None = None) -> dict[str, float]:
+    if limit is not None and len(weights) > limit:
+        weights = dict(heapq.nlargest(limit, weights.items(), key=lambda kv: kv[1]))
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {t: w / norm for t, w in weights.items()}
+
+
+def dot(a: dict[str, float], b: dict[str, float]) -> float:
+    """Summed in a's order, as scores() sums the posting lists of a's terms."""
+    s = 0.0
+    for t, w in a.items():
+        wo = b.get(t)
+        if wo is not None:
+            s += w * wo
+    return s
+
+
+class StaleIndex(Exception):
+    """A file named by the index metadata is missing or unreadable."""
+
+
+def shard_of(key: str) -> int:
+    return zlib.crc32(key.encode("utf-8")) % SHARDS
+
+
+def pack(kind: str, entries: dict):
+    """Shard file body of entries ({key: stored value}, None for deleted).
+
+    Terms never contain spaces (see tokenize), so term-keyed kinds store
+    their keys as one space-separated string and the values as a list:
+    hundreds of thousands of short JSON strings and object keys would
+    dominate load and save time.
+    """
+    if kind == "df":
+        return [" ".join(entries), list(entries.values())]
+    if kind == "postings":
+        by_lang: dict[str, tuple[list, list]] = {}
+        for (lang, t), value in entries.items():
+            terms, values = by_lang.setdefault(lang, ([], []))
+            terms.append(t)
+            values.append(value)
+        return {lang: [" ".join(terms), values] for lang, (terms, values) in by_lang.items()}
+    return entries
+
+
+def unpack(kind: str, data) -> dict:
+    if kind == "df":
+        return dict(zip(data[0].split(), data[1]))
+    if kind == "postings":
+        return {(lang, t): v for lang, (terms, values) in data.items() for t, v in zip(terms.split(), values)}
+    if not isinstance(data, dict):
+        raise TypeError(kind)
+    return data
+
+
+class Index:
+    """Term statistics, normalized TF-IDF and tag vectors, and impact-ordered
+    postings per language, persisted in shards under INDEX_DIR.
+
+    Term-keyed kinds (document frequencies, postings) are sharded by term and
+    post-keyed kinds (distinct terms, vectors) by slug; a loaded index reads a
+    shard the first time one of its keys is needed. A post's terms reach
+    into nearly every term shard, so changes to those kinds go to one delta
+    file per kind, laid over each shard as it is read, until DELTA_LIMIT keys
+    are pending and the delta is folded into the shards. A post shard is
+    rewritten when one of its posts changes. Languages, tags and tag
+    postings are small and kept in the metadata.
+
+    Posting lists are kept whole, weight descending, and capped at
+    POSTING_CAP where they are read, so a post leaves or joins them without
+    relinking any other. add()/remove() move a post in or out of the document
+    frequencies and postings; weigh() derives its vectors and queues its
+    postings, which link() sorts once every vector is in place.
+    """
+
+    KINDS = ("df", "postings", "terms", "vectors")
+    LOGGED = ("df", "postings")
+
+    def __init__(self, root: Path | None = None):
+        self.root = root  # None for a new index, which holds everything in memory
+        self.gen = 0
+        self.files = {kind: [0] * SHARDS for kind in self.KINDS}  # generation of each shard's file
+        self.deltas: dict[str, int | None] = {kind: None for kind in self.LOGGED}
+        self.df: dict[str, int] = {}
+        self.tag_df: dict[str, int] = {}
+        self.terms: dict[str, str] = {}  # slug -> distinct terms, space-separated, in order of first use
+        self.tags: dict[str, list[str]] = {}  # slug -> tag anchors
+        self.langs: dict[str, str] = {}
+        self.vec: dict[str, dict[str, float]] = {}
+        self.tag_vec: dict[str, dict[str, float]] = {}
+        self.postings: dict[tuple[str, str], list[tuple[float, str]]] = {}
+        self.tag_postings: dict[tuple[str, str], list[tuple[float, str]]] = {}
+        # Postings as stored, [weight, id, weight, id, ...], until first used.
+        self.raw: dict[tuple[str, str], list] = {}
+        self.ids: dict[str, int] = {}  # slug -> the number stored postings use
+        self.slug_of: dict[int, str] = {}  # the reverse, as loaded
+        self.free: list[int] = []
+        self.loaded: dict[str, dict[int, set]] = {kind: {} for kind in self.KINDS}  # shard -> its keys
+        self.pending: dict[str, dict[int, dict]] = {kind: {} for kind in self.LOGGED}  # delta entries by shard
+        self.dirty: dict[str, set] = {kind: set() for kind in self.KINDS}  # keys changed since loading
+        self.df_delta: dict[str, int] = {}
+        self.unsorted: set[tuple[str, str]] = set()
+
+    @staticmethod
+    def shard(kind: str, key) -> int:
+        return shard_of(key[1] if kind == "postings" else key)
+
+    def read(self, kind: str, name: str) -> dict:
+        try:
+            return unpack(kind, load_json(self.root / INDEX_DIR / name))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise StaleIndex(name) from e
+
+    def load(self, kind: str, n: int) -> None:
+        entries = self.read(kind, f"{kind}-{n:02d}.{self.files[kind][n]}.json")
+        pending = self.pending.get(kind, {}).pop(n, {})
+        entries.update(pending)
+        if kind == "df":
+            self.df.update(entries)
+        elif kind == "postings":
+            self.raw.update(entries)
+        elif kind == "terms":
+            self.terms.update(entries)
+        else:
+            for slug, (terms, weights) in entries.items():
+                self.vec[slug] = dict(zip(terms.split(), weights))
+        for key, value in pending.items():
+            if value is None:
+                (self.df if kind == "df" else self.raw).pop(key, None)
+        self.loaded[kind][n] = set(entries)
+        self.dirty[kind].update(pending)
+
+    def need(self, kind: str, keys) -> None:
+        """Read the shards of `kind` holding any of keys (terms or slugs) not loaded yet."""
+        if self.root is not None:
+            for n in {shard_of(key) for key in keys} - self.loaded[kind].keys():
+                self.load(kind, n)
+
+    def touch(self, kind: str, key) -> None:
+        if self.root is not None:
+            self.dirty[kind].add(key)
+
+    def posting(self, key: tuple[str, str]) -> list[tuple[float, str]] | None:
+        ps = self.postings.get(key)
+        if ps is None and key in self.raw:
+            flat = self.raw.pop(key)
+            ps = self.postings[key] = list(zip(flat[::2], map(self.slug_of.__getitem__, flat[1::2])))
+        return ps
+
+    def size(self, key: tuple[str, str]) -> int:
+        ps = self.postings.get(key)
+        return len(ps) if ps is not None else len(self.raw.get(key, ())) // 2
+
+    def head(self, key: tuple[str, str]) -> list[tuple[float, str]]:
+        """The POSTING_CAP heaviest posts of key, without decoding the rest."""
+        ps = self.postings.get(key)
+        if ps is not None:
+            return ps[:POSTING_CAP]
+        flat = self.raw[key][: 2 * POSTING_CAP]
+        return list(zip(flat[::2], map(self.slug_of.__getitem__, flat[1::2])))
+
+    def stored(self, kind: str, key):
+        """key's value as a shard file holds it; None once deleted."""
+        if kind == "df":
+            return self.df.get(key)
+        if kind == "postings":
+            if key not in self.postings:
+                return self.raw.get(key)
+            return [x for w, slug in self.postings[key] for x in (w, self.ids[slug])] or None
+        if kind == "terms":
+            return self.terms.get(key)
+        vec = self.vec.get(key)
+        return None if vec is None else [" ".join(vec), list(vec.values())]
+
+    def add(self, slug: str, counts: dict[str, int], tags: list[str], lang: str) -> None:
+        self.need("df", counts)
+        self.need("terms", [slug])
+        self.terms[slug] = " ".join(counts)
+        self.touch("terms", slug)
+        self.tags[slug] = tags
+        self.langs[slug] = lang
+        self.ids[slug] = self.free.pop() if self.free else len(self.ids)
+        df = self.df
+        for t in counts:
+            df[t] = df.get(t, 0) + 1
+        if self.root is not None:
+            delta = self.df_delta
+            for t in counts:
+                delta[t] = delta.get(t, 0) + 1
+        for t in tags:
+            self.tag_df[t] = self.tag_df.get(t, 0) + 1
+
+    def remove(self, slug: str) -> None:
+        if slug not in self.langs:
+            return
+        self.need("terms", [slug])
+        self.need("vectors", [slug])
+        terms = self.terms.pop(slug).split()
+        self.need("df", terms)
+        df, delta = self.df, self.df_delta
+        for t in terms:
+            df[t] -= 1
+            if not df[t]:
+                del df[t]
+            delta[t] = delta.get(t, 0) - 1
+        for t in self.tags.pop(slug):
+            self.tag_df[t] -= 1
+            if not self.tag_df[t]:
+                del self.tag_df[t]
+        lang = self.langs.pop(slug)
+        vec = self.vec.pop(slug)
+        self.need("postings", vec)
+        for t, w in vec.items():
+            ps = self.posting((lang, t))
+            ps.remove((w, slug))
+            if not ps:
+                del self.postings[(lang, t)]
+            self.touch("postings", (lang, t))
+        for t, w in self.tag_vec.pop(slug).items():
+            ps = self.tag_postings[(lang, t)]
+            ps.remove((w, slug))
+            if not ps:
+                del self.tag_postings[(lang, t)]
+        self.touch("terms", slug)
+        self.touch("vectors", slug)
+        self.free.append(self.ids.pop(slug))
+
+    def weigh(self, slug: str, counts: dict[str, int]) -> None:
+        n = len(self.langs)
+        df, tag_df = self.df, self.tag_df
+        weights = {t: (1 + math.log(c)) * (1 + math.log(n / df[t])) for t, c in counts.items() if df[t] > 1}
+        self.need("vectors", [slug])
+        self.vec[slug] = vec = normalize(weights, VECTOR_TERMS)
+        self.tag_vec[slug] = normalize({t: 1 + math.log(n / tag_df[t]) for t in self.tags[slug]})
+        self.touch("vectors", slug)
+        lang = self.langs[slug]
+        self.need("postings", vec)
+        for t, w in vec.items():
+            ps = self.posting((lang, t))
+            if ps is None:
+                ps = self.postings[(lang, t)] = []
+            ps.append((w, slug))
+            self.unsorted.add((lang, t))
+            self.touch("postings", (lang, t))
+        for t, w in self.tag_vec[slug].items():
+            self.tag_postings.setdefault((lang, t), []).append((w, slug))
+            self.unsorted.add((lang, t))
+
+    def link(self) -> None:
+        for key in self.unsorted:
+            for postings in (self.postings, self.tag_postings):
+                if key in postings:
+                    postings[key].sort(reverse=True)
+        self.unsorted = set()
+
+    def entries(self, kind: str, keys) -> dict:
+        out = {}
+        for key in sorted(keys):
+            value = self.stored(kind, key)
+            if value is not None:
+                out[key] = value
+        return out
+
+    def writes(self, gen: int) -> dict[str, object]:
+        """Files that save generation gen, by name, pointing self.files and
+        self.deltas at them."""
+        out: dict[str, object] = {}
+        if self.root is None:
+            every = {"df": self.df, "postings": self.postings, "terms": self.terms, "vectors": self.vec}
+            for kind, keys in every.items():
+                shards: dict[int, list] = {n: [] for n in range(SHARDS)}
+                for key in keys:
+                    shards[self.shard(kind, key)].append(key)
+                for n, ks in shards.items():
+                    out[f"{kind}-{n:02d}.{gen}.json"] = pack(kind, self.entries(kind, ks))
+                self.files[kind] = [gen] * SHARDS
+            return out
+        for t, d in self.df_delta.items():
+            if d:
+                self.dirty["df"].add(t)
+        for kind in self.KINDS:
+            dirty = self.dirty[kind]
+            pending = self.pending.get(kind, {})
+            if kind in self.LOGGED and len(dirty) + sum(map(len, pending.values())) <= DELTA_LIMIT:
+                if dirty:
+                    entries = {key: value for by_key in pending.values() for key, value in by_key.items()}
+                    entries.update((key, self.stored(kind, key)) for key in sorted(dirty))
+                    out[f"{kind}-delta.{gen}.json"] = pack(kind, entries)
+                    self.deltas[kind] = gen
+                continue
+            for n in list(pending):
+                self.load(kind, n)
+            if kind in self.LOGGED:
+                self.deltas[kind] = None
+            shards = {}
+            for key in dirty:
+                shards.setdefault(self.shard(kind, key), set()).add(key)
+            for n, keys in shards.items():
+                out[f"{kind}-{n:02d}.{gen}.json"] = pack(kind, self.entries(kind, self.loaded[kind][n] | keys))
+                self.files[kind][n] = gen
+        return out
+
+    def to_meta(self) -> dict:
+        tag_postings: dict[str, dict[str, list]] = {}
+        for (lang, t), ps in sorted(self.tag_postings.items()):
+            tag_postings.setdefault(lang, {})[t] = [x for w, slug in ps for x in (w, self.ids[slug])]
+        return {
+            "gen": self.gen,
+            "files": self.files,
+            "deltas": self.deltas,
+            "tag_df": self.tag_df,
+            "posts": {slug: [self.ids[slug], self.langs[slug], self.tags[slug], self.tag_vec[slug]] for slug in self.langs},
+            "tag_postings": tag_postings,
+        }
+
+    @classmethod
+    def from_meta(cls, root: Path, data: dict) -> "Index":
+        index = cls(root)
+        index.gen, index.files, index.deltas, index.tag_df = data["gen"], data["files"], data["deltas"], data["tag_df"]
+        for slug, (i, lang, tags, tag_vec) in data["posts"].items():
+            index.ids[slug], index.langs[slug], index.tags[slug], index.tag_vec[slug] = i, lang, tags, tag_vec
+        index.slug_of = slugs = {i: slug for slug, i in index.ids.items()}
+        index.free = sorted(set(range(max(slugs, default=-1) + 1)) - slugs.keys(), reverse=True)
+        for lang, lists in data["tag_postings"].items():
+            for t, flat in lists.items():
+                index.tag_postings[(lang, t)] = list(zip(flat[::2], map(slugs.__getitem__, flat[1::2])))
+        for kind, gen in index.deltas.items():
+            if gen is not None:
+                for key, value in index.read(kind, f"{kind}-delta.{gen}.json").items():
+                    index.pending[kind].setdefault(index.shard(kind, key), {})[key] = value
+        return index
+
+    def scores(self, slug: str) -> dict[str, float]:
+        """Combined score against the candidates found through the postings."""
+        lang = self.langs[slug]
+        self.need("vectors", [slug])
+        vec = self.vec[slug]
+        self.need("postings", vec)
+        sizes = {t: self.size((lang, t)) for t in vec}
+        shared = ((t, w) for t, w in vec.items() if sizes[t] > 1)
+        partial: dict[str, float] = {}
+        for t, w in heapq.nlargest(QUERY_TERMS, shared, key=lambda kv: kv[1]):
+            for wo, other in self.head((lang, t)):
+                partial[other] = partial.get(other, 0.0) + w * wo
+        tags: dict[str, float] = {}
+        for t, w in self.tag_vec[slug].items():
+            for wo, other in self.tag_postings[(lang, t)][:POSTING_CAP]:
+                tags[other] = tags.get(other, 0.0) + w * wo
+        candidates = set(heapq.nlargest(CANDIDATES + 1, partial, key=partial.get))
+        candidates.update(heapq.nlargest(CANDIDATES + 1, tags, key=tags.get))
+        candidates.discard(slug)
+        # The whole posting lists of this post's terms hold every post sharing
+        # one, so while they are shorter than the candidates' vectors together
+        # the text similarity comes from them and no other vector is read.
+        if sum(sizes.values()) <= len(candidates) * len(vec):
+            text = dict.fromkeys(candidates, 0.0)
+            for t, w in vec.items():
+                for wo, other in self.posting((lang, t)):
+                    if other in text:
+                        text[other] += w * wo
+        else:
+            self.need("vectors", candidates)
+            text = {other: dot(vec, self.vec[other]) for other in candidates}
+        return {other: (1 - TAG_WEIGHT) * text[other] + TAG_WEIGHT * tags.get(other, 0.0) for other in candidates}
+
+
+def top_k(scores: dict[str, float], k: int) -> list[list]:
+    best = heapq.nsmallest(k, ((-s, o) for o, s in scores.items() if s >= MIN_SCORE))
+    return [[o, round(-s, 4)] for s, o in best]
+
+
+def load_cache(root: Path, params: list) -> dict[str, dict]:
+    data = load_json(root / CACHE_PATH)
+    if not isinstance(data, dict) or data.get("params") != params:
+        return {}
+    posts = data.get("posts")
+    return posts if isinstance(posts, dict) else {}
+
+
+def save_cache(root: Path, params: list, docs: dict[str, dict]) -> None:
+    blob = json.dumps({"params": params, "posts": docs}, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    atomic_write(root / CACHE_PATH, blob.encode("utf-8"))
+
+
+def load_index(root: Path, params: list) -> Index | None:
+    data = load_json(root / INDEX_DIR / INDEX_META)
+    if not isinstance(data, dict) or data.get("params") != params:
+        return None
+    try:
+        return Index.from_meta(root, data)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+def save_index(root: Path, params: list, index: Index) -> None:
+    """Write what changed under a new generation, then the metadata naming
+    it, then drop the files the metadata no longer names: a run cut short
+    leaves the previous index whole."""
+    folder = root / INDEX_DIR
+    old = list(folder.iterdir()) if folder.is_dir() else []
+    gen = max([index.gen, *(int(m.group(1)) for m in map(SHARD_NAME_RE.fullmatch, (p.name for p in old)) if m)]) + 1
+    for name, body in index.writes(gen).items():
+        atomic_write(folder / name, json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    index.gen = gen
+    blob = json.dumps({"params": params, **index.to_meta()}, ensure_ascii=False, separators=(",", ":"))
+    atomic_write(folder / INDEX_META, blob.encode("utf-8"))
+    keep = {INDEX_META}
+    keep.update(f"{kind}-{n:02d}.{g}.json" for kind, gens in index.files.items() for n, g in enumerate(gens))
+    keep.update(f"{kind}-delta.{g}.json" for kind, g in index.deltas.items() if g is not None)
+    for p in old:
+        if p.name not in keep:
+            p.unlink(missing_ok=True)
+    (root / LEGACY_INDEX_PATH).unlink(missing_ok=True)
+
+
+def compute(root: Path, posts: list[Post], k: int, force: bool = False) -> tuple[dict[str, list], int]:
+    """({slug: [[slug, score], ...]}, number of posts rescored)."""
+    try:
+        return update(root, posts, k, force)
+    except StaleIndex:
+        return update(root, posts, k, True)
+
+
+def update(root: Path, posts: list[Post], k: int, force: bool) -> tuple[dict[str, list], int]:
+    params = [FORMAT_VERSION, k, TAG_WEIGHT, MIN_SCORE, FIELD_WEIGHTS, VECTOR_TERMS, QUERY_TERMS, POSTING_CAP, CANDIDATES,
+              SHARDS]
+    cache = {} if force else load_cache(root, params)
+    alias_map = load_alias_map(root)
+
+    docs: dict[str, dict] = {}
+    changed: set[str] = set()
+    for p in posts:
+        tags = post_tags(p, alias_map)
+        lang = lang_key(p.lang)
+        key = digest(p.title, p.excerpt, p.body, tags, lang)
+        hit = cache.get(p.slug)
+        if hit and hit.get("key") == key:
+            docs[p.slug] = hit
+            profiling.count("related", "hit")
+        else:
+            docs[p.slug] = {"key": key, "tags": tags, "lang": lang, "top": None}
+            changed.add(p.slug)
+            profiling.count("related", "miss")
+    gone = cache.keys() - docs.keys()
+    dirty = changed | gone
+    if not dirty:
+        if not (root / CACHE_PATH).exists():
+            save_cache(root, params, docs)
+        return {slug: d["top"] for slug, d in docs.items()}, 0
+
+    with profiling.stage("index"):
+        index = None if force else load_index(root, params)
+        if index is None or index.langs.keys() != cache.keys():
+            index, weigh = Index(), docs.keys()
+        else:
+            weigh = changed
+            for slug in dirty:
+                index.remove(slug)
+        # Counts wait for weigh() as arrays beside the term lists add() keeps;
+        # a dict per post would hold hundreds of megabytes on a cold run.
+        tf: dict[str, array] = {}
+        for p in posts:
+            if p.slug in weigh:
+                counts = term_counts(p)
+                index.add(p.slug, counts, docs[p.slug]["tags"], docs[p.slug]["lang"])
+                tf[p.slug] = array("L", counts.values())
+        for slug, c in tf.items():
+            index.weigh(slug, dict(zip(index.terms[slug].split(), c)))
+        index.link()
+
+    affected = set(changed)
+    for slug, d in docs.items():
+        if d["top"] is not None and any(o in dirty for o, _ in d["top"]):
+            affected.add(slug)
+    scored: dict[str, dict[str, float]] = {}
+    with profiling.stage("score"):
+        for slug in changed:
+            scored[slug] = index.scores(slug)
+            for other, s in scored[slug].items():
+                top = docs[other]["top"]
+                if top is not None and s >= MIN_SCORE and (len(top) < k or s > top[-1][1]):
+                    affected.add(other)
+        for slug in affected:
+            docs[slug]["top"] = top_k(scored[slug] if slug in scored else index.scores(slug), k)
+
+    save_index(root, params, index)
+    save_cache(root, params, docs)
+    return {slug: d["top"] for slug, d in docs.items()}, len(affected)
+
+
+def write_related(root: Path, related: dict[str, list], k: int) -> bool:
+    """Write OUTPUT; returns whether it changed."""
+    blob = json.dumps(
+        {"version": FORMAT_VERSION, "k": k, "posts": dict(sorted(related.items()))},
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return write_output(root, OUTPUT, blob + "\n")
+
+
+def render_block(p: Post, top: list[list], by_slug: dict[str, Post], indent: str) -> str:
+    label = LABELS.get(lang_key(p.lang), DEFAULT_LABEL)
+    lines = [
+        f"{indent}<nav class=\"related-posts\" aria-label=\"{label}\">",
+        f"{indent}  <h2>{label}</h2>",
+        f"{indent}  <ul>",
+    ]
+    for slug, _ in top:
+        title = SITE_SUFFIX_RE.sub("", by_slug[slug].title)
+        lines.append(f"{indent}    <li><a href=\"/post/{slug}/\">{html.escape(title)}</a></li>")
+    lines += [f"{indent}  </ul>", f"{indent}</nav>"]
+    return "\n".join(lines) + "\n"
+
+
+def inject(text: str, block: str) -> str:
+    """Replace the related block in a post, or insert it before </article>."""
+    if BLOCK_RE.search(text):
+        return BLOCK_RE.sub(lambda _: block, text, count=1)
+    if not block:
+        return text
+    m = ARTICLE_END_RE.search(text)
+    if not m:
+        return text
+    return text[: m.start()] + block + text[m.start():]
+
+
+def inject_all(root: Path, posts: list[Post], related: dict[str, list]) -> int:
+    """Write the related block into each post; returns posts changed.
+
+    Posts whose bytes (Post.sha256 from the postmeta scan) and listed
+    neighbours are stamped as already done are skipped unread.
+    """
+    by_slug = {p.slug: p for p in posts}
+    stamps = load_stamps(root, "related")
+    done: dict[str, str] = {}
+    changed = 0
+    for p in posts:
+        top = related.get(p.slug) or []
+        listed = [(slug, by_slug[slug].title) for slug, _ in top]
+        if stamps.get(p.slug) == digest(FORMAT_VERSION, p.sha256, listed):
+            done[p.slug] = stamps[p.slug]
+            profiling.count("inject", "skip")
+            continue
+        text = (root / p.path).read_text(encoding="utf-8")
+        m = ARTICLE_END_RE.search(text)
+        indent = (m.group(1) if m else "") + "  "
+        new = inject(text, render_block(p, top, by_slug, indent) if top else "")
+        if new != text:
+            changed += write_output(root, p.path, new)
+        done[p.slug] = digest(FORMAT_VERSION, hashlib.sha256(new.encode("utf-8")).hexdigest(), listed)
+    save_stamps(root, "related", done)
+    return changed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--k", type=int, default=K, help="neighbours per post")
+    ap.add_argument("--inject", action="store_true", help="also write a related-posts block into each post")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update .cache/postmeta.json")
+    ap.add_argument("--jobs", type=int, default=None, help="parallel extraction processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="rescore every post")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    with profiling.session(args, "related", root):
+        with profiling.stage("scan"):
+            posts = scan_posts(root, use_cache=not args.no_cache, jobs=args.jobs)
+        related, rescored = compute(root, posts, args.k, args.force)
+        written = write_related(root, related, args.k)
+        injected = 0
+        if args.inject:
+            with profiling.stage("inject"):
+                injected = inject_all(root, posts, related)
+    msg = f"Related posts: {len(related)} posts, {rescored} rescored"
+    msg += f"; {OUTPUT} {'written' if written else 'unchanged'}"
+    if args.inject:
+        msg += f", {injected} posts updated"
+    print(msg)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
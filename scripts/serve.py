@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Serve the site locally, optionally rebuilding and live-reloading on edits.
+
+  scripts/serve.py --root . [--port 8000] [--watch]
+
+The server is stdlib only. It sends Content-Type with charset for text types,
+ETag/Last-Modified, and answers If-None-Match / If-Modified-Since with 304.
+Generated pages link the production base URL; HTML and JSON responses (the
+search manifest and shards, feed.json, related.json) have it rewritten to
+site-relative paths so navigation and search results stay on the local
+server. Other files with an up-to-date compress.py sidecar (<file>.gz) are sent
+precompressed to clients that accept gzip. Files on disk are never touched by
+the server itself.
+
+With --watch, post/, data/ and styles/ are polled with os.scandir stat sweeps
+every --interval seconds. Changed paths are classified (posts, alias,
+featured, styles) and build.build() runs, in this process, only the stages
+whose build.READS include one of those kinds, with build.py's arguments:
+
+  post/**                 every stage but fingerprint
+  data/tags-alias.json    related, search, sitemap, index, pages, feeds, links
+  data/featured.json      index, links
+  styles/**               fingerprint, index, pages, links
+
+So the stage table and its arguments are build.py's, and a rebuild writes
+the same bytes build.py would (stages still skip outputs whose input digest
+is unchanged, see outputs.py). --base only changes what responses rewrite;
+a rebuild writes build.BASE like build.py. The .gz sidecars are left to
+build.py --compress; a stale one is not sent.
+
+related, hreflang and images rewrite posts. Those writes are not taken for
+edits: the sweep after a rebuild forgets the posts it rewrote.
+data/lastmod.json, which the sitemap stamps, is not watched. After a
+rebuild, open pages reload through a server-sent event stream at /__reload.
+"""
+
+import argparse
+import email.utils
+import io
+import os
+import threading
+import time
+import traceback
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from build import BASE, OPT_IN, READS, STAGES, build
+from fingerprint import is_hashed
+from postmeta import Post, scan_posts
+
+WATCH_DIRS = ["post", "data", "styles"]
+# Written by the build itself; watching them would loop.
+IGNORE = {"data/lastmod.json"}
+
+RELOAD_PATH = "/__reload"
+RELOAD_SCRIPT = (
+    b'<script>new EventSource("' + RELOAD_PATH.encode() + b'").onmessage = () => location.reload();</script>\n'
+)
+# Served with the production base URL rewritten, never from a .gz sidecar.
+REWRITE_TYPES = ("text/html", "application/json")
+TEXT_TYPES = ("text/", "application/json", "application/xml", "image/svg+xml")
+
+
+def snapshot(root: Path) -> dict[str, tuple[int, int]]:
+    """rel path -> (mtime_ns, size) for every file under WATCH_DIRS."""
+    out: dict[str, tuple[int, int]] = {}
+    stack = [d for d in WATCH_DIRS if (root / d).is_dir()]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(root / rel_dir) as it:
+            for e in it:
+                rel = f"{rel_dir}/{e.name}"
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(rel)
+                elif rel not in IGNORE and not is_hashed(e.name):
+                    st = e.stat()
+                    out[rel] = (st.st_mtime_ns, st.st_size)
+    return out
+
+
+def classify(changed: set[str]) -> set[str]:
+    kinds = set()
+    for rel in changed:
+        if rel.startswith("post/"):
+            kinds.add("posts")
+        elif rel.startswith("styles/"):
+            kinds.add("styles")
+        elif rel == "data/tags-alias.json":
+            kinds.add("alias")
+        elif rel == "data/featured.json":
+            kinds.add("featured")
+    return kinds
+
+
+def rewritten(before: list[Post], after: list[Post]) -> set[str]:
+    """Paths of posts whose bytes differ between two scans."""
+    old = {p.slug: p.sha256 for p in before}
+    return {p.path for p in after if old.get(p.slug) != p.sha256}
+
+
+def rebuild(root: Path, kinds: set[str]) -> tuple[list[str], set[str]]:
+    """Run the build stages that read any of kinds; (their names, posts they rewrote)."""
+    stages = [name for name, *_ in STAGES if name not in OPT_IN and READS[name] & kinds]
+    if not stages:
+        return [], set()
+    posts = scan_posts(root)
+    build(root, minify=False, jobs=1, report=None, only=set(stages))
+    return stages, rewritten(posts, scan_posts(root))
+
+
+class Reloader:
+    """Version counter that SSE handlers block on."""
+
+    def __init__(self):
+        self.version = 0
+        self._cond = threading.Condition()
+
+    def bump(self) -> None:
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+
+class Handler(SimpleHTTPRequestHandler):
+    extensions_map = {
+        **SimpleHTTPRequestHandler.extensions_map,
+        ".js": "text/javascript",
+        ".json": "application/json",
+        ".xml": "application/xml",
+        ".svg": "image/svg+xml",
+        ".webp": "image/webp",
+        ".avif": "image/avif",
+        ".bin": "application/octet-stream",
+    }
+
+    def __init__(self, *args, base: str, reloader: Reloader | None, **kwargs):
+        self.base = base.encode("utf-8")
+        self.reloader = reloader
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.reloader is not None and self.path == RELOAD_PATH:
+            self.stream_reloads()
+            return
+        super().do_GET()
+
+    def stream_reloads(self) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        seen = self.reloader.version
+        try:
+            while True:
+                now = self.reloader.wait(seen, 15)
+                self.wfile.write(f"data: {now}\n\n".encode() if now != seen else b": ping\n\n")
+                self.wfile.flush()
+                seen = now
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            url_path = self.path.partition("?")[0]
+            if not url_path.endswith("/"):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header("Location", url_path + "/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            path = os.path.join(path, "index.html")
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+
+        ctype = self.guess_type(path)
+        rewrite = ctype in REWRITE_TYPES
+        gz = not rewrite and self.accepts_gzip() and self.fresh_sidecar(path, st)
+        with open(path + ".gz" if gz else path, "rb") as f:
+            data = f.read()
+        if rewrite:
+            data = data.replace(self.base, b"")
+        if ctype == "text/html" and self.reloader is not None:
+            data = data.replace(b"</body>", RELOAD_SCRIPT + b"</body>", 1)
+        if ctype.startswith(TEXT_TYPES) or ctype == "text/javascript":
+            ctype += "; charset=utf-8"
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", ctype)
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        if not rewrite:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Last-Modified", self.date_time_string(st.st_mtime))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return io.BytesIO(data)
+
+    def accepts_gzip(self) -> bool:
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            coding, _, params = part.strip().partition(";")
+            if coding.strip().lower() == "gzip":
+                return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+        return False
+
+    @staticmethod
+    def fresh_sidecar(path: str, st: os.stat_result) -> bool:
+        try:
+            return os.stat(path + ".gz").st_mtime_ns >= st.st_mtime_ns
+        except OSError:
+            return False
+
+    def not_modified(self, etag: str, mtime: float) -> bool:
+        inm = self.headers.get("If-None-Match")
+        if inm is not None:
+            return etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"
+        ims = self.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                since = email.utils.parsedate_to_datetime(ims)
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since.timestamp()
+        return False
+
+
+def watch(root: Path, reloader: Reloader, interval: float) -> None:
+    before = snapshot(root)
+    while True:
+        time.sleep(interval)
+        now = snapshot(root)
+        changed = {rel for rel in before.keys() | now.keys() if before.get(rel) != now.get(rel)}
+        before = now
+        if not changed:
+            continue
+        t0 = time.perf_counter()
+        try:
+            stages, written = rebuild(root, classify(changed))
+        except Exception:
+            traceback.print_exc()
+            continue
+        if written:
+            # The rebuild's own post writes; later edits to them still show.
+            after = snapshot(root)
+            for rel in written:
+                if rel in after:
+                    before[rel] = after[rel]
+        print(f"Rebuilt {', '.join(stages) or 'nothing'} for {len(changed)} changed files in {time.perf_counter() - t0:.2f}s")
+        reloader.bump()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=".")
+    ap.add_argument("--base", default=BASE, help="base URL rewritten to site-relative paths in responses")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--watch", action="store_true", help="rebuild affected outputs on change and live-reload pages")
+    ap.add_argument("--interval", type=float, default=0.25, help="seconds between --watch stat sweeps")
+    args = ap.parse_args()
+
+    root = Path(args.root).resolve()
+    base = args.base.rstrip("/")
+    reloader = Reloader() if args.watch else None
+    handler = partial(Handler, directory=str(root), base=base, reloader=reloader)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"Serving {root} at http://{args.host}:{server.server_port}/" + (" (watching)" if args.watch else ""))
+    if reloader is None:
+        server.serve_forever()
+        return 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        watch(root, reloader, args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
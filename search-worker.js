@@ -0,0 +1,392 @@
+// Search worker: holds the search index and ranks queries off the main thread.
+// Template for search-worker.js, written by scripts/generate_search_index.py
+// (which fills in TOKEN_RE from its own tokenizer).
+//
+// Protocol:
+//   -> {type: 'init', manifests: [url, fallback url]}
+//   <- {type: 'ready', total}  or  {type: 'error'}
+//   -> {type: 'query', id, q, tags: [anchor, ...], mode: 'and' | 'or'}
+//   <- {type: 'results', id, q, count, more, items: [{url, title, date, tags, excerpt}],
+//       selected: [{tag, name, count}], facets: [{tag, name, count}]}
+//      (repeated for the same id as shards and their body indexes load;
+//      a newer query stops the work for older ones)
+'use strict';
+
+const LIMIT = 30;
+const BODY_WEIGHT = 1;
+const CACHE_SIZE = 64;
+const FACET_LIMIT = 12;
+
+// Shards are listed newest first; older ones load only when a query needs them.
+// Doc ids are global: shard docs concatenated in manifest order.
+let manifest;
+const shards = [];   // by manifest index, filled as they load
+const starts = [];   // global id of each shard's first doc
+const pending = {};
+const bodies = [];   // body index by manifest index, loaded with its shard for text queries
+const bodyPending = {};
+let facets = null;   // search/facets-*.json, see scripts/facets.py
+const facetAt = new Map();  // anchor -> index into facets.tags
+let gen = 0;         // bumped whenever a shard or a body index arrives
+let latest = 0;      // id of the newest query
+
+// Shard and body URLs are content-hashed, so only the manifest needs revalidating.
+async function getJSON(url, cache = 'default') {
+  const res = await fetch(url, {cache});
+  if (!res.ok) throw new Error(res.status);
+  return res.json();
+}
+
+function load(s) {
+  if (!pending[s]) {
+    pending[s] = getJSON(manifest.shards[s].url)
+      .then(shard => { shards[s] = shard; gen++; }, e => { delete pending[s]; throw e; });
+  }
+  return pending[s];
+}
+
+function nextUnloaded() {
+  for (let s = 0; s < manifest.shards.length; s++) if (!pending[s]) return s;
+  return -1;
+}
+
+function shardOf(g) {
+  let lo = 0, hi = starts.length - 1;
+  while (lo < hi) { const mid = (lo + hi + 1) >> 1; if (starts[mid] <= g) lo = mid; else hi = mid - 1; }
+  return lo;
+}
+
+function docAt(g) {
+  const s = shardOf(g);
+  return shards[s] ? shards[s].docs[g - starts[s]] : null;
+}
+
+// Docs from shards not loaded yet sort by their shard's newest date.
+function docDate(g) {
+  const it = docAt(g);
+  return it ? (it.date || '') : manifest.shards[shardOf(g)].to;
+}
+
+function byScore(a, b) {
+  return b.sc - a.sc || b.date.localeCompare(a.date) || a.g - b.g;
+}
+
+// Shard body index: see the layout in scripts/generate_search_index.py.
+function decodeBody(buf) {
+  const bytes = new Uint8Array(buf);
+  const dv = new DataView(buf);
+  if (String.fromCharCode(...bytes.subarray(0, 4)) !== 'QZB1') throw new Error('bad body index');
+  const n = dv.getUint32(4, true);
+  const dictLen = dv.getUint32(12, true);
+  let p = 16;
+  function varint() {
+    let v = 0, mul = 1, b;
+    do { b = bytes[p++]; v += (b & 0x7f) * mul; mul *= 128; } while (b & 0x80);
+    return v;
+  }
+  const dec = new TextDecoder();
+  const terms = new Array(n);
+  const offs = new Uint32Array(n + 1);
+  let prev = new Uint8Array(0);
+  let off = 16 + dictLen;
+  for (let i = 0; i < n; i++) {
+    const shared = varint(), len = varint();
+    const cur = new Uint8Array(shared + len);
+    cur.set(prev.subarray(0, shared));
+    cur.set(bytes.subarray(p, p + len), shared);
+    p += len;
+    terms[i] = dec.decode(cur);
+    offs[i] = off;
+    off += varint();
+    prev = cur;
+  }
+  offs[n] = off;
+  return {
+    terms,
+    docs(i, out) {
+      let doc = 0;
+      p = offs[i];
+      while (p < offs[i + 1]) { doc += varint(); out.add(doc); }
+    },
+  };
+}
+
+// Body indexes are gzip files. A server that labels them Content-Encoding: gzip
+// hands them over inflated already.
+async function inflate(res) {
+  const buf = await res.arrayBuffer();
+  const b = new Uint8Array(buf, 0, Math.min(2, buf.byteLength));
+  if (b[0] !== 0x1f || b[1] !== 0x8b) return buf;
+  return new Response(new Blob([buf]).stream().pipeThrough(new DecompressionStream('gzip'))).arrayBuffer();
+}
+
+function loadBody(s) {
+  if (!bodyPending[s]) {
+    bodyPending[s] = fetch(manifest.shards[s].body.url)
+      .then(res => { if (!res.ok) throw new Error(res.status); return inflate(res); })
+      .then(buf => { bodies[s] = decodeBody(buf); gen++; }, e => { delete bodyPending[s]; throw e; });
+  }
+  return bodyPending[s];
+}
+
+// A shard, and its body index too when there is text to match.
+function loadFor(s, text) {
+  return Promise.all([load(s), text && manifest.shards[s].body ? loadBody(s) : null]);
+}
+
+// Must match tokenize() in scripts/generate_search_index.py.
+const TOKEN_RE = new RegExp("[\\u3400-\\u4dbf\\u4e00-\\u9fff]+|[a-z0-9]+", 'g');
+function tokenize(text) {
+  const out = [];
+  for (const m of text.toLowerCase().matchAll(TOKEN_RE)) {
+    const w = m[0];
+    if (w.charCodeAt(0) < 128) { out.push(w); continue; }
+    for (let i = 0; i < w.length - 1; i++) out.push(w.slice(i, i + 2));
+    out.push(w[w.length - 1]);
+  }
+  return out;
+}
+
+function lowerBound(arr, x) {
+  let lo = 0, hi = arr.length;
+  while (lo < hi) { const mid = (lo + hi) >> 1; if (arr[mid] < x) lo = mid + 1; else hi = mid; }
+  return lo;
+}
+
+// doc -> weight for one token; prefix also matches longer terms (type-ahead).
+function lookup(shard, tok, prefix) {
+  const hits = new Map();
+  for (let i = lowerBound(shard.terms, tok); i < shard.terms.length; i++) {
+    const term = shard.terms[i];
+    if (prefix ? !term.startsWith(tok) : term !== tok) break;
+    const p = shard.postings[i];
+    for (let j = 0; j < p.length; j += 2) hits.set(p[j], Math.max(hits.get(p[j]) || 0, p[j + 1]));
+  }
+  return hits;
+}
+
+function bodyLookup(body, tok, prefix) {
+  const hits = new Set();
+  for (let i = lowerBound(body.terms, tok); i < body.terms.length; i++) {
+    const term = body.terms[i];
+    if (prefix ? !term.startsWith(tok) : term !== tok) break;
+    body.docs(i, hits);
+  }
+  return hits;
+}
+
+// Global doc -> weight for one token over everything loaded. Only docs in
+// `within` (a Map) are kept when it is given.
+function tokenHits(tok, prefix, within) {
+  const hits = new Map();
+  shards.forEach((shard, s) => {
+    if (!shard) return;
+    for (const [doc, w] of lookup(shard, tok, prefix)) {
+      const g = starts[s] + doc;
+      if (!within || within.has(g)) hits.set(g, w);
+    }
+  });
+  bodies.forEach((body, s) => {
+    if (!body) return;
+    for (const doc of bodyLookup(body, tok, prefix)) {
+      const g = starts[s] + doc;
+      if (!within || within.has(g)) hits.set(g, (hits.get(g) || 0) + BODY_WEIGHT);
+    }
+  });
+  return hits;
+}
+
+// Query results by normalized query, least recently used first. An entry is
+// only valid for the `gen` it was computed at.
+const cache = new Map();
+
+function normalize(q) {
+  return q.toLowerCase().replace(/\s+/g, ' ').replace(/^ /, '');
+}
+
+function cached(key) {
+  const e = cache.get(key);
+  if (!e || e.gen !== gen) return null;
+  cache.delete(key);
+  cache.set(key, e);
+  return e;
+}
+
+function remember(key, e) {
+  cache.delete(key);
+  cache.set(key, e);
+  if (cache.size > CACHE_SIZE) cache.delete(cache.keys().next().value);
+}
+
+// Every doc matching a query also matches any query its normalized form
+// extends: a finished token stays, a half-typed one only gets longer, and
+// tokens are ANDed. So the longest cached prefix bounds the candidates, and
+// tokens the two queries share reuse their hits.
+function rank(q) {
+  const key = normalize(q);
+  const hit = cached(key);
+  if (hit) return hit;
+  let base = null;
+  for (let i = key.length - 1; i > 0 && !base; i--) base = cached(key.slice(0, i));
+
+  const toks = [...new Set(tokenize(key))];
+  const typing = !/\s$/.test(key);
+  const specs = toks.map((tok, k) => ({
+    tok,
+    // A lone CJK character only exists as a term prefix; the last Latin word may be half-typed.
+    prefix: tok.charCodeAt(0) >= 128 ? tok.length === 1 : (typing && k === toks.length - 1),
+  }));
+  const hits = [];
+  let acc = null;
+  for (const spec of specs) {
+    const same = base ? base.specs.findIndex(b => b.tok === spec.tok && b.prefix === spec.prefix) : -1;
+    const h = same >= 0 ? base.hits[same] : tokenHits(spec.tok, spec.prefix, base && base.acc);
+    hits.push(h);
+    if (acc === null) { acc = new Map(h); continue; }
+    const both = new Map();
+    for (const [g, w] of h) if (acc.has(g)) both.set(g, acc.get(g) + w);
+    acc = both;
+  }
+  acc = acc || new Map();
+  const ranked = [...acc].map(([g, sc]) => ({g, sc, date: docDate(g)})).sort(byScore);
+  const entry = {gen, specs, hits, acc, ranked};
+  remember(key, entry);
+  return entry;
+}
+
+function intersect(a, b) {
+  const out = [];
+  for (let i = 0, j = 0; i < a.length && j < b.length;) {
+    if (a[i] < b[j]) i++;
+    else if (a[i] > b[j]) j++;
+    else { out.push(a[i]); i++; j++; }
+  }
+  return out;
+}
+
+function union(lists) {
+  const all = [].concat(...lists).sort((a, b) => a - b);
+  return all.filter((g, i) => i === 0 || all[i - 1] !== g);
+}
+
+function tagPosts(tag) {
+  return facetAt.has(tag) ? facets.tags[facetAt.get(tag)].posts : [];
+}
+
+// Ascending ids of docs with every (and) or any (or) of the tags: array
+// intersections, smallest first, or a merge.
+function filterIds(tags, mode) {
+  const lists = tags.map(tagPosts);
+  if (mode === 'or') return union(lists);
+  return lists.sort((a, b) => a.length - b.length).reduce(intersect);
+}
+
+// Without a query, docs matching the filter list newest first.
+function results(q, filter) {
+  if (!filter) return rank(q).ranked;
+  const ids = filterIds(filter.tags, filter.mode);
+  if (!normalize(q).trim()) return ids.map(g => ({g, sc: 0, date: docDate(g)})).sort(byScore);
+  const keep = new Set(ids);
+  return rank(q).ranked.filter(r => keep.has(r.g));
+}
+
+function facet(i, count) {
+  const t = facets.tags[i];
+  return {tag: t.tag, name: t.name, count: count === undefined ? t.posts.length : count};
+}
+
+// Tags to narrow the results with, counted within them. With AND, only tags
+// that co-occur with the rarest selected one can still match anything.
+function suggest(q, filter, ranked) {
+  if (!facets) return [];
+  const chosen = new Set(filter ? filter.tags : []);
+  const or = filter && filter.mode === 'or';
+  let cands = facets.tags.map((t, i) => i);
+  if (filter && !or) {
+    const rarest = filter.tags.filter(t => facetAt.has(t))
+      .sort((a, b) => tagPosts(a).length - tagPosts(b).length)[0];
+    cands = rarest === undefined ? [] : facets.cooc[facetAt.get(rarest)].filter((x, k) => k % 2 === 0);
+  }
+  // Adding a tag to an OR filter widens it, so its own size is what it adds.
+  const scoped = normalize(q).trim() || (filter && !or);
+  const scope = scoped ? ranked.map(r => r.g).sort((a, b) => a - b) : null;
+  const out = [];
+  for (const i of cands) {
+    if (chosen.has(facets.tags[i].tag)) continue;
+    const n = scope ? intersect(scope, facets.tags[i].posts).length : facets.tags[i].posts.length;
+    if (n) out.push(facet(i, n));
+  }
+  return out.sort((a, b) => b.count - a.count).slice(0, FACET_LIMIT);
+}
+
+function reply(id, q, filter, ranked) {
+  const items = [];
+  for (const r of ranked.slice(0, LIMIT)) {
+    const it = docAt(r.g);
+    if (it) items.push({url: it.url, title: it.title, date: it.date, tags: it.tags, excerpt: it.excerpt});
+  }
+  const selected = filter ? filter.tags.filter(t => facetAt.has(t)).map(t => facet(facetAt.get(t))) : [];
+  postMessage({
+    type: 'results', id, q, count: ranked.length, more: !!normalize(q).trim() && nextUnloaded() >= 0, items,
+    selected, facets: suggest(q, filter, ranked),
+  });
+}
+
+async function query(id, q, filter) {
+  latest = id;
+  let ranked = results(q, filter);
+  reply(id, q, filter, ranked);
+  const text = !!normalize(q).trim();
+  if (!text && !filter) return;
+  try {
+    for (;;) {
+      // Filter hits can point into shards that have not been fetched yet.
+      const need = [...new Set(ranked.slice(0, LIMIT).filter(r => !docAt(r.g)).map(r => shardOf(r.g)))];
+      // Text also matches the bodies of the shards already fetched.
+      if (text) for (const s in pending) if (manifest.shards[s].body && !bodyPending[s]) need.push(+s);
+      if (!need.length) {
+        // A filter alone already counts every doc; only text matches need more shards.
+        const s = ranked.length < LIMIT && text ? nextUnloaded() : -1;
+        if (s < 0) break;
+        need.push(s);
+      }
+      await Promise.all(need.map(s => loadFor(s, text)));
+      if (id !== latest) return;
+      ranked = results(q, filter);
+      reply(id, q, filter, ranked);
+    }
+  } catch (e) {
+    // Keep whatever was already sent.
+  }
+}
+
+async function init(urls) {
+  for (const url of urls) {
+    try { manifest = await getJSON(url, 'no-cache'); break; } catch (e) { /* try the next one */ }
+  }
+  if (!manifest) throw new Error('no manifest');
+  let n = 0;
+  for (const sh of manifest.shards) { starts.push(n); n += sh.count; }
+  await Promise.all([
+    manifest.shards.length ? load(0) : null,
+    manifest.facets && getJSON(manifest.facets.url).then(f => {
+      facets = f;
+      f.tags.forEach((t, i) => facetAt.set(t.tag, i));
+    }, () => {}),
+  ]);
+}
+
+let ready = null;
+onmessage = async e => {
+  const msg = e.data;
+  if (msg.type === 'init') {
+    ready = init(msg.manifests);
+    ready.then(() => postMessage({type: 'ready', total: manifest.total}), () => postMessage({type: 'error'}));
+  } else if (msg.type === 'query') {
+    latest = msg.id;
+    try { await ready; } catch (err) { return; }
+    // A filter needs the facet index; without one only the query applies.
+    const filter = facets && msg.tags && msg.tags.length ? {tags: msg.tags, mode: msg.mode} : null;
+    if (msg.id === latest) query(msg.id, msg.q, filter);
+  }
+};
@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+# The build scripts import each other as top-level modules.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+POST = """<!doctype html>
+<html lang="{lang}">
+<head>
+  <meta charset="utf-8" />
+  <title>{title} | Mr. Qizhi</title>
+  <meta name="description" content="{description}" />
+  <meta name="keywords" content="{tags}" />
+  <script type="application/ld+json">{{"@type": "Article", "datePublished": "{date}"}}</script>
+</head>
+<body>
+  <main class="post">
+    <article>
+      <h1>{title}</h1>
+      <p class="meta">{date}</p>
+      {cover}
+      <div class="post-content">
+        <p>{text}</p>
+      </div>
+    </article>
+  </main>
+</body>
+</html>
+"""
+
+
+@pytest.fixture
+def write_post() -> Callable[..., Path]:
+    """Write post/<slug>/index.html under a root from POST; returns its path."""
+
+    def write(
+        root: Path, slug: str, title: str, text: str = "Body text that is not the excerpt.", *, lang: str = "en",
+        description: str | None = None, date: str = "2026-02-20", tags: str = "smart city, governance", cover: str = "",
+    ) -> Path:
+        path = root / "post" / slug / "index.html"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        page = POST.format(
+            lang=lang, title=title, description=description or f"{title}: notes.", tags=tags, date=date, cover=cover, text=text,
+        )
+        path.write_text(page, encoding="utf-8")
+        return path
+
+    return write
@@ -0,0 +1,24 @@
+"""Feed documents rendered from post records."""
+
+import json
+from pathlib import Path
+
+from feeds import generate_feeds
+from postmeta import scan_posts
+
+BASE = "https://ai.liexpress.cc"
+
+
+def test_json_feed_items_carry_content_text(tmp_path: Path, write_post) -> None:
+    write_post(tmp_path, "city-data", "City data platforms", description="Why city data platforms need governance.")
+    write_post(tmp_path, "city-ops", "City operations", description="Running a city on shared data.", date="2026-02-21")
+    posts = scan_posts(tmp_path)
+    generate_feeds(tmp_path, BASE, posts)
+
+    feed = json.loads((tmp_path / "feed.json").read_text(encoding="utf-8"))
+    items = {item["url"]: item for item in feed["items"]}
+    assert set(items) == {f"{BASE}/post/{p.slug}/" for p in posts}
+    for p in posts:
+        item = items[f"{BASE}/post/{p.slug}/"]
+        assert item["content_text"] == item["summary"] == p.excerpt
+        assert item["content_text"]
@@ -0,0 +1,29 @@
+"""Hashed asset copies: one per fingerprinted asset, none left behind."""
+
+import json
+from pathlib import Path
+
+from fingerprint import MANIFEST_PATH, fingerprint
+
+
+def test_stale_and_orphaned_copies_are_removed(tmp_path: Path) -> None:
+    css = tmp_path / "styles" / "main.css"
+    css.parent.mkdir()
+    css.write_text("body { color: #111; }\n", encoding="utf-8")
+    # Left by an older ASSETS list: an asset that is no longer fingerprinted.
+    (tmp_path / "search.0123456789.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "search.0123456789.json.gz").write_bytes(b"")
+    manifest = tmp_path / MANIFEST_PATH
+    manifest.parent.mkdir()
+    manifest.write_text(json.dumps({"search.json": "search.0123456789.json"}), encoding="utf-8")
+
+    first, _ = fingerprint(tmp_path)
+    assert list(first) == ["styles/main.css"]
+    assert not (tmp_path / "search.0123456789.json").exists()
+    assert not (tmp_path / "search.0123456789.json.gz").exists()
+
+    css.write_text("body { color: #222; }\n", encoding="utf-8")
+    second, _ = fingerprint(tmp_path)
+    assert second["styles/main.css"] != first["styles/main.css"]
+    assert sorted(p.name for p in css.parent.iterdir()) == sorted(["main.css", Path(second["styles/main.css"]).name])
+    assert json.loads(manifest.read_text(encoding="utf-8")) == second
@@ -0,0 +1,60 @@
+"""lastmod must follow author edits, not the markup later build stages write into posts."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+import hreflang
+import images
+import related
+from generate_sitemap import update_lastmod
+from postmeta import scan_posts
+
+BASE = "https://ai.liexpress.cc"
+
+COVER = '<img src="/assets/covers/city.jpg" alt="A city square" loading="lazy" />'
+VARIANTS = {
+    "assets/covers/city.jpg": {
+        "width": 1024,
+        "height": 768,
+        "sources": {"image/jpeg": [[480, "assets/covers/w/city-480.0123456789.jpg"]]},
+    }
+}
+
+
+def run(monkeypatch, module, *args: str) -> None:
+    monkeypatch.setattr(sys, "argv", [f"{module.__name__}.py", *args])
+    assert module.main() == 0
+
+
+@pytest.fixture
+def site(tmp_path: Path, write_post) -> Path:
+    write_post(tmp_path, "city-data", "City data platforms", "Smart city data platforms need governance.", cover=COVER)
+    write_post(tmp_path, "city-ops", "City operations", "Operating smart city data platforms with governance.")
+    write_post(tmp_path, "city-ops-zh", "城市运营", "智慧城市的数据平台需要治理。", lang="zh")
+    return tmp_path
+
+
+def test_injected_markup_leaves_lastmod(site: Path, monkeypatch) -> None:
+    before = update_lastmod(site, scan_posts(site), "2026-03-01")
+    assert before == {"city-data": "2026-02-20", "city-ops": "2026-02-20", "city-ops-zh": "2026-02-20"}
+
+    assert images.rewrite_posts(site, VARIANTS, scan_posts(site)) == 1
+    run(monkeypatch, related, "--root", str(site), "--inject")
+    run(monkeypatch, hreflang, "--root", str(site), "--base", BASE)
+    text = (site / "post/city-ops/index.html").read_text(encoding="utf-8")
+    assert '<nav class="related-posts"' in text and 'hreflang="zh"' in text
+    assert "<picture data-cover=" in (site / "post/city-data/index.html").read_text(encoding="utf-8")
+
+    assert update_lastmod(site, scan_posts(site), "2026-04-01") == before
+
+
+def test_edit_advances_lastmod(site: Path) -> None:
+    update_lastmod(site, scan_posts(site), "2026-03-01")
+    path = site / "post/city-ops/index.html"
+    path.write_text(path.read_text(encoding="utf-8").replace("with governance", "with clear governance"), encoding="utf-8")
+
+    after = update_lastmod(site, scan_posts(site), "2026-04-01")
+    assert after["city-ops"] == "2026-04-01"
+    assert after["city-data"] == "2026-02-20"
@@ -0,0 +1,46 @@
+"""Tag anchors of zh-only tags resolve on both tag indexes."""
+
+from pathlib import Path
+from urllib.parse import quote
+
+from check_internal_links import find_broken, load_pages, walk
+from generate_pages import generate_pages
+from postmeta import scan_posts, tag_anchor
+
+BASE = "https://ai.liexpress.cc"
+TAG = "城市运营"
+
+
+def broken_links(root: Path) -> list[tuple[str, str]]:
+    """(page, href) of broken links in posts; the site has no homepage or stylesheet here."""
+    pages, files = walk(root)
+    broken = find_broken(load_pages(root, pages, False, 1), files, BASE)
+    return [(src, href) for src, href, _ in broken if src.startswith("post/")]
+
+
+def test_zh_only_tag_anchors_resolve(tmp_path: Path, write_post) -> None:
+    anchor = tag_anchor(TAG)
+    assert anchor == TAG  # CJK is kept, not dropped from the slug
+    links = [
+        f"{BASE}/tags.html#{anchor}",
+        f"{BASE}/zh/tags.html#{anchor}",
+        f"/zh/tags.html#{quote(anchor)}",
+        f"{BASE}/zh/tags/{quote(anchor)}/",
+    ]
+    write_post(tmp_path, "city-data", "City data platforms", tags="governance")
+    write_post(
+        tmp_path, "city-ops-zh", "城市运营", "".join(f'<a href="{href}">{TAG}</a>' for href in links),
+        lang="zh", tags=TAG,
+    )
+    generate_pages(tmp_path, BASE, scan_posts(tmp_path))
+
+    assert f'id="{anchor}"' in (tmp_path / "tags.html").read_text(encoding="utf-8")
+    assert broken_links(tmp_path) == []
+
+
+def test_missing_tag_anchor_is_reported(tmp_path: Path, write_post) -> None:
+    write_post(tmp_path, "city-ops-zh", "城市运营", f'<a href="{BASE}/tags.html#不存在">x</a>', lang="zh", tags=TAG)
+    generate_pages(tmp_path, BASE, scan_posts(tmp_path))
+    assert broken_links(tmp_path) == [
+        ("post/city-ops-zh/index.html", f"{BASE}/tags.html#不存在"),
+    ]
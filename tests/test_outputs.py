@@ -0,0 +1,44 @@
+"""Write-avoidance: identical bytes are not rewritten, recorded keys survive a flush."""
+
+import json
+from pathlib import Path
+
+from outputs import STATE_PATH, PageWriter, flush, is_fresh, write_output
+
+
+def test_identical_bytes_are_not_rewritten(tmp_path: Path) -> None:
+    assert write_output(tmp_path, "index.html", "<p>one</p>\n")
+    path = tmp_path / "index.html"
+    before = path.stat().st_mtime_ns
+
+    assert not write_output(tmp_path, "index.html", "<p>one</p>\n")
+    assert path.stat().st_mtime_ns == before
+    assert write_output(tmp_path, "index.html", "<p>two</p>\n")
+    assert path.read_text(encoding="utf-8") == "<p>two</p>\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["index.html"]  # no temp files left
+
+
+def test_page_writer_skips_identical_pages(tmp_path: Path) -> None:
+    for text, written in [("<p>one</p>", True), ("<p>one</p>", False), ("<p>two</p>", True)]:
+        with PageWriter(tmp_path, "tags.html", "k") as w:
+            w.lines(["<div>", text, "</div>"])
+        assert w.written is written
+    assert (tmp_path / "tags.html").read_text(encoding="utf-8") == "<div>\n<p>two</p>\n</div>"
+
+
+def test_fresh_only_with_the_recorded_key(tmp_path: Path) -> None:
+    assert not is_fresh(tmp_path, "about.html", "k1")
+    write_output(tmp_path, "about.html", "<p>about</p>\n", key="k1")
+    assert is_fresh(tmp_path, "about.html", "k1")
+    assert not is_fresh(tmp_path, "about.html", "k2")
+
+    flush(tmp_path)
+    assert json.loads((tmp_path / STATE_PATH).read_text(encoding="utf-8")) == {"about.html": "k1"}
+    assert is_fresh(tmp_path, "about.html", "k1")  # re-read from the file
+
+    # A key whose output was deleted is stale, and dropped at the next flush.
+    (tmp_path / "about.html").unlink()
+    assert not is_fresh(tmp_path, "about.html", "k1")
+    write_output(tmp_path, "tags.html", "<p>tags</p>\n", key="k3")
+    flush(tmp_path)
+    assert json.loads((tmp_path / STATE_PATH).read_text(encoding="utf-8")) == {"tags.html": "k3"}
@@ -0,0 +1,51 @@
+"""Paginated tag and archive listings, and the pages a shrinking listing leaves behind."""
+
+import argparse
+from pathlib import Path
+
+import pytest
+
+from generate_pages import generate_pages, paginate, positive_int
+from postmeta import scan_posts
+
+BASE = "https://ai.liexpress.cc"
+
+
+def listing_pages(root: Path, top: str) -> list[str]:
+    return sorted(p.relative_to(root).as_posix() for p in (root / top).rglob("index.html"))
+
+
+def test_paginate() -> None:
+    assert paginate([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert paginate([], 2) == [[]]  # an empty listing still gets its first page
+
+
+@pytest.mark.parametrize("bad", ["0", "-3", "x"])
+def test_page_size_must_be_positive(bad: str) -> None:
+    with pytest.raises((argparse.ArgumentTypeError, ValueError)):
+        positive_int(bad)
+
+
+def test_shrunk_listings_lose_their_extra_pages(tmp_path: Path, write_post) -> None:
+    for i in range(3):
+        write_post(tmp_path, f"post-{i}", f"Post {i}", tags="governance", date=f"2025-0{i + 1}-01")
+    write_post(tmp_path, "older", "Older post", tags="smart city", date="2024-05-01")
+    generate_pages(tmp_path, BASE, scan_posts(tmp_path), page_size=1)
+    assert listing_pages(tmp_path, "tags/governance") == [
+        "tags/governance/index.html", "tags/governance/page/2/index.html", "tags/governance/page/3/index.html",
+    ]
+    assert listing_pages(tmp_path, "archive") == [
+        "archive/2024/index.html",
+        "archive/2025/index.html", "archive/2025/page/2/index.html", "archive/2025/page/3/index.html",
+    ]
+    assert (tmp_path / "tags/smart-city/index.html").exists()
+
+    for slug in ["post-2", "older"]:
+        path = tmp_path / "post" / slug / "index.html"
+        path.unlink()
+        path.parent.rmdir()
+    generate_pages(tmp_path, BASE, scan_posts(tmp_path), page_size=1)
+    assert listing_pages(tmp_path, "tags/governance") == ["tags/governance/index.html", "tags/governance/page/2/index.html"]
+    assert not (tmp_path / "tags/governance/page/3").exists()
+    assert not (tmp_path / "tags/smart-city").exists()
+    assert listing_pages(tmp_path, "archive") == ["archive/2025/index.html", "archive/2025/page/2/index.html"]
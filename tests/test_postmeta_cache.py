@@ -0,0 +1,56 @@
+"""The postmeta cache serves unchanged posts and re-parses changed ones."""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+import postmeta
+from postmeta import CACHE_PATH, scan_posts
+
+
+@pytest.fixture
+def site(tmp_path: Path, write_post) -> Path:
+    write_post(tmp_path, "city-data", "City data platforms")
+    scan_posts(tmp_path, jobs=1)
+    # Mark the cached record, so a scan that serves it returns the mark.
+    path = tmp_path / CACHE_PATH
+    cache = json.loads(path.read_text(encoding="utf-8"))
+    cache["entries"]["post/city-data/index.html"]["post"]["title"] = "From the cache"
+    path.write_text(json.dumps(cache), encoding="utf-8")
+    postmeta._scanned.clear()
+    return tmp_path
+
+
+def title(root: Path) -> str:
+    postmeta._scanned.clear()  # as a new process would
+    [post] = scan_posts(root, jobs=1)
+    return post.title
+
+
+def test_unchanged_post_is_served_from_the_cache(site: Path) -> None:
+    assert title(site) == "From the cache"
+    # Touched but byte-identical: the content hash still matches.
+    os.utime(site / "post/city-data/index.html", ns=(0, 0))
+    assert title(site) == "From the cache"
+
+
+def test_size_change_reparses(site: Path) -> None:
+    path = site / "post/city-data/index.html"
+    path.write_text(path.read_text(encoding="utf-8").replace("City data", "City data and AI"), encoding="utf-8")
+    assert title(site) == "City data and AI platforms"
+
+
+def test_same_size_edit_with_new_mtime_reparses(site: Path) -> None:
+    path = site / "post/city-data/index.html"
+    st = path.stat()
+    path.write_text(path.read_text(encoding="utf-8").replace("City data", "Town data"), encoding="utf-8")
+    assert path.stat().st_size == st.st_size
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert title(site) == "Town data platforms"
+
+
+def test_extractor_version_bump_discards_the_cache(site: Path, monkeypatch) -> None:
+    monkeypatch.setattr(postmeta, "EXTRACTOR_VERSION", postmeta.EXTRACTOR_VERSION + 1)
+    assert title(site) == "City data platforms"
@@ -0,0 +1,75 @@
+"""The sharded related index updates in place and writes back only what changed."""
+
+from pathlib import Path
+
+import pytest
+
+import postmeta
+import related
+from postmeta import scan_posts
+from related import INDEX_DIR
+
+TOPICS = [
+    ("city-data", "City data platforms", "sensors traffic data platforms open budgets", "smart city, data"),
+    ("city-sensors", "City sensors", "sensors traffic cameras privacy data", "smart city, privacy"),
+    ("open-budgets", "Open budgets", "open budgets council data transparency", "governance, data"),
+    ("council-ai", "Council AI pilots", "council pilots procurement privacy transparency", "governance, ai"),
+    ("traffic-models", "Traffic models", "traffic models sensors forecasting platforms", "smart city, ai"),
+    ("privacy-rules", "Privacy rules", "privacy rules cameras council procurement", "privacy, governance"),
+]
+
+
+@pytest.fixture
+def site(tmp_path: Path, write_post) -> Path:
+    for slug, title, text, tags in TOPICS:
+        write_post(tmp_path, slug, title, f"{text} {text}", tags=tags)
+    return tmp_path
+
+
+def compute(root: Path, force: bool = False) -> dict[str, list]:
+    postmeta._scanned.clear()  # as a new process would
+    return related.compute(root, scan_posts(root, jobs=1), related.K, force)[0]
+
+
+def edit(root: Path, old: str, new: str) -> None:
+    path = root / "post/city-data/index.html"
+    path.write_text(path.read_text(encoding="utf-8").replace(old, new), encoding="utf-8")
+
+
+def files(root: Path) -> set[str]:
+    return {p.name for p in (root / INDEX_DIR).iterdir()}
+
+
+@pytest.mark.parametrize("limit", [related.DELTA_LIMIT, 0])
+def test_edit_and_revert_restores_the_lists(site: Path, monkeypatch, limit: int) -> None:
+    monkeypatch.setattr(related, "DELTA_LIMIT", limit)
+    before = compute(site)
+    cold = files(site)
+    assert len(cold) == 1 + 4 * related.SHARDS
+
+    edit(site, "open budgets", "drones robotics")
+    edited = compute(site)
+    assert edited["city-data"] != before["city-data"]
+    written = files(site) - cold
+    slug_shard = related.shard_of("city-data")
+    if limit:
+        # Term changes go to the deltas; of the post shards only city-data's is rewritten.
+        assert {"df-delta.2.json", "postings-delta.2.json"} <= written
+        assert {n for n in written if n.startswith(("terms-", "vectors-"))} == {
+            f"terms-{slug_shard:02d}.2.json", f"vectors-{slug_shard:02d}.2.json",
+        }
+    else:
+        assert not any("delta" in n for n in written)
+
+    edit(site, "drones robotics", "open budgets")
+    assert compute(site) == before
+
+
+def test_missing_shard_rebuilds_the_index(site: Path) -> None:
+    compute(site)
+    for name in files(site):
+        if name.startswith("df-"):
+            (site / INDEX_DIR / name).unlink()
+    edit(site, "open budgets", "drones robotics")
+    assert compute(site) == compute(site, force=True)
+    assert len(files(site)) == 1 + 4 * related.SHARDS